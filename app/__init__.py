@@ -7,6 +7,7 @@ from flask_login import LoginManager, current_user, logout_user
 from flask_babel import Babel, get_locale
 from .models import db
 from .auth import auth_bp
+from .tracing import init_tracing
 
 
 def create_app(config_name=None):
@@ -56,6 +57,10 @@ def create_app(config_name=None):
     # Initialize extensions
     db.init_app(app)
     
+    # Request tracing (TRACING_ENABLED=1); registered before the other request
+    # hooks so their database work is part of each trace
+    init_tracing(app)
+    
     # Initialize Babel
     babel = Babel(app)
     
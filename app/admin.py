@@ -7,6 +7,7 @@ from functools import wraps
 from datetime import datetime, timedelta
 import csv
 import io
+import json
 from sqlalchemy import desc, func
 from .models import db, Admin, AdminActivity, Pseudocode, UserType, Rating, SystemPerformance, UserSession, UserActivity
 
@@ -114,11 +115,17 @@ def dashboard():
     # Get rating statistics
     rating_stats = Rating.get_rating_stats()
     
+    # Explanation cache counters of this worker
+    from .routes import model_manager
+    explanation_cache = getattr(model_manager.explainer, 'cache', None)
+    explanation_cache_stats = explanation_cache.get_stats() if explanation_cache else None
+    
     return render_template('admin/admin_dashboard.html', 
                          stats=stats, 
                          recent_activities=recent_activities,
                          top_users=top_users,
-                         rating_stats=rating_stats)
+                         rating_stats=rating_stats,
+                         explanation_cache_stats=explanation_cache_stats)
 
 
 @admin_bp.route('/users')
@@ -244,6 +251,101 @@ def toggle_user_active(user_id):
     return redirect(url_for('admin.users'))
 
 
+@admin_bp.route('/cache/explanations/purge', methods=['POST'])
+@admin_required
+def purge_explanation_cache():
+    """Delete all cached grammar explanations, e.g. after a prompt or model change"""
+    from .pipeline import GrammarExplainer
+    from .routes import model_manager
+    
+    try:
+        # Without a local explainer (model-server mode) purge the shared store directly;
+        # every process notices the purge and drops its memory tier
+        cache = getattr(model_manager.explainer, 'cache', None) or GrammarExplainer.open_cache()
+        deleted = cache.clear()
+        
+        current_user.log_activity('explanation_cache_purge', {'deleted': deleted})
+        flash(f'Explanation cache purged ({deleted} entries removed)', 'success')
+    except Exception as e:
+        flash(f'Error purging explanation cache: {e}', 'error')
+    
+    return redirect(url_for('admin.dashboard'))
+
+
+@admin_bp.route('/traces')
+@admin_required
+def traces():
+    """Recently kept request traces of all workers"""
+    from .tracing import tracer
+    
+    min_duration_ms = request.args.get('min_ms', 0, type=float)
+    try:
+        recent = tracer.buffer.recent(limit=200, min_duration_ms=min_duration_ms)
+        for trace in recent:
+            trace['started_at'] = datetime.fromtimestamp(trace['started_at'])
+    except Exception as e:
+        flash(f'Error reading traces: {e}', 'error')
+        recent = []
+    
+    return render_template('admin/admin_traces.html', traces=recent, tracing=tracer.get_stats(),
+                           min_duration_ms=min_duration_ms)
+
+
+@admin_bp.route('/traces/<trace_id>')
+@admin_required
+def trace_detail(trace_id):
+    """Span waterfall of one trace"""
+    from .tracing import tracer
+    
+    trace = tracer.buffer.get(trace_id)
+    if trace is None:
+        flash('Trace not found (it may have been dropped from the buffer)', 'error')
+        return redirect(url_for('admin.traces'))
+    
+    # Depth-first order so children follow their parent
+    children = {}
+    for span in trace['spans']:
+        children.setdefault(span['parent_id'], []).append(span)
+    rows = []
+    
+    def visit(parent_id, depth):
+        for span in sorted(children.get(parent_id, []), key=lambda s: s['start_ns']):
+            rows.append({
+                'span': span,
+                'depth': depth,
+                'offset_ms': (span['start_ns'] - trace['start_ns']) / 1e6,
+                'duration_ms': (span['end_ns'] - span['start_ns']) / 1e6,
+                'cpu_ms': span['cpu_ns'] / 1e6
+            })
+            visit(span['span_id'], depth + 1)
+    
+    visit(None, 0)
+    return render_template('admin/admin_trace_detail.html', trace=trace, rows=rows,
+                           total_ms=max(trace['duration_ms'], 1e-3))
+
+
+@admin_bp.route('/traces/export')
+@admin_required
+def export_traces():
+    """Buffered traces (or ?trace_id=) as an OpenTelemetry OTLP/JSON file"""
+    from .tracing import tracer, to_otlp
+    
+    trace_id = request.args.get('trace_id')
+    if trace_id:
+        trace = tracer.buffer.get(trace_id)
+        exported = [trace] if trace else []
+    else:
+        exported = tracer.buffer.all()
+    
+    current_user.log_activity('export_traces', {'count': len(exported)})
+    return send_file(
+        io.BytesIO(json.dumps(to_otlp(exported)).encode('utf-8')),
+        mimetype='application/json',
+        as_attachment=True,
+        download_name=f'traces_{datetime.now().strftime("%Y%m%d_%H%M%S")}.otlp.json'
+    )
+
+
 @admin_bp.route('/ratings')
 @admin_required
 def ratings():
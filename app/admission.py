@@ -0,0 +1,338 @@
+"""
+Latency-aware admission control for the NLP pipeline.
+The rate limiter counts requests; this estimates how long a new request would
+take given the work already in flight and recent per-stage service times
+(from SystemPerformance), and turns it away with a Retry-After when it could
+not finish before the pipeline deadline anyway.
+
+In-flight requests are recorded in a small SQLite table so every gunicorn
+worker sees the same queue.
+"""
+
+import os
+import math
+import time
+import uuid
+import sqlite3
+import threading
+from functools import wraps
+from flask import request, jsonify, render_template, flash
+
+from .tracing import span
+
+
+class ServiceTimeModel:
+    """Per-stage service times fitted on recent successful requests"""
+
+    # Used until enough requests have been logged (seconds)
+    DEFAULT_TIMES = {'translation': 2.0, 'classification': 0.3, 'explanation': 8.0}
+
+    # Requests needed before the logged times replace the defaults
+    MIN_SAMPLES = 5
+
+    def __init__(self):
+        self.translation_base = self.DEFAULT_TIMES['translation']
+        self.translation_per_char = 0.0
+        self.classification = self.DEFAULT_TIMES['classification']
+        self.explanation = self.DEFAULT_TIMES['explanation']
+        self.average_input_length = 50.0
+        self.samples = 0
+
+    def fit(self, rows):
+        """
+        Fit on (input_length, translation_time, classification_time, explanation_time) rows.
+        Translation time grows with the input, so it gets a least-squares line;
+        the other stages get their mean.
+        """
+        translation = [(length, t) for length, t, _, _ in rows if t is not None]
+        classification = [t for _, _, t, _ in rows if t is not None]
+        # Streamed and deferred explanations are not timed in the request
+        explanation = [t for _, _, _, t in rows if t is not None]
+
+        self.samples = len(rows)
+        if len(translation) >= self.MIN_SAMPLES:
+            lengths = [length for length, _ in translation]
+            times = [t for _, t in translation]
+            mean_length = sum(lengths) / len(lengths)
+            mean_time = sum(times) / len(times)
+            variance = sum((length - mean_length) ** 2 for length in lengths)
+            slope = 0.0
+            if variance > 0:
+                slope = sum((length - mean_length) * (t - mean_time)
+                            for length, t in translation) / variance
+            self.translation_per_char = max(0.0, slope)
+            self.translation_base = max(0.0, mean_time - self.translation_per_char * mean_length)
+            self.average_input_length = mean_length
+        if len(classification) >= self.MIN_SAMPLES:
+            self.classification = sum(classification) / len(classification)
+        if len(explanation) >= self.MIN_SAMPLES:
+            self.explanation = sum(explanation) / len(explanation)
+
+    def service_time(self, input_length, include_explanation):
+        """Expected seconds to process one request of input_length characters"""
+        seconds = self.translation_base + self.translation_per_char * input_length + self.classification
+        if include_explanation:
+            seconds += self.explanation
+        return seconds
+
+    def to_dict(self):
+        return {
+            'samples': self.samples,
+            'translation_base': round(self.translation_base, 3),
+            'translation_per_char': round(self.translation_per_char, 5),
+            'classification': round(self.classification, 3),
+            'explanation': round(self.explanation, 3)
+        }
+
+
+class AdmissionController:
+    """Admits a request only if it is expected to finish before the deadline"""
+
+    def __init__(self, path, capacity=None, deadline=75.0, refresh_interval=30.0, history=200):
+        """
+        Initialize admission controller
+
+        Args:
+            path: SQLite file holding the in-flight requests of all workers
+            capacity: Requests the models can serve at the same time
+                (None = decided per worker, see _default_capacity)
+            deadline: Pipeline deadline in seconds (full_pipeline timeout)
+            refresh_interval: Seconds between service-time refreshes from the database
+            history: Recent successful requests the service times are fitted on
+        """
+        self.path = path
+        self._capacity = capacity
+        self.deadline = deadline
+        self.refresh_interval = refresh_interval
+        self.history = history
+        self.model = ServiceTimeModel()
+        self._refreshed_at = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+        # Statistics
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self):
+        # Resolved on use: WORKER_COUNT is only set after gunicorn forks the workers
+        return max(1, self._capacity if self._capacity is not None else _default_capacity())
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across fork()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS admission_in_flight (
+                        ticket TEXT PRIMARY KEY,
+                        pid INTEGER NOT NULL,
+                        started_at REAL NOT NULL,
+                        expected REAL NOT NULL
+                    )
+                """)
+                self._initialized = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def refresh_service_times(self, force=False):
+        """Refit the service-time model on recently logged requests (needs an app context)"""
+        now = time.time()
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+        self._refreshed_at = now
+        try:
+            from .models import SystemPerformance
+            rows = SystemPerformance.query.with_entities(
+                SystemPerformance.input_length,
+                SystemPerformance.translation_time,
+                SystemPerformance.classification_time,
+                SystemPerformance.explanation_time
+            ).filter_by(success=True).order_by(SystemPerformance.timestamp.desc()).limit(self.history).all()
+            with self._lock:
+                self.model.fit([tuple(row) for row in rows])
+        except Exception as e:
+            print(f"Admission service-time refresh failed: {e}")
+
+    @staticmethod
+    def _pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _in_flight(self, conn, now):
+        """(elapsed, expected) of the requests being processed, dropping stale entries"""
+        # Entries of killed workers or far past the deadline are leftovers
+        conn.execute("DELETE FROM admission_in_flight WHERE started_at < ?", (now - 2 * self.deadline,))
+        rows = conn.execute("SELECT ticket, pid, started_at, expected FROM admission_in_flight").fetchall()
+        dead = {pid for pid in {row[1] for row in rows} if not self._pid_alive(pid)}
+        if dead:
+            conn.executemany("DELETE FROM admission_in_flight WHERE pid = ?", [(pid,) for pid in dead])
+        return [(now - started_at, expected) for _, pid, started_at, expected in rows if pid not in dead]
+
+    def _estimate(self, in_flight, input_length, include_explanation):
+        """Queue wait plus service time of a new request"""
+        service = self.model.service_time(input_length, include_explanation)
+        capacity = self.capacity
+        wait = 0.0
+        if len(in_flight) >= capacity:
+            # Work left on the requests ahead, shared by the parallel slots;
+            # requests past their expected time are assumed to be nearly done
+            remaining = sum(max(expected - elapsed, 0.5) for elapsed, expected in in_flight)
+            wait = remaining / capacity
+        return {
+            'in_flight': len(in_flight),
+            'capacity': capacity,
+            'wait': round(wait, 2),
+            'service': round(service, 2),
+            'total': round(wait + service, 2)
+        }
+
+    def estimate(self, input_length, include_explanation):
+        """Expected completion time of a request submitted now"""
+        conn = self._connection()
+        with self._lock:
+            return self._estimate(self._in_flight(conn, time.time()), input_length, include_explanation)
+
+    def admit(self, input_length, include_explanation, reject=True):
+        """
+        Admit a request or turn it away.
+
+        Args:
+            input_length: Characters of Thai input
+            include_explanation: Whether the explanation is generated within the request
+            reject: Turn the request away if it would miss the deadline; with
+                False it is always admitted and only recorded for the estimates
+
+        Returns:
+            tuple: (ticket, estimate, retry_after); ticket is None if rejected
+        """
+        conn = self._connection()
+        now = time.time()
+        # The check and the insert must not interleave with other workers
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            in_flight = self._in_flight(conn, now)
+            estimate = self._estimate(in_flight, input_length, include_explanation)
+            # A request that is too slow even without a queue cannot be helped by waiting
+            if reject and estimate['wait'] > 0 and estimate['total'] > self.deadline:
+                conn.execute('COMMIT')
+                self.rejected += 1
+                # Time until enough of the queue has drained
+                retry_after = max(1, math.ceil(min(estimate['wait'], estimate['total'] - self.deadline)))
+                return None, estimate, retry_after
+
+            ticket = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO admission_in_flight (ticket, pid, started_at, expected) VALUES (?, ?, ?, ?)",
+                (ticket, os.getpid(), now, estimate['service'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.admitted += 1
+        return ticket, estimate, 0
+
+    def release(self, ticket):
+        """Remove a finished request from the in-flight table"""
+        self._connection().execute("DELETE FROM admission_in_flight WHERE ticket = ?", (ticket,))
+
+    def get_stats(self):
+        """Get admission counts, service-time model and the current queue"""
+        with self._lock:
+            model = self.model.to_dict()
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'deadline': self.deadline,
+            'service_times': model,
+            'queue': self.estimate(self.model.average_input_length, False)
+        }
+
+
+def _default_capacity():
+    """Pipeline runs that proceed in parallel: one per worker, or ADMISSION_CAPACITY"""
+    if os.getenv('ADMISSION_CAPACITY'):
+        return int(os.getenv('ADMISSION_CAPACITY'))
+    if os.getenv('MODEL_SERVER_SOCKET'):
+        # All workers share the model server's translator
+        return 1
+    return int(os.getenv('WORKER_COUNT', 1))
+
+
+admission_controller = AdmissionController(
+    path=os.getenv('ADMISSION_DB_PATH', './cache/admission.sqlite3'),
+    # Same budget as full_pipeline's timeout
+    deadline=float(os.getenv('ADMISSION_DEADLINE', 75))
+)
+
+
+def admission_control(include_explanation):
+    """
+    Decorator recording requests in flight for the queue-aware estimates, and
+    turning them away with 503 and Retry-After when they would miss the
+    pipeline deadline (opt-in: set ADMISSION_CONTROL=1 to enable rejection)
+
+    Args:
+        include_explanation: Callable returning whether the explanation is
+            generated within the request
+
+    Usage:
+        @app.route('/predict', methods=['POST'])
+        @admission_control(lambda: True)
+        def predict():
+            return "Success"
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Requests are always recorded so /api/average-response-time sees the queue
+            reject = os.getenv('ADMISSION_CONTROL', '0') == '1'
+            admission_controller.refresh_service_times()
+            input_length = len(request.form.get('thai_text', '').strip())
+            try:
+                with span('admission'):
+                    ticket, estimate, retry_after = admission_controller.admit(
+                        input_length, include_explanation(), reject=reject
+                    )
+            except Exception as e:
+                # Never block requests because the bookkeeping failed
+                print(f"Admission control failed: {e}")
+                return f(*args, **kwargs)
+
+            if ticket is None:
+                print(f"Admission rejected: estimated {estimate['total']}s with {estimate['in_flight']} in flight")
+                headers = {'Retry-After': str(retry_after)}
+                if request.is_json or request.headers.get('Content-Type') == 'application/json':
+                    return jsonify({
+                        'error': 'Server busy',
+                        'message': f"Estimated processing time {estimate['total']:.0f}s exceeds the limit",
+                        'retry_after': retry_after
+                    }), 503, headers
+                flash(f'ระบบกำลังประมวลผลคำขออื่นอยู่ กรุณาลองใหม่อีกครั้งในอีก {retry_after} วินาที', 'warning')
+                return render_template('index.html'), 503, headers
+
+            try:
+                return f(*args, **kwargs)
+            finally:
+                try:
+                    admission_controller.release(ticket)
+                except Exception as e:
+                    # The entry is dropped once it is past the deadline or its worker exits
+                    print(f"Admission release failed: {e}")
+
+        return decorated_function
+    return decorator
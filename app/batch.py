@@ -0,0 +1,456 @@
+"""
+Batch processing of many Thai sentences (worksheets) through the pipeline.
+Instead of one /predict request per sentence, sentences are processed in
+chunks: translations run concurrently (so the translation batcher and pool
+can group them), each chunk is classified with one classify_batch call and
+explanations run concurrently under the Together AI limiter. Results are
+appended to a JSONL file as each chunk finishes, and a rerun skips the
+sentences already in the output, so an interrupted batch resumes where it
+stopped.
+"""
+
+import os
+import csv
+import fcntl
+import json
+import time
+import uuid
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import canonicalize_text
+
+
+def read_batch_input(path):
+    """
+    Yield (item_id, thai_text) from a JSONL, CSV or plain text file.
+    JSONL records and CSV rows use 'thai_text' (or 'text') and an optional
+    'id'; without an id the item's position in the file is used, which is
+    stable across reruns.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if extension == '.csv':
+            for index, row in enumerate(csv.DictReader(f)):
+                text = row.get('thai_text') or row.get('text') or ''
+                yield str(row.get('id') or index), text.strip()
+        elif extension in ('.jsonl', '.ndjson'):
+            for index, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield str(index), record.strip()
+                elif not isinstance(record, dict):
+                    raise ValueError(f"line {index + 1} is not a JSON object or string")
+                else:
+                    text = record.get('thai_text') or record.get('text') or ''
+                    if not isinstance(text, str):
+                        raise ValueError(f"line {index + 1}: thai_text must be a string")
+                    yield str(record.get('id', index)), text.strip()
+        else:
+            for index, line in enumerate(f):
+                if line.strip():
+                    yield str(index), line.strip()
+
+
+def completed_ids(output_path, failed=None):
+    """
+    Ids already written to output_path; a line cut off by an interruption is ignored.
+    Ids of results with an error are also added to the failed set, if given.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                done.add(str(result['id']))
+            except (ValueError, KeyError, TypeError):
+                continue
+            if failed is not None and result.get('error'):
+                failed.add(str(result['id']))
+    return done
+
+
+def _truncate_partial_line(output_path):
+    """Drop a trailing line without newline (the write interrupted), so appends start cleanly"""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'rb+') as f:
+        content = f.read()
+        if content and not content.endswith(b'\n'):
+            f.truncate(content.rfind(b'\n') + 1)
+
+
+def input_validator_check(validator):
+    """Adapt an InputValidator to BatchProcessor's validate callable"""
+    def validate(thai_text):
+        validation = validator.validate_input(thai_text)
+        if validation['is_valid']:
+            return None
+        return '; '.join(error['message']['en'] for error in validation['errors'])
+    return validate
+
+
+class BatchProcessor:
+    """Runs sentences through ModelManager's models chunk by chunk"""
+
+    def __init__(self, model_manager, chunk_size=32, translation_concurrency=4,
+                 explanation_concurrency=4, include_explanation=True, validate=None):
+        """
+        Initialize batch processor
+
+        Args:
+            model_manager: ModelManager whose models are used
+            chunk_size: Sentences processed (and written) together
+            translation_concurrency: Translations submitted at once
+            explanation_concurrency: Explanations requested at once
+            include_explanation: Generate grammar explanations
+            validate: Optional callable(thai_text) -> error message or None
+        """
+        self.models = model_manager
+        self.chunk_size = max(1, chunk_size)
+        self.translation_concurrency = max(1, translation_concurrency)
+        self.explanation_concurrency = max(1, explanation_concurrency)
+        self.include_explanation = include_explanation
+        self.validate = validate
+
+    def _translate(self, thai_text):
+        from .pipeline import extract_first_sentence
+        translation = self.models.translator.translate(thai_text)
+        first_sentence, is_multi_sentence = extract_first_sentence(translation)
+        return translation, first_sentence, is_multi_sentence
+
+    def process_chunk(self, items, heartbeat=None):
+        """
+        Process [(item_id, thai_text)] and return one result dict per item, in order.
+        heartbeat, if given, is called as each sentence finishes a step.
+        """
+        from .pipeline import is_fragment
+
+        def beat():
+            if heartbeat:
+                heartbeat()
+
+        results = [{'id': item_id, 'input_thai': thai_text} for item_id, thai_text in items]
+        pending = []
+        for result in results:
+            error = self.validate(result['input_thai']) if self.validate else None
+            if error:
+                result['error'] = error
+            else:
+                pending.append(result)
+
+        # Step 1: Translations, concurrently; identical inputs are translated once
+        unique_texts = {}
+        for result in pending:
+            unique_texts.setdefault(canonicalize_text(result['input_thai']), result['input_thai'])
+        translations = {}
+        if self.models.translator is None:
+            for result in pending:
+                result['error'] = 'Translation service unavailable'
+        else:
+            with ThreadPoolExecutor(max_workers=self.translation_concurrency) as pool:
+                futures = {key: pool.submit(self._translate, text) for key, text in unique_texts.items()}
+                for key, future in futures.items():
+                    try:
+                        translations[key] = future.result()
+                    except Exception as e:
+                        translations[key] = e
+                    beat()
+
+        sentences, fragments = [], []
+        for result in pending:
+            translated = translations.get(canonicalize_text(result['input_thai']))
+            if translated is None:
+                continue
+            if isinstance(translated, Exception):
+                result['error'] = f"Translation failed: {translated}"
+                continue
+            result['translation'], result['analyzed_sentence'], result['is_multi_sentence'] = translated
+            if is_fragment(result['analyzed_sentence']):
+                result['is_fragment'] = True
+                fragments.append(result)
+            else:
+                sentences.append(result)
+
+        # Step 2: Classification of the whole chunk in length-bucketed batches
+        if sentences:
+            if self.models.classifier is None:
+                for result in sentences:
+                    result['error'] = 'Classification service unavailable'
+                sentences = []
+            else:
+                try:
+                    classified = self.models.classifier.classify_batch(
+                        [result['analyzed_sentence'] for result in sentences]
+                    )
+                    for result, classification in zip(sentences, classified):
+                        for key in ('coarse_label', 'fine_label', 'fine_code', 'confidence', 'all_predictions'):
+                            result[key] = classification[key]
+                except Exception as e:
+                    for result in sentences:
+                        result['error'] = f"Classification failed: {e}"
+                    sentences = []
+                beat()
+
+        # Step 3: Explanations and fragment guides, concurrently
+        if self.include_explanation and (sentences or fragments):
+            with ThreadPoolExecutor(max_workers=self.explanation_concurrency) as pool:
+                futures = []
+                if self.models.explainer:
+                    futures += [(result, pool.submit(self.models.explainer.explain, dict(result)))
+                                for result in sentences]
+                if self.models.fragment_handler:
+                    futures += [(result, pool.submit(self.models.fragment_handler.handle_fragment,
+                                                     result['input_thai'], result['analyzed_sentence']))
+                                for result in fragments]
+                for result, future in futures:
+                    try:
+                        explanation = future.result()
+                        if result.get('is_fragment'):
+                            explanation = explanation.get('explanation')
+                        result['explanation'] = explanation
+                    except Exception as e:
+                        result['explanation_error'] = str(e)
+                    beat()
+
+        return results
+
+    def run(self, items, output_path, resume=True, on_progress=None, heartbeat=None):
+        """
+        Process items and append results to output_path (JSONL).
+
+        Args:
+            items: Iterable of (item_id, thai_text)
+            output_path: JSONL file results are appended to
+            resume: Skip items whose id is already in output_path
+                (otherwise the file is overwritten)
+            on_progress: Optional callback(stats) after each chunk
+            heartbeat: Optional callback() as each sentence finishes a step
+
+        Returns:
+            dict: processed, skipped, failed, elapsed seconds and sentences/s
+        """
+        if resume:
+            _truncate_partial_line(output_path)
+            done = completed_ids(output_path)
+        else:
+            done = set()
+            open(output_path, 'w').close()
+
+        stats = {'processed': 0, 'skipped': 0, 'failed': 0, 'elapsed': 0.0, 'sentences_per_second': 0.0}
+        start = time.time()
+
+        def flush(chunk, out):
+            results = self.process_chunk(chunk, heartbeat=heartbeat)
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            # Each finished chunk survives a crash
+            os.fsync(out.fileno())
+            stats['processed'] += len(results)
+            stats['failed'] += sum(1 for result in results if result.get('error'))
+            stats['elapsed'] = round(time.time() - start, 2)
+            stats['sentences_per_second'] = round(stats['processed'] / max(stats['elapsed'], 1e-9), 2)
+            if on_progress:
+                on_progress(dict(stats))
+
+        with open(output_path, 'a', encoding='utf-8') as out:
+            chunk = []
+            for item_id, thai_text in items:
+                if item_id in done:
+                    stats['skipped'] += 1
+                    continue
+                # Repeated ids within the file are processed once
+                done.add(item_id)
+                chunk.append((item_id, thai_text))
+                if len(chunk) >= self.chunk_size:
+                    flush(chunk, out)
+                    chunk = []
+            if chunk:
+                flush(chunk, out)
+
+        stats['elapsed'] = round(time.time() - start, 2)
+        return stats
+
+
+class BatchJobs:
+    """
+    Batch jobs submitted through the API. Each job has a directory with its
+    input, output.jsonl and status.json, so any worker can report on it;
+    jobs run one at a time on a background thread of the worker that
+    accepted them. The worker holds an exclusive lock on the job's lock file
+    from the moment it queues the job until the run ends, so a job is only
+    reported interrupted (and can only be resumed) once no process holds it.
+    """
+
+    # A running job's status is refreshed after every sentence; one not
+    # updated for this long is checked against the job lock
+    STALE_AFTER = 120
+
+    def __init__(self, root, make_processor):
+        """
+        Initialize batch jobs
+
+        Args:
+            root: Directory holding one subdirectory per job
+            make_processor: Callable returning a BatchProcessor
+        """
+        self.root = root
+        self.make_processor = make_processor
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Threads do not survive fork, so every worker starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='batch')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _job_dir(self, job_id):
+        # Job ids are generated hex strings; anything else never names a directory
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        return os.path.join(self.root, job_id)
+
+    @staticmethod
+    def _lock_job(job_dir):
+        """Open file holding the job's exclusive lock, or None while another runner holds it"""
+        lock_file = open(os.path.join(job_dir, 'lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _is_locked(self, job_dir):
+        lock_file = self._lock_job(job_dir)
+        if lock_file is None:
+            return True
+        lock_file.close()
+        return False
+
+    def _write_status(self, job_dir, status):
+        status['updated_at'] = time.time()
+        path = os.path.join(job_dir, 'status.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(path + '.tmp', path)
+
+    def status(self, job_id):
+        """Job status dict, or None for unknown jobs"""
+        job_dir = self._job_dir(job_id)
+        if job_dir is None or not os.path.exists(os.path.join(job_dir, 'status.json')):
+            return None
+        with open(os.path.join(job_dir, 'status.json'), encoding='utf-8') as f:
+            status = json.load(f)
+        if status['state'] in ('queued', 'running') and time.time() - status['updated_at'] > self.STALE_AFTER \
+                and not self._is_locked(job_dir):
+            status['state'] = 'interrupted'
+        return status
+
+    def output_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), 'output.jsonl')
+
+    def submit(self, owner_id, filename, content, include_explanation=True, max_sentences=None):
+        """
+        Store an uploaded file and queue it; returns the job id.
+        Raises ValueError for unreadable files or more than max_sentences sentences;
+        nothing is kept of a rejected file.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.root, job_id)
+        os.makedirs(job_dir)
+        extension = os.path.splitext(filename or '')[1].lower()
+        input_path = os.path.join(job_dir, 'input' + (extension if extension in ('.csv', '.jsonl', '.ndjson') else '.txt'))
+        with open(input_path, 'wb') as f:
+            f.write(content)
+
+        try:
+            total = sum(1 for _ in read_batch_input(input_path))
+            if max_sentences is not None and total > max_sentences:
+                raise ValueError(f"too many sentences ({total}, max {max_sentences})")
+        except ValueError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        except Exception as e:
+            # e.g. csv.Error for a malformed CSV
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise ValueError(str(e)) from e
+        lock_file = self._lock_job(job_dir)
+        self._write_status(job_dir, {
+            'job_id': job_id,
+            'owner_id': owner_id,
+            'state': 'queued',
+            'input_path': input_path,
+            'include_explanation': include_explanation,
+            'total': total,
+            'processed': 0,
+            'failed': 0,
+            'sentences_per_second': 0.0,
+            'created_at': time.time()
+        })
+        self._get_executor().submit(self._run, job_id, lock_file)
+        return job_id
+
+    def resume(self, job_id):
+        """
+        Queue an interrupted job again; it continues after its last written chunk.
+        Returns False (and does nothing) while another runner still holds the job.
+        """
+        job_dir = self._job_dir(job_id)
+        lock_file = self._lock_job(job_dir)
+        if lock_file is None:
+            return False
+        status = self.status(job_id)
+        status.update(state='queued', error=None)
+        self._write_status(job_dir, status)
+        self._get_executor().submit(self._run, job_id, lock_file)
+        return True
+
+    def _run(self, job_id, lock_file):
+        try:
+            self._run_locked(job_id)
+        finally:
+            # Closing the file releases the job lock
+            lock_file.close()
+
+    def _run_locked(self, job_id):
+        job_dir = self._job_dir(job_id)
+        status = self.status(job_id)
+        status['state'] = 'running'
+        self._write_status(job_dir, status)
+
+        def heartbeat():
+            self._write_status(job_dir, status)
+
+        def on_progress(stats):
+            status.update(processed=status['done_before'] + stats['processed'],
+                          failed=status['failed_before'] + stats['failed'],
+                          sentences_per_second=stats['sentences_per_second'])
+            self._write_status(job_dir, status)
+
+        try:
+            # Counted from the output, so results of earlier runs keep their errors
+            failed_before = set()
+            status['done_before'] = len(completed_ids(self.output_path(job_id), failed_before))
+            status['failed_before'] = len(failed_before)
+            processor = self.make_processor(status['include_explanation'])
+            stats = processor.run(read_batch_input(status['input_path']), self.output_path(job_id),
+                                  resume=True, on_progress=on_progress, heartbeat=heartbeat)
+            status.update(state='completed', elapsed=stats['elapsed'])
+            print(f"✓ Batch job {job_id}: {status['processed']} sentences "
+                  f"({stats['sentences_per_second']} sentences/s)")
+        except Exception as e:
+            status.update(state='failed', error=str(e))
+            print(f"✗ Batch job {job_id} failed: {e}")
+        self._write_status(job_dir, status)
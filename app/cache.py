@@ -0,0 +1,572 @@
+"""
+Result caching for the NLP pipeline.
+Provides an in-process LRU tier and a SQLite tier that is shared by all
+gunicorn workers on the host and survives restarts.
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+# Characters that are invisible in rendered Thai text but change the cache key
+ZERO_WIDTH_CHARS = '\u200b\u200c\u200d\u2060\ufeff'
+_zero_width_pattern = re.compile(f'[{ZERO_WIDTH_CHARS}]')
+_whitespace_pattern = re.compile(r'\s+')
+
+_MISSING = object()
+
+
+def _approx_size(value):
+    """Rough in-memory size in bytes of a JSON-like value"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_approx_size(item) for item in value)
+    return size
+
+
+def canonicalize_text(text):
+    """
+    Canonical form of Thai input and English sentences used for cache keys.
+    Applies NFC normalization, drops zero-width characters and collapses
+    whitespace; case is kept because the classifier is case-sensitive.
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFC', text)
+    text = _zero_width_pattern.sub('', text)
+    text = _whitespace_pattern.sub(' ', text)
+    return text.strip()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with optional age-based expiry"""
+
+    def __init__(self, max_entries=1024, max_age=None):
+        """
+        Initialize LRU cache
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            max_age: Maximum entry age in seconds (None = no expiry)
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self.lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """Return cached value for key, or default if missing or expired"""
+        with self.lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            stored_at, value = entry
+            if self.max_age is not None and time.time() - stored_at > self.max_age:
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, stored_at=None):
+        """Store value under key, evicting the least recently used entries"""
+        with self.lock:
+            self._entries[key] = (stored_at or time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a single entry"""
+        with self.lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self.lock:
+            self._entries.clear()
+
+    def items(self):
+        """Snapshot of (key, value) pairs, least recently used first"""
+        with self.lock:
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def __len__(self):
+        with self.lock:
+            return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    Key/value store in a local SQLite file.
+    Every worker process opens its own connection; WAL mode lets readers
+    and a writer work concurrently.
+    """
+
+    # Run eviction once every N writes instead of on every insert
+    EVICTION_INTERVAL = 50
+
+    # Only refresh last_access on reads if it is older than this (seconds)
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path, table, max_entries=50000, max_age=None):
+        """
+        Initialize SQLite store
+
+        Args:
+            path: Database file path (parent directory is created if needed)
+            table: Table name used for this store
+            max_entries: Maximum rows kept before least recently used rows are evicted
+            max_age: Maximum row age in seconds (None = no expiry)
+        """
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table} (last_access)")
+        conn.commit()
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across fork()
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return (decoded value, created_at) stored under key, or None"""
+        conn = self._connection()
+        row = conn.execute(
+            f"SELECT value, created_at, last_access FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, created_at, last_access = row
+        now = time.time()
+        if self.max_age is not None and now - created_at > self.max_age:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
+            return None
+
+        if now - last_access > self.TOUCH_INTERVAL:
+            conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+
+        return json.loads(value), created_at
+
+    def set(self, key, value):
+        """Store a JSON-serializable value under key"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now, now)
+        )
+        conn.commit()
+
+        with self._writes_lock:
+            self._writes += 1
+            run_eviction = self._writes % self.EVICTION_INTERVAL == 0
+        if run_eviction:
+            self.evict()
+
+    def delete(self, key):
+        """Remove a single row"""
+        conn = self._connection()
+        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        conn.commit()
+
+    def evict(self):
+        """Remove expired rows and trim the table to max_entries"""
+        conn = self._connection()
+        if self.max_age is not None:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.max_age,))
+
+        count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?
+                )
+            """, (overflow,))
+        conn.commit()
+
+    def clear(self):
+        """Remove all rows, returning how many were deleted"""
+        conn = self._connection()
+        deleted = conn.execute(f"DELETE FROM {self.table}").rowcount
+        conn.commit()
+        return deleted
+
+    def __len__(self):
+        return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class TranslationCache:
+    """
+    Two-tier cache for Thai to English translations.
+    Lookups try the in-process LRU first, then the shared SQLite store.
+    """
+
+    def __init__(self, path=None, namespace='', memory_entries=2048,
+                 disk_entries=100000, max_age=30 * 24 * 3600):
+        """
+        Initialize translation cache
+
+        Args:
+            path: SQLite file for the shared tier (None = memory tier only)
+            namespace: Prefix added to every key, e.g. the model file name,
+                so switching models does not serve stale translations
+            memory_entries: Size of the in-process LRU tier
+            disk_entries: Size of the shared SQLite tier
+            max_age: Maximum entry age in seconds for both tiers
+        """
+        self.namespace = namespace
+        self.memory = LRUCache(max_entries=memory_entries, max_age=max_age)
+        self.disk = None
+
+        if path:
+            try:
+                self.disk = SQLiteStore(path, 'translations', max_entries=disk_entries, max_age=max_age)
+            except (sqlite3.Error, OSError) as e:
+                print(f"✗ Translation cache store unavailable ({e}), using memory tier only")
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.lock = threading.Lock()
+
+    def _key(self, thai_text, variant=''):
+        key = f"{self.namespace}\x1f{canonicalize_text(thai_text)}"
+        if variant:
+            # Results of other translation modes must not collide with full translations
+            key = f"{variant}\x1f{key}"
+        return key
+
+    def get(self, thai_text, variant=''):
+        """Return cached translation for thai_text, or None on a miss"""
+        key = self._key(thai_text, variant)
+
+        translation = self.memory.get(key)
+        if translation is not None:
+            with self.lock:
+                self.memory_hits += 1
+            return translation
+
+        if self.disk is not None:
+            try:
+                row = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"Translation cache read failed: {e}")
+                row = None
+
+            if row is not None:
+                translation, created_at = row
+                # Keeps the disk entry's age, so the memory tier cannot outlive its TTL
+                self.memory.set(key, translation, stored_at=created_at)
+                with self.lock:
+                    self.disk_hits += 1
+                return translation
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, thai_text, translation, variant=''):
+        """Store a translation in both tiers"""
+        key = self._key(thai_text, variant)
+        self.memory.set(key, translation)
+
+        if self.disk is not None:
+            try:
+                self.disk.set(key, translation)
+            except sqlite3.Error as e:
+                print(f"Translation cache write failed: {e}")
+
+        with self.lock:
+            self.stores += 1
+
+    def clear(self):
+        """Remove all cached translations from both tiers"""
+        self.memory.clear()
+        if self.disk is not None:
+            return self.disk.clear()
+        return 0
+
+    def get_stats(self):
+        """Get hit/miss counters and tier sizes"""
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            stats = {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self.memory)
+            }
+
+        if self.disk is not None:
+            try:
+                stats['disk_entries'] = len(self.disk)
+            except sqlite3.Error:
+                stats['disk_entries'] = None
+        return stats
+
+
+class ClassificationCache:
+    """
+    In-process LRU cache of tense classification results.
+    Keys combine the normalized sentence, top_k and a fingerprint of the
+    loaded model, so results from a replaced checkpoint are never served.
+    """
+
+    def __init__(self, fingerprint='', max_entries=4096, max_age=24 * 3600):
+        """
+        Initialize classification cache
+
+        Args:
+            fingerprint: Identifies the loaded classifier weights and backend
+            max_entries: Maximum number of cached results
+            max_age: Maximum entry age in seconds
+        """
+        self.fingerprint = fingerprint
+        self.memory = LRUCache(max_entries=max_entries, max_age=max_age)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.lock = threading.Lock()
+
+    def _key(self, sentence, top_k):
+        return f"{self.fingerprint}\x1f{top_k}\x1f{canonicalize_text(sentence)}"
+
+    def get(self, sentence, top_k):
+        """Return a copy of the cached result, or None on a miss"""
+        result = self.memory.get(self._key(sentence, top_k))
+        with self.lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Callers may modify the dict they get back
+        return copy.deepcopy(result)
+
+    def set(self, sentence, top_k, result):
+        """Store a classification result"""
+        self.memory.set(self._key(sentence, top_k), copy.deepcopy(result))
+        with self.lock:
+            self.stores += 1
+
+    def clear(self):
+        """Remove all cached results"""
+        count = len(self.memory)
+        self.memory.clear()
+        return count
+
+    def get_stats(self):
+        """Get hit ratio, size and approximate memory use"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+        stats['entries'] = len(self.memory)
+        stats['max_entries'] = self.memory.max_entries
+        stats['approx_memory_kb'] = round(
+            sum(_approx_size(key) + _approx_size(value) for key, value in self.memory.items()) / 1024, 1)
+        stats['fingerprint'] = self.fingerprint
+        return stats
+
+
+class ExplanationCache:
+    """
+    Two-tier cache of parsed grammar explanations.
+    Keys combine the analyzed sentence, fine tense code, multi-sentence flag,
+    confidence tier and prompt-template version, so editing the prompt never
+    serves explanations written for the old one. The SQLite tier is shared by
+    all workers; a purge in one worker also empties the memory tier of the
+    others within PURGE_CHECK_INTERVAL seconds.
+    """
+
+    # How often the memory tier checks for a purge made by another process (seconds)
+    PURGE_CHECK_INTERVAL = 5
+
+    def __init__(self, path=None, namespace='', memory_entries=512,
+                 disk_entries=50000, max_age=7 * 24 * 3600):
+        """
+        Initialize explanation cache
+
+        Args:
+            path: SQLite file for the shared tier (None = memory tier only)
+            namespace: Prefix added to every key, e.g. the explainer model and
+                prompt version, so switching either does not serve stale explanations
+            memory_entries: Size of the in-process LRU tier
+            disk_entries: Size of the shared SQLite tier
+            max_age: Maximum entry age in seconds for both tiers
+        """
+        self.namespace = namespace
+        self.memory = LRUCache(max_entries=memory_entries, max_age=max_age)
+        self.disk = None
+        self.purges = None
+
+        if path:
+            try:
+                self.disk = SQLiteStore(path, 'explanations', max_entries=disk_entries, max_age=max_age)
+                self.purges = SQLiteStore(path, 'explanation_purges')
+            except (sqlite3.Error, OSError) as e:
+                print(f"✗ Explanation cache store unavailable ({e}), using memory tier only")
+                self.disk = None
+                self.purges = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.lock = threading.Lock()
+        self._purge_seen = self._last_purge()
+        self._purge_checked = time.time()
+
+    def _key(self, analyzed_sentence, fine_code, is_multi_sentence, confidence_tier):
+        return (f"{self.namespace}\x1f{fine_code}\x1f{int(bool(is_multi_sentence))}\x1f"
+                f"{confidence_tier}\x1f{canonicalize_text(analyzed_sentence)}")
+
+    def _last_purge(self):
+        """Time of the most recent purge by any worker (0 if none or unknown)"""
+        if self.purges is None:
+            return 0
+        try:
+            return self.purges.get('purged_at', 0)
+        except sqlite3.Error:
+            return 0
+
+    def _sync_purges(self):
+        """Drop the memory tier if another worker purged the cache since the last check"""
+        now = time.time()
+        with self.lock:
+            if now - self._purge_checked < self.PURGE_CHECK_INTERVAL:
+                return
+            self._purge_checked = now
+
+        purged_at = self._last_purge()
+        if purged_at > self._purge_seen:
+            self._purge_seen = purged_at
+            self.memory.clear()
+
+    def get(self, analyzed_sentence, fine_code, is_multi_sentence, confidence_tier):
+        """Return a copy of the cached explanation, or None on a miss"""
+        self._sync_purges()
+        key = self._key(analyzed_sentence, fine_code, is_multi_sentence, confidence_tier)
+
+        explanation = self.memory.get(key)
+        if explanation is not None:
+            with self.lock:
+                self.memory_hits += 1
+            # Callers may modify the dict they get back
+            return copy.deepcopy(explanation)
+
+        if self.disk is not None:
+            try:
+                row = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"Explanation cache read failed: {e}")
+                row = None
+
+            if row is not None:
+                explanation, created_at = row
+                # Keeps the disk entry's age, so the memory tier cannot outlive its TTL
+                self.memory.set(key, explanation, stored_at=created_at)
+                with self.lock:
+                    self.disk_hits += 1
+                return copy.deepcopy(explanation)
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, analyzed_sentence, fine_code, is_multi_sentence, confidence_tier, explanation):
+        """Store a parsed explanation in both tiers"""
+        key = self._key(analyzed_sentence, fine_code, is_multi_sentence, confidence_tier)
+        self.memory.set(key, copy.deepcopy(explanation))
+
+        if self.disk is not None:
+            try:
+                self.disk.set(key, explanation)
+            except sqlite3.Error as e:
+                print(f"Explanation cache write failed: {e}")
+
+        with self.lock:
+            self.stores += 1
+
+    def clear(self):
+        """Remove all cached explanations for every worker, returning how many rows were deleted"""
+        self.memory.clear()
+        deleted = 0
+        if self.disk is not None:
+            deleted = self.disk.clear()
+            purged_at = time.time()
+            self.purges.set('purged_at', purged_at)
+            self._purge_seen = purged_at
+        return deleted
+
+    def get_stats(self):
+        """Get hit/miss counters and tier sizes"""
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            stats = {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self.memory)
+            }
+
+        if self.disk is not None:
+            try:
+                stats['disk_entries'] = len(self.disk)
+            except sqlite3.Error:
+                stats['disk_entries'] = None
+        if self._purge_seen:
+            stats['last_purge'] = self._purge_seen
+        return stats
@@ -0,0 +1,54 @@
+"""
+PyTorch definition of the hierarchical XLM-RoBERTa tense classifier.
+Kept separate from the pipeline so torch and transformers are only imported
+by backends that need them.
+"""
+
+import torch.nn as nn
+from transformers import XLMRobertaModel, AutoConfig, PreTrainedModel
+
+
+class XLMRHierClassifier(PreTrainedModel):
+    """
+    Hierarchical XLM-RoBERTa classifier for tense classification
+    Predicts both coarse (Past/Present/Future) and fine-grained tense labels
+    """
+    config_class = AutoConfig
+
+    def __init__(self, config, n_coarse=3, n_fine=25, coarse_w=0.3):
+        super().__init__(config)
+        self.encoder = XLMRobertaModel(config, add_pooling_layer=False)
+        h = self.encoder.config.hidden_size
+
+        # Dual classification heads
+        self.coarse_head = nn.Linear(h, n_coarse)  # Past/Present/Future
+        self.fine_head = nn.Linear(h, n_fine)      # Detailed tense categories
+
+        self.crit = nn.CrossEntropyLoss()
+        self.coarse_w = coarse_w  # Loss weighting
+        self.post_init()
+
+    def forward(self, input_ids=None, attention_mask=None, labels=None, **_):
+        # Encode input
+        hidden = self.encoder(input_ids, attention_mask=attention_mask).last_hidden_state
+        pooled = hidden[:, 0]  # Use CLS token
+
+        # Predict both levels
+        logits_c = self.coarse_head(pooled)
+        logits_f = self.fine_head(pooled)
+
+        if labels is None:
+            return {"logits": (logits_c, logits_f)}
+
+        # Calculate hierarchical loss
+        lab_c, lab_f = labels[:, 0], labels[:, 1]
+        loss_c = self.crit(logits_c, lab_c)
+
+        mask = lab_f != -100
+        if mask.any():
+            loss_f = self.crit(logits_f[mask], lab_f[mask])
+            loss = self.coarse_w * loss_c + (1 - self.coarse_w) * loss_f
+        else:
+            loss = loss_c
+
+        return {"loss": loss, "logits": (logits_c, logits_f)}
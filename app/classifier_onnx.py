@@ -0,0 +1,85 @@
+"""
+ONNX Runtime backend for the XLM-R tense classifier.
+export_classifier_onnx.py writes the graph next to the PyTorch weights; at
+serving time only onnxruntime, tokenizers and numpy are imported, never
+torch or transformers.
+"""
+
+import os
+
+import numpy as np
+
+
+ONNX_MODEL_NAME = 'model.onnx'
+INPUT_NAMES = ['input_ids', 'attention_mask']
+OUTPUT_NAMES = ['coarse_logits', 'fine_logits']
+
+
+def export_onnx(model, path, opset_version=17):
+    """Export XLMRHierClassifier with dynamic batch and sequence axes"""
+    import torch
+
+    class _LogitsOnly(torch.nn.Module):
+        """forward() returns a dict; the graph needs a plain tuple of outputs"""
+
+        def __init__(self, classifier):
+            super().__init__()
+            self.classifier = classifier
+
+        def forward(self, input_ids, attention_mask):
+            coarse_logits, fine_logits = self.classifier(input_ids=input_ids, attention_mask=attention_mask)["logits"]
+            return coarse_logits, fine_logits
+
+    dummy_ids = torch.ones((2, 8), dtype=torch.long)
+    dummy_mask = torch.ones((2, 8), dtype=torch.long)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in INPUT_NAMES}
+    dynamic_axes.update({name: {0: 'batch'} for name in OUTPUT_NAMES})
+
+    with torch.inference_mode():
+        torch.onnx.export(
+            _LogitsOnly(model.eval()),
+            (dummy_ids, dummy_mask),
+            path,
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            do_constant_folding=True
+        )
+    return path
+
+
+def create_session(model_path, threads=None):
+    """Open the exported graph on the CPU provider with all graph optimizations"""
+    import onnxruntime as ort
+
+    onnx_path = os.path.join(model_path, ONNX_MODEL_NAME)
+    if not os.path.exists(onnx_path):
+        raise FileNotFoundError(f"{onnx_path} not found (run export_classifier_onnx.py)")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def load_tokenizer(model_path, max_length=512):
+    """Fast tokenizer from tokenizer.json, without importing transformers"""
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(os.path.join(model_path, 'tokenizer.json'))
+    tokenizer.enable_truncation(max_length=max_length)
+    tokenizer.no_padding()
+    return tokenizer
+
+
+def pad_batch(id_lists, pad_token_id):
+    """Right-pad token id lists to the longest one; returns (input_ids, attention_mask) int64 arrays"""
+    longest = max(len(ids) for ids in id_lists)
+    input_ids = np.full((len(id_lists), longest), pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(id_lists), longest), dtype=np.int64)
+    for row, ids in enumerate(id_lists):
+        input_ids[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+    return input_ids, attention_mask
@@ -0,0 +1,78 @@
+"""
+Dynamic int8 quantization for the XLM-R tense classifier.
+The int8 backend is only enabled after verify_classifier_int8.py has compared
+it against the fp32 model and recorded a passing gate file next to the weights.
+"""
+
+import os
+import json
+
+
+# Files written into the classifier model directory
+INT8_ARTIFACT_NAME = 'model.int8.pt'
+INT8_GATE_NAME = 'int8_gate.json'
+
+
+def quantize_encoder(model):
+    """Replace the encoder's nn.Linear layers with dynamically quantized int8 layers (in place)"""
+    import torch
+    import torch.nn as nn
+
+    torch.ao.quantization.quantize_dynamic(model.encoder, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def load_int8_state_dict(path):
+    """
+    Load a saved int8 state dict (from verify_classifier_int8.py --save-artifact).
+    Only tensors are unpickled (weights_only=True), never arbitrary objects; the
+    result is loaded into a model rebuilt with quantize_encoder.
+    """
+    import torch
+
+    return torch.load(path, map_location='cpu', weights_only=True)
+
+
+def weights_fingerprint(model_path):
+    """Identify the fp32 weights a gate was computed for, so retrained weights need a new verification"""
+    stat = os.stat(os.path.join(model_path, 'model.safetensors'))
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def read_int8_gate(model_path):
+    """Return the recorded verification result, or None if there is none"""
+    path = os.path.join(model_path, INT8_GATE_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_int8_gate(model_path, report):
+    """Record a verification result next to the weights"""
+    path = os.path.join(model_path, INT8_GATE_NAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def int8_gate_status(model_path):
+    """
+    Check whether the int8 backend may be used for the weights in model_path.
+
+    Returns:
+        tuple: (allowed, reason)
+    """
+    gate = read_int8_gate(model_path)
+    if gate is None:
+        return False, "no verification recorded (run verify_classifier_int8.py)"
+    if not gate.get('passed'):
+        return False, (f"verification failed: fine agreement {gate.get('fine_agreement')} "
+                       f"below threshold {gate.get('threshold')}")
+    try:
+        if gate.get('weights_fingerprint') != weights_fingerprint(model_path):
+            return False, "weights changed since verification (run verify_classifier_int8.py again)"
+    except OSError as e:
+        return False, str(e)
+    return True, "verified"
@@ -0,0 +1,121 @@
+"""
+Concurrency limiting for calls to external APIs.
+Unlike a lock, a ConcurrencyLimiter lets several calls run at once, queues
+a bounded number of further callers and rejects the rest, recording how long
+callers waited for a slot.
+"""
+
+import time
+import threading
+import contextlib
+
+from .tracing import span
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when the wait queue is full or no slot frees up in time"""
+    pass
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore with a bounded wait queue and queue-time statistics"""
+
+    def __init__(self, name, max_concurrent=4, max_waiting=16, wait_timeout=30.0):
+        """
+        Initialize limiter
+
+        Args:
+            name: Label used in error messages and statistics
+            max_concurrent: Calls allowed to run at the same time
+            max_waiting: Callers allowed to wait for a slot; further callers are rejected
+            wait_timeout: Maximum seconds a caller waits for a slot (None = no limit)
+        """
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_waiting = max(0, max_waiting)
+        self.wait_timeout = wait_timeout
+        self._condition = threading.Condition()
+
+        self.active = 0
+        self.waiting = 0
+
+        # Statistics
+        self.acquired = 0
+        self.waited = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_active = 0
+        self.peak_waiting = 0
+
+    def acquire(self, timeout=None):
+        """
+        Take a slot, waiting if all are in use.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if timeout is None:
+            timeout = self.wait_timeout
+        start = time.time()
+
+        with self._condition:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise ConcurrencyLimitExceeded(
+                        f"{self.name}: {self.active} calls running and {self.waiting} waiting")
+
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                try:
+                    has_slot = self._condition.wait_for(lambda: self.active < self.max_concurrent, timeout)
+                finally:
+                    self.waiting -= 1
+                if not has_slot:
+                    self.timed_out += 1
+                    raise ConcurrencyLimitExceeded(f"{self.name}: no free slot after {timeout}s")
+                self.waited += 1
+
+            wait = time.time() - start
+            self.active += 1
+            self.acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_active = max(self.peak_active, self.active)
+        return wait
+
+    def release(self):
+        """Return a slot and wake one waiting caller"""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def slot(self, timeout=None):
+        """Hold a slot for the duration of a with-block"""
+        with span(f"wait.{self.name}"):
+            self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self):
+        """Get slot usage and queue-time statistics"""
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_waiting': self.max_waiting,
+                'active': self.active,
+                'waiting': self.waiting,
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_wait_ms': round(self.total_wait / self.acquired * 1000, 1) if self.acquired else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 1),
+                'peak_active': self.peak_active,
+                'peak_waiting': self.peak_waiting
+            }
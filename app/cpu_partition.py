@@ -0,0 +1,173 @@
+"""
+CPU partitioning between the llama.cpp translator and the torch classifier.
+Each gunicorn worker gets its own slice of the host's cores, split into
+disjoint translator and classifier sets, so concurrent workers and the two
+runtimes inside a worker do not oversubscribe the CPU.
+
+Enabled with CPU_PARTITIONING=1. gunicorn_config.py exports the worker's
+index and the worker count; CPU_AFFINITY=1 additionally restricts the worker
+to its slice (apply_worker_affinity, from post_fork before the models load)
+and pins each runtime's threads to its core set.
+"""
+
+import os
+import contextlib
+
+
+def available_cores():
+    """Cores this process may run on (respects cgroup/taskset restrictions)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuPartition:
+    """Disjoint translator and classifier core sets of one worker"""
+
+    def __init__(self, translator_cores, classifier_cores, pin=False):
+        """
+        Initialize partition
+
+        Args:
+            translator_cores: Core ids for llama.cpp threads
+            classifier_cores: Core ids for torch / ONNX Runtime threads
+            pin: Restrict threads to their core sets with sched_setaffinity
+        """
+        self.translator_cores = list(translator_cores)
+        self.classifier_cores = list(classifier_cores)
+        self.pin = pin and hasattr(os, 'sched_setaffinity')
+
+    @property
+    def translator_threads(self):
+        return len(self.translator_cores)
+
+    @property
+    def classifier_threads(self):
+        return len(self.classifier_cores)
+
+    def cores_for(self, role):
+        return self.translator_cores if role == 'translator' else self.classifier_cores
+
+    def apply_process_affinity(self):
+        """
+        Restrict the calling thread, and every thread it starts afterwards, to
+        the worker's slice of cores. sched_setaffinity(0) affects only the
+        calling thread, so this covers the whole worker only when called from
+        its main thread before any other thread exists (see apply_worker_affinity).
+        """
+        if self.pin:
+            os.sched_setaffinity(0, set(self.translator_cores) | set(self.classifier_cores))
+
+    @contextlib.contextmanager
+    def pinned(self, role):
+        """
+        Run the calling thread on the role's cores for the duration of a with-block.
+        Only threads the runtime starts inside the block inherit the affinity;
+        thread pools it already started keep theirs, so a runtime's first
+        load or call should happen inside this block.
+        """
+        if not self.pin:
+            yield
+            return
+
+        # pid 0 applies to the calling thread only
+        previous = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, self.cores_for(role))
+        try:
+            yield
+        finally:
+            os.sched_setaffinity(0, previous)
+
+    def to_dict(self):
+        return {
+            'translator_cores': self.translator_cores,
+            'classifier_cores': self.classifier_cores,
+            'translator_threads': self.translator_threads,
+            'classifier_threads': self.classifier_threads,
+            'pinned': self.pin
+        }
+
+
+def plan_partitions(cores, workers, translator_share=0.75, pin=False):
+    """
+    Split cores into one CpuPartition per worker.
+
+    Every worker gets a contiguous slice of cores; within a slice the
+    translator gets translator_share of the cores and the classifier the
+    rest, each at least one. With more workers than cores, slices overlap.
+    """
+    cores = list(cores)
+    workers = max(1, workers)
+    per_worker = max(1, len(cores) // workers)
+
+    partitions = []
+    for index in range(workers):
+        start = (index * per_worker) % len(cores)
+        worker_cores = (cores[start:] + cores[:start])[:per_worker]
+
+        if len(worker_cores) == 1:
+            # Nothing to split: both runtimes share the single core
+            partitions.append(CpuPartition(worker_cores, worker_cores, pin=pin))
+            continue
+
+        n_translator = min(len(worker_cores) - 1, max(1, round(len(worker_cores) * translator_share)))
+        partitions.append(CpuPartition(worker_cores[:n_translator], worker_cores[n_translator:], pin=pin))
+    return partitions
+
+
+_partition = None
+_partition_pid = None
+
+
+def get_worker_partition():
+    """
+    This worker's CpuPartition, or None when partitioning is disabled.
+    Computed once per process from WORKER_INDEX / WORKER_COUNT (set by
+    gunicorn_config.py) and the cores available to the process.
+    """
+    global _partition, _partition_pid
+
+    if os.getenv('CPU_PARTITIONING', '0') != '1':
+        return None
+    if _partition is not None and _partition_pid == os.getpid():
+        return _partition
+
+    workers = int(os.getenv('WORKER_COUNT', 1))
+    index = int(os.getenv('WORKER_INDEX', 0)) % max(1, workers)
+    partitions = plan_partitions(
+        available_cores(),
+        workers,
+        translator_share=float(os.getenv('CPU_TRANSLATOR_SHARE', 0.75)),
+        pin=os.getenv('CPU_AFFINITY', '0') == '1'
+    )
+
+    _partition = partitions[index]
+    _partition_pid = os.getpid()
+    print(f"✓ CPU partition for worker {index}/{workers}: "
+          f"translator cores {_partition.translator_cores}, classifier cores {_partition.classifier_cores}")
+    return _partition
+
+
+def apply_worker_affinity():
+    """
+    Restrict this worker to its slice of cores (CPU_PARTITIONING=1 and
+    CPU_AFFINITY=1). Called once per worker from gunicorn's post_fork, in the
+    worker's only thread and before any model loads, so every thread the
+    worker starts later inherits the restriction.
+    """
+    partition = get_worker_partition()
+    if partition is not None and partition.pin:
+        partition.apply_process_affinity()
+        print(f"✓ Worker {os.getpid()} restricted to cores "
+              f"{sorted(set(partition.translator_cores) | set(partition.classifier_cores))}")
+
+
+@contextlib.contextmanager
+def pinned(role):
+    """Pin the calling thread to role's cores if partitioning with affinity is enabled"""
+    partition = get_worker_partition()
+    if partition is None:
+        yield
+        return
+    with partition.pinned(role):
+        yield
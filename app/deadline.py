@@ -0,0 +1,90 @@
+"""
+Request deadlines for the NLP pipeline.
+full_pipeline activates a Deadline for the duration of the request; the
+stages pick it up with current_deadline() and turn it into their own
+cancellation mechanism: a llama.cpp stopping criterion during token
+generation, an HTTP timeout on Together AI calls and a check between
+classifier buckets. Code running outside a request (background explanation
+jobs, the batcher thread) sees no deadline and runs unbounded as before.
+"""
+
+import time
+import contextlib
+import contextvars
+
+_current_deadline = contextvars.ContextVar('pipeline_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a pipeline stage runs past the request deadline"""
+
+    def __init__(self, stage, budget):
+        self.stage = stage
+        self.budget = budget
+        super().__init__(f"Pipeline execution exceeded {budget:g} seconds limit during {stage}")
+
+
+class Deadline:
+    """Point in time by which a request must finish"""
+
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + seconds
+        # First stage found running past the deadline
+        self.overran_stage = None
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage):
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired():
+            if self.overran_stage is None:
+                self.overran_stage = stage
+            raise DeadlineExceeded(stage, self.budget)
+
+    def clamp(self, seconds):
+        """seconds, shortened to the time left (for timeouts of blocking calls)"""
+        remaining = self.remaining()
+        return remaining if seconds is None else min(seconds, remaining)
+
+    def llama_stopping_criteria(self, stage):
+        """llama.cpp stopping criterion that ends token generation at the deadline"""
+        from llama_cpp import StoppingCriteriaList
+
+        def past_deadline(input_ids, logits):
+            if self.expired():
+                if self.overran_stage is None:
+                    self.overran_stage = stage
+                return True
+            return False
+
+        return StoppingCriteriaList([past_deadline])
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this the current deadline for the calling thread"""
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+
+
+def current_deadline():
+    """Deadline of the request being processed, or None"""
+    return _current_deadline.get()
+
+
+def check_deadline(stage):
+    """Raise DeadlineExceeded if the current request is past its deadline"""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
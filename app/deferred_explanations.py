@@ -0,0 +1,133 @@
+"""
+Background explanation jobs for split-phase /predict.
+The result page renders right after classification while the explanation is
+generated on a small thread pool; the page then fetches it by job id. A
+follow-up request served by another gunicorn worker cannot see this worker's
+jobs, so it picks the finished explanation up from the shared explanation
+cache instead, and restarts the job in its own pool when it looks lost.
+Polls never wait or generate: they answer at once and the page backs off.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DeferredExplanations:
+    """Per-process executor of explanation jobs, addressed by job id"""
+
+    def __init__(self, get_explainer, max_workers=4, handoff_timeout=60.0, retention=600.0):
+        """
+        Initialize deferred explanations
+
+        Args:
+            get_explainer: Callable returning the current explainer (or None)
+            max_workers: Explanation jobs running at once in this process
+            handoff_timeout: Seconds a poll served by another worker keeps looking
+                for the original job in the cache before restarting it
+            retention: Seconds a finished job is kept for its follow-up request
+        """
+        self.get_explainer = get_explainer
+        self.max_workers = max(1, max_workers)
+        self.handoff_timeout = handoff_timeout
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._executor = None
+        self._pid = None
+
+        # Statistics
+        self.submitted = 0
+        self.served_local = 0
+        self.served_cache = 0
+        self.resubmitted = 0
+
+    def _get_executor(self):
+        # Threads do not survive fork, so every worker starts its own pool
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='explanation')
+            self._jobs = {}
+            self._pid = os.getpid()
+        return self._executor
+
+    def _prune(self, now):
+        expired = [job_id for job_id, (future, submitted_at) in self._jobs.items()
+                   if future.done() and now - submitted_at > self.retention]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, job_id, analysis_result):
+        """Start generating the explanation for analysis_result in the background"""
+        explainer = self.get_explainer()
+        if explainer is None:
+            return False
+
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            future = self._get_executor().submit(explainer.explain, analysis_result)
+            self._jobs[job_id] = (future, now)
+            self.submitted += 1
+        return True
+
+    def result(self, job_id, analysis_result, issued_at):
+        """
+        Get the explanation of a submitted job without waiting for it.
+        Never generates in the calling request: a job that looks lost is
+        restarted in the background and reported as pending.
+
+        Args:
+            job_id: Id passed to submit()
+            analysis_result: Analysis the job was submitted with
+            issued_at: Unix time the job was submitted (from the signed token)
+
+        Returns:
+            dict: Parsed explanation, or None while it is still being generated
+        """
+        with self._lock:
+            job = self._jobs.get(job_id) if self._pid == os.getpid() else None
+
+        if job is not None:
+            if not job[0].done():
+                return None
+            explanation = job[0].result()
+            with self._lock:
+                self.served_local += 1
+            return explanation
+
+        # The job runs in another worker: look for it in the shared cache
+        explainer = self.get_explainer()
+        if explainer is None:
+            raise RuntimeError('Explanation service unavailable')
+        lookup = getattr(explainer, 'cached_explanation', None)
+        if lookup is not None and getattr(explainer, 'cache', None):
+            explanation = lookup(analysis_result)
+            if explanation is not None:
+                with self._lock:
+                    self.served_cache += 1
+                return explanation
+            if time.time() - issued_at < self.handoff_timeout:
+                return None
+
+        # No shared cache, or the original job never finished (worker restart,
+        # mock fallback, which is not cached): run it again in this worker
+        with self._lock:
+            self.resubmitted += 1
+        self.submit(job_id, analysis_result)
+        return None
+
+    def get_stats(self):
+        """Get job counts for this process"""
+        with self._lock:
+            running = sum(1 for future, _ in self._jobs.values() if not future.done()) \
+                if self._pid == os.getpid() else 0
+            return {
+                'max_workers': self.max_workers,
+                'submitted': self.submitted,
+                'running': running,
+                'served_local': self.served_local,
+                'served_cache': self.served_cache,
+                'resubmitted': self.resubmitted
+            }
@@ -0,0 +1,349 @@
+"""
+Model server shared by all gunicorn workers.
+One local process owns the translator, classifier and explainer; web workers
+talk to it over a Unix domain socket, so worker count no longer multiplies
+model memory.
+
+Wire protocol: every message is a 4-byte big-endian length followed by a
+UTF-8 JSON body.
+    request:  {"method": "translate", "args": [...], "kwargs": {...}}
+    response: {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+
+Run with:
+    python -m app.model_server --socket /tmp/thai-english-models.sock
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+from .deadline import current_deadline
+from .single_flight import SingleFlight
+from .tracing import span
+
+
+DEFAULT_SOCKET_PATH = '/tmp/thai-english-models.sock'
+
+_header = struct.Struct('!I')
+
+# Refuse frames larger than this (bytes)
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+class ModelServerError(Exception):
+    """Raised by the client when the server reports an error or is unreachable"""
+
+
+def _recv_exactly(sock, size):
+    """
+    Read exactly size bytes, or return None if the peer closed the connection
+    before sending any of them (ConnectionError if it closed part way)
+    """
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            if chunks:
+                raise ConnectionError("Connection closed in the middle of a message")
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, payload):
+    """Send one length-prefixed JSON message"""
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    sock.sendall(_header.pack(len(body)) + body)
+
+
+def recv_message(sock):
+    """
+    Receive one length-prefixed JSON message, or None on EOF before the message.
+    EOF after part of the message raises ConnectionError.
+    """
+    header = _recv_exactly(sock, _header.size)
+    if header is None:
+        return None
+    (size,) = _header.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ModelServerError(f"Message of {size} bytes exceeds limit")
+    body = _recv_exactly(sock, size)
+    if body is None:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return json.loads(body.decode('utf-8'))
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server exposing translate/classify/explain of locally loaded models"""
+
+    daemon_threads = True
+
+    # Methods clients may call, mapped to (component attribute, method name)
+    METHODS = {
+        'translate': ('translator', 'translate'),
+        'translate_first_sentence': ('translator', 'translate_first_sentence'),
+        'classify': ('classifier', 'classify'),
+        'classify_batch': ('classifier', 'classify_batch'),
+        'explain': ('explainer', 'explain'),
+        'handle_fragment': ('fragment_handler', 'handle_fragment'),
+    }
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        from .pipeline import TyphoonTranslator, TenseClassifier, GrammarExplainer, FragmentHandler
+
+        self.socket_path = socket_path
+        self.started_at = time.time()
+        self.request_counts = {method: 0 for method in self.METHODS}
+        self.error_count = 0
+        self.lock = threading.Lock()
+        # Identical calls from different workers at the same time run once
+        self.single_flight = SingleFlight('model_server') if os.getenv('SINGLE_FLIGHT_ENABLED', '1') != '0' else None
+
+        self.translator = TyphoonTranslator()
+        self.classifier = TenseClassifier()
+        self.explainer = GrammarExplainer()
+        self.fragment_handler = FragmentHandler(self.explainer.client)
+
+        # Remove a stale socket left by a previous run
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        super().__init__(socket_path, ModelRequestHandler)
+        os.chmod(socket_path, 0o660)
+        print(f"✓ Model server listening on {socket_path}")
+
+    def dispatch(self, method, args, kwargs):
+        """Call a whitelisted model method"""
+        if method == 'stats':
+            return self.get_stats()
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method: {method}")
+
+        component_name, method_name = self.METHODS[method]
+        component = getattr(self, component_name)
+        with self.lock:
+            self.request_counts[method] += 1
+        call = getattr(component, method_name)
+        if self.single_flight is None:
+            return call(*args, **kwargs)
+        key = json.dumps([args, kwargs], ensure_ascii=False, sort_keys=True)
+        return self.single_flight.do(method, key, lambda: call(*args, **kwargs))
+
+    def get_stats(self):
+        """Get request counters for monitoring"""
+        with self.lock:
+            stats = {
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'requests': dict(self.request_counts),
+                'errors': self.error_count
+            }
+        if getattr(self.translator, 'cache', None):
+            stats['translation_cache'] = self.translator.cache.get_stats()
+        if getattr(self.classifier, 'cache', None):
+            stats['classification_cache'] = self.classifier.cache.get_stats()
+        if getattr(self.explainer, 'cache', None):
+            stats['explanation_cache'] = self.explainer.cache.get_stats()
+        stats['together_api_limiter'] = self.explainer.get_limiter_stats()
+        if self.single_flight:
+            stats['single_flight'] = self.single_flight.get_stats()
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class ModelRequestHandler(socketserver.BaseRequestHandler):
+    """Serves requests on one persistent client connection"""
+
+    def handle(self):
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (OSError, ValueError, ModelServerError) as e:
+                print(f"Model server connection error: {e}")
+                return
+            if message is None:
+                return
+
+            try:
+                result = self.server.dispatch(
+                    message.get('method'),
+                    message.get('args', []),
+                    message.get('kwargs', {})
+                )
+                response = {'ok': True, 'result': result}
+            except Exception as e:
+                with self.server.lock:
+                    self.server.error_count += 1
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class ModelServerClient:
+    """
+    Drop-in replacement for the local translator, classifier, explainer and
+    fragment handler that forwards calls to a ModelServer.
+    Each thread keeps its own persistent connection.
+    """
+
+    # Pipeline stage of each method, for DeadlineExceeded
+    STAGES = {
+        'translate': 'translation',
+        'translate_first_sentence': 'translation',
+        'classify': 'classification',
+        'classify_batch': 'classification',
+        'explain': 'explanation',
+        'handle_fragment': 'fragment',
+    }
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=120):
+        """
+        Initialize client
+
+        Args:
+            socket_path: Unix socket the model server listens on
+            timeout: Socket timeout in seconds for a single call, shortened
+                to the time left under a request deadline
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return this thread's socket, connecting on first use or after fork"""
+        sock = getattr(self._local, 'sock', None)
+        if sock is None or getattr(self._local, 'pid', None) != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+            self._local.pid = os.getpid()
+        return sock
+
+    def _reset_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def call(self, method, *args, **kwargs):
+        """
+        Invoke a method on the model server. The call is sent again on a new
+        connection only if it cannot have run yet: connecting or sending
+        failed, or the server closed the connection before answering (an
+        idle connection it dropped). A call that timed out is never retried.
+        """
+        request = {'method': method, 'args': list(args), 'kwargs': kwargs}
+        deadline = current_deadline()
+        stage = self.STAGES.get(method, method)
+
+        # Locks and compute on the server side are part of this span
+        with span(f"model_server.{method}"):
+            for attempt in range(2):
+                timeout = self.timeout
+                if deadline is not None:
+                    deadline.check(stage)
+                    timeout = deadline.clamp(timeout)
+                try:
+                    sock = self._connection()
+                    sock.settimeout(timeout)
+                    send_message(sock, request)
+                except OSError as e:
+                    self._reset_connection()
+                    if attempt == 1:
+                        raise ModelServerError(f"Model server unavailable at {self.socket_path}: {e}")
+                    continue
+
+                try:
+                    response = recv_message(sock)
+                except socket.timeout:
+                    # A late answer would be read as the reply to the next call
+                    self._reset_connection()
+                    if deadline is not None:
+                        deadline.check(stage)
+                    raise ModelServerError(f"Model server did not answer {method} within {timeout:.1f}s")
+                except (OSError, ValueError, ModelServerError) as e:
+                    self._reset_connection()
+                    raise ModelServerError(f"Model server connection lost during {method}: {e}")
+                if response is not None:
+                    break
+                self._reset_connection()
+                if attempt == 1:
+                    raise ModelServerError(f"Model server at {self.socket_path} closed the connection")
+
+        if not response.get('ok'):
+            raise ModelServerError(response.get('error', 'Unknown model server error'))
+        return response.get('result')
+
+    def translate(self, thai_text):
+        """Translate Thai text to English on the model server"""
+        return self.call('translate', thai_text)
+
+    def translate_first_sentence(self, thai_text, skip_rest=True, on_first_sentence=None):
+        """Translate up to the first sentence boundary on the model server"""
+        translation, first_sentence, is_multi_sentence = self.call(
+            'translate_first_sentence', thai_text, skip_rest=skip_rest
+        )
+        # Callbacks cannot cross the socket; report once the result arrives
+        if on_first_sentence:
+            on_first_sentence(first_sentence)
+        return translation, first_sentence, is_multi_sentence
+
+    def classify(self, english_text, top_k=3):
+        """Classify tense on the model server"""
+        return self.call('classify', english_text, top_k=top_k)
+
+    def classify_batch(self, sentences, top_k=3):
+        """Classify tense for many sentences in one model server call"""
+        return self.call('classify_batch', list(sentences), top_k=top_k)
+
+    def explain(self, analysis_result):
+        """Generate a grammar explanation on the model server"""
+        return self.call('explain', analysis_result)
+
+    def explain_stream(self, analysis_result):
+        """Explanation sections from the model server; streaming cannot cross the socket, so all arrive at once"""
+        yield from self.explain(analysis_result)['parsed_sections'].items()
+
+    def handle_fragment(self, thai_text, translation):
+        """Generate fragment guidance on the model server"""
+        return self.call('handle_fragment', thai_text, translation)
+
+    def get_stats(self):
+        """Get model server statistics"""
+        return self.call('stats')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the shared model server')
+    parser.add_argument('--socket', default=os.getenv('MODEL_SERVER_SOCKET', DEFAULT_SOCKET_PATH),
+                        help='Unix domain socket path to listen on')
+    args = parser.parse_args()
+
+    server = ModelServer(args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down model server")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
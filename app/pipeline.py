@@ -10,14 +10,32 @@ import os
 import json
 import re
 import time
+import hashlib
 import threading
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from transformers import XLMRobertaModel, AutoConfig, PreTrainedModel, AutoTokenizer
-from safetensors.torch import load_file as safe_load_file
+import contextvars
+import contextlib
+import numpy as np
 from dotenv import load_dotenv
-from functools import wraps
+from functools import wraps, partial
+from concurrent.futures import ThreadPoolExecutor
+from .cache import TranslationCache, ClassificationCache, ExplanationCache, canonicalize_text
+from .translation_batcher import TranslationBatcher, MultiSequenceDecoder
+from .translator_pool import TranslatorPool, default_pool_layout
+from .model_server import ModelServerClient
+from .translator_profile import load_translator_profile
+from .cpu_partition import get_worker_partition, pinned
+from .shared_weights import load_safetensors_mmap
+from .concurrency import ConcurrencyLimiter
+from .deferred_explanations import DeferredExplanations
+from .deadline import Deadline, DeadlineExceeded, current_deadline, check_deadline
+from .single_flight import SingleFlight
+from .stage_pipeline import StageExecutor, StageQueueFull, StageError
+from .tracing import span
+from .classifier_quantization import INT8_ARTIFACT_NAME, quantize_encoder, load_int8_state_dict, int8_gate_status
+from .classifier_onnx import (
+    OUTPUT_NAMES as ONNX_OUTPUT_NAMES, create_session as create_onnx_session,
+    load_tokenizer as load_fast_tokenizer, pad_batch
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,24 +46,114 @@ except ImportError:
     Together = None
     print("Warning: together package not installed. GrammarExplainer will use mock explanations.")
 
+def __getattr__(name):
+    """XLMRHierClassifier moved to classifier_model; import it lazily so torch loads only when needed"""
+    if name == 'XLMRHierClassifier':
+        from .classifier_model import XLMRHierClassifier
+        return XLMRHierClassifier
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Thread safety locks for model inference to prevent concurrent access issues
 _model_locks = {
     'translator': threading.RLock(),
-    'classifier': threading.RLock(), 
-    'explainer': threading.RLock()
+    'classifier': threading.RLock()
 }
 
+# Together AI calls are network I/O, so they are bounded rather than serialized.
+# GrammarExplainer and FragmentHandler share one Together client and hold no
+# per-request state: the client's HTTP session is kept per thread by the SDK,
+# the explanation cache is internally locked and the tense definitions are
+# read-only, so concurrent calls are safe.
+_api_limiter = ConcurrencyLimiter(
+    'together_api',
+    max_concurrent=int(os.getenv('TOGETHER_MAX_CONCURRENCY', 4)),
+    max_waiting=int(os.getenv('TOGETHER_MAX_QUEUE', 16)),
+    wait_timeout=float(os.getenv('TOGETHER_QUEUE_TIMEOUT', 30))
+)
+
+# Per-call HTTP timeout of Together AI requests, in seconds
+TOGETHER_TIMEOUT = float(os.getenv('TOGETHER_TIMEOUT', 60))
+
+def _api_wait_timeout():
+    """Limiter queue timeout, shortened to the time left before the request deadline"""
+    deadline = current_deadline()
+    return deadline.clamp(_api_limiter.wait_timeout) if deadline else None
+
+
+def _api_call_options(client, stage):
+    """
+    Client and HTTP timeout for one Together AI call. Under a request deadline
+    the call may take only the time left, and is not retried (a retry would
+    start after the deadline anyway).
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return client, TOGETHER_TIMEOUT
+    deadline.check(stage)
+    return client.with_options(max_retries=0), min(TOGETHER_TIMEOUT, deadline.remaining())
+
+
 def thread_safe_model_call(model_type):
     """Decorator to ensure thread-safe model inference calls"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            with _model_locks[model_type]:
-                return func(*args, **kwargs)
+            # Traced separately: time spent queueing for the model vs. running it
+            with span(f"lock.{model_type}"):
+                _model_locks[model_type].acquire()
+            try:
+                with span(f"compute.{model_type}", function=func.__name__):
+                    return func(*args, **kwargs)
+            finally:
+                _model_locks[model_type].release()
         return wrapper
     return decorator
 
 
+def _softmax(logits):
+    """Row-wise softmax; -inf entries get probability 0"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+# Common abbreviations that shouldn't split sentences, with temporary placeholders
+SENTENCE_ABBREVIATIONS = {
+    'Mr.': 'Mr<DOT>',
+    'Mrs.': 'Mrs<DOT>',
+    'Ms.': 'Ms<DOT>',
+    'Dr.': 'Dr<DOT>',
+    'Ph.D.': 'PhD<DOT>',
+    'i.e.': 'ie<DOT>',
+    'e.g.': 'eg<DOT>',
+    'etc.': 'etc<DOT>',
+    'vs.': 'vs<DOT>',
+    'U.S.': 'US<DOT>',
+    'U.K.': 'UK<DOT>'
+}
+
+# Sentence endings followed by space and capital letter, or end of string
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'([.!?]+)\s+(?=[A-Z])|([.!?]+)$')
+
+# Boundary that later text can no longer undo (the next sentence has started)
+_confirmed_boundary_pattern = re.compile(r'([.!?]+)\s+(?=[A-Z])')
+
+
+def _protect_abbreviations(text):
+    """Replace abbreviations with placeholders to avoid false splits"""
+    for abbr, replacement in SENTENCE_ABBREVIATIONS.items():
+        text = text.replace(abbr, replacement)
+    return text
+
+
+def _restore_abbreviations(text):
+    """Undo _protect_abbreviations"""
+    for abbr, replacement in SENTENCE_ABBREVIATIONS.items():
+        text = text.replace(replacement, abbr)
+    return text
+
+
 def extract_first_sentence(text):
     """
     Extract the first sentence from English text.
@@ -54,33 +162,10 @@ def extract_first_sentence(text):
     if not text:
         return text, False
     
-    # Simple sentence splitting using common sentence endings
-    # Handle common abbreviations that shouldn't split sentences
     text = text.strip()
+    temp_text = _protect_abbreviations(text)
     
-    # Replace common abbreviations temporarily to avoid false splits
-    abbreviations = {
-        'Mr.': 'Mr<DOT>',
-        'Mrs.': 'Mrs<DOT>',
-        'Ms.': 'Ms<DOT>',
-        'Dr.': 'Dr<DOT>',
-        'Ph.D.': 'PhD<DOT>',
-        'i.e.': 'ie<DOT>',
-        'e.g.': 'eg<DOT>',
-        'etc.': 'etc<DOT>',
-        'vs.': 'vs<DOT>',
-        'U.S.': 'US<DOT>',
-        'U.K.': 'UK<DOT>'
-    }
-    
-    temp_text = text
-    for abbr, replacement in abbreviations.items():
-        temp_text = temp_text.replace(abbr, replacement)
-    
-    # Split on sentence endings followed by space and capital letter
-    # or end of string
-    sentence_pattern = r'([.!?]+)\s+(?=[A-Z])|([.!?]+)$'
-    matches = list(re.finditer(sentence_pattern, temp_text))
+    matches = list(SENTENCE_BOUNDARY_PATTERN.finditer(temp_text))
     
     if not matches:
         # No sentence ending found, treat whole text as one sentence
@@ -88,11 +173,7 @@ def extract_first_sentence(text):
     
     # Get the end position of the first sentence
     first_end = matches[0].end()
-    first_sentence = temp_text[:first_end].strip()
-    
-    # Restore abbreviations
-    for abbr, replacement in abbreviations.items():
-        first_sentence = first_sentence.replace(replacement, abbr)
+    first_sentence = _restore_abbreviations(temp_text[:first_end].strip())
     
     # Check if there's more text after the first sentence
     remaining_text = temp_text[first_end:].strip()
@@ -101,6 +182,50 @@ def extract_first_sentence(text):
     return first_sentence, is_multi_sentence
 
 
+def split_sentences(text):
+    """
+    Split English text into sentences, using the same abbreviations and
+    boundary rule as extract_first_sentence (whose first sentence is the
+    first item here). Text after the last sentence ending is its own sentence.
+    """
+    if not text or not text.strip():
+        return []
+    
+    temp_text = _protect_abbreviations(text.strip())
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY_PATTERN.finditer(temp_text):
+        sentences.append(temp_text[start:match.end()].strip())
+        start = match.end()
+    sentences.append(temp_text[start:].strip())
+    return [_restore_abbreviations(sentence) for sentence in sentences if sentence]
+
+
+class IncrementalSentenceDetector:
+    """
+    Finds the first sentence boundary in text that arrives in chunks.
+    Uses the same abbreviations and boundary rule as extract_first_sentence, but
+    only reports a boundary once the next sentence has started, so the result
+    never differs from running extract_first_sentence on the finished text.
+    """
+    
+    def __init__(self):
+        self.text = ''
+        self.first_sentence = None
+    
+    def feed(self, chunk):
+        """Add generated text; returns True once the first sentence is complete"""
+        self.text += chunk
+        if self.first_sentence is None:
+            if _confirmed_boundary_pattern.search(_protect_abbreviations(self.text.lstrip())):
+                self.first_sentence, _ = extract_first_sentence(self.text)
+        return self.first_sentence is not None
+    
+    def result(self):
+        """Returns tuple of (first_sentence, is_multi_sentence) for the text seen so far"""
+        return extract_first_sentence(self.text)
+
+
 def is_fragment(translation):
     """
     Simple, reliable fragment detection without complex rules.
@@ -206,7 +331,8 @@ class FragmentHandler:
         """
         if self.client:
             try:
-                explanation = self._generate_fragment_explanation_api(thai_text, translation)
+                with _api_limiter.slot(timeout=_api_wait_timeout()), span('together.fragment'):
+                    explanation = self._generate_fragment_explanation_api(thai_text, translation)
                 return {
                     'is_fragment': True,
                     'input_thai': thai_text,
@@ -214,6 +340,8 @@ class FragmentHandler:
                     'explanation': self._parse_fragment_sections(explanation)
                 }
             except Exception as e:
+                # API timeouts caused by the request deadline end the request
+                check_deadline('fragment')
                 print(f"Fragment API explanation failed: {e}")
                 # Fall back to mock explanation
         
@@ -287,14 +415,16 @@ class FragmentHandler:
         ]
 
         # Call Together AI API
-        response = self.client.chat.completions.create(
+        client, timeout = _api_call_options(self.client, 'fragment')
+        response = client.chat.completions.create(
             model="scb10x/scb10x-typhoon-2-1-gemma3-12b",
             messages=messages,
             max_tokens=500,
             temperature=0.7,
             top_p=0.9,
             top_k=50,
-            repetition_penalty=1.1
+            repetition_penalty=1.1,
+            timeout=timeout
         )
 
         return response.choices[0].message.content.strip()
@@ -348,52 +478,6 @@ class FragmentHandler:
         return self._parse_fragment_sections(explanation)
 
 
-class XLMRHierClassifier(PreTrainedModel):
-    """
-    Hierarchical XLM-RoBERTa classifier for tense classification
-    Predicts both coarse (Past/Present/Future) and fine-grained tense labels
-    """
-    config_class = AutoConfig
-
-    def __init__(self, config, n_coarse=3, n_fine=25, coarse_w=0.3):
-        super().__init__(config)
-        self.encoder = XLMRobertaModel(config, add_pooling_layer=False)
-        h = self.encoder.config.hidden_size
-
-        # Dual classification heads
-        self.coarse_head = nn.Linear(h, n_coarse)  # Past/Present/Future
-        self.fine_head = nn.Linear(h, n_fine)      # Detailed tense categories
-
-        self.crit = nn.CrossEntropyLoss()
-        self.coarse_w = coarse_w  # Loss weighting
-        self.post_init()
-
-    def forward(self, input_ids=None, attention_mask=None, labels=None, **_):
-        # Encode input
-        hidden = self.encoder(input_ids, attention_mask=attention_mask).last_hidden_state
-        pooled = hidden[:, 0]  # Use CLS token
-
-        # Predict both levels
-        logits_c = self.coarse_head(pooled)
-        logits_f = self.fine_head(pooled)
-
-        if labels is None:
-            return {"logits": (logits_c, logits_f)}
-
-        # Calculate hierarchical loss
-        lab_c, lab_f = labels[:, 0], labels[:, 1]
-        loss_c = self.crit(logits_c, lab_c)
-
-        mask = lab_f != -100
-        if mask.any():
-            loss_f = self.crit(logits_f[mask], lab_f[mask])
-            loss = self.coarse_w * loss_c + (1 - self.coarse_w) * loss_f
-        else:
-            loss = loss_c
-
-        return {"loss": loss, "logits": (logits_c, logits_f)}
-
-
 class TenseTagDefinitions:
     """Comprehensive tense tag definitions for grammar explanations"""
 
@@ -627,27 +711,41 @@ class TenseTagDefinitions:
 
 class TyphoonTranslator:
     """Thai to English translation using Typhoon Translate 4B GGUF model"""
+    
+    # Fixed start of every translation prompt; llama.cpp keeps its KV state between
+    # requests on a context, since each prompt shares it with the previous one
+    PROMPT_PREFIX = "<s>Translate Thai to English: "
+    
     def __init__(self):
         self.model = None
-        self.model_path = "./models/typhoon-translate-4b-q4_k_m.gguf"
+        
+        # llama.cpp settings and GGUF file, tuned per host by tune_translator.py
+        self.settings = load_translator_profile()
+        self.model_path = self.settings['model_path']
+        
+        # Cores reserved for llama.cpp in this worker (CPU_PARTITIONING=1)
+        self.cpu_partition = get_worker_partition()
+        self.n_threads = (self.cpu_partition.translator_threads if self.cpu_partition
+                          else self.settings['n_threads'])
+        self.cache = None
+        self.batcher = None
+        self.pool = None
+        self._batch_decoder = None
+        
+        # Generation settings shared by the single and batched paths
+        self.max_tokens = 80
+        self.stop = ["</s>", "\n", "Thai:"]
         
         # Try to load the GGUF model (CPU optimized)
         try:
-            from llama_cpp import Llama
-            
             if os.path.exists(self.model_path):
-                self.model = Llama(
-                    model_path=self.model_path,
-                    verbose=False,
-                    n_ctx=2048,        # Context length
-                    n_threads=4,       # CPU threads (adjust based on your CPU)
-                    n_batch=512,       # Batch size
-                    n_gpu_layers=0,    # Force CPU usage (no GPU layers)
-                    use_mlock=True,    # Lock model in RAM for faster access
-                    use_mmap=True,     # Memory-mapped files for efficiency
-                    f16_kv=False       # Use f32 for CPU (f16 is for GPU)
-                )
+                self.model = self._load_llama(n_threads=self.n_threads)
                 print("✓ Typhoon Translate GGUF model loaded successfully (CPU)")
+                
+                # Pool of contexts sharing the loaded weights (set TRANSLATOR_POOL_SIZE>1 to enable)
+                pool_size = int(os.getenv('TRANSLATOR_POOL_SIZE', 1))
+                if pool_size > 1:
+                    self._create_pool(pool_size)
             else:
                 print(f"✗ GGUF model not found at {self.model_path}")
                 print("  Using mock translations as fallback")
@@ -656,30 +754,315 @@ class TyphoonTranslator:
         except Exception as e:
             print(f"✗ Error loading GGUF model: {e}")
             print("  Using mock translations as fallback")
+        
+        # Translation cache shared by all workers (set TRANSLATION_CACHE_ENABLED=0 to disable)
+        if os.getenv('TRANSLATION_CACHE_ENABLED', '1') != '0':
+            self.cache = TranslationCache(
+                path=os.getenv('TRANSLATION_CACHE_PATH', './cache/translations.sqlite3'),
+                namespace=os.path.basename(self.model_path),
+                memory_entries=int(os.getenv('TRANSLATION_CACHE_MEMORY_ENTRIES', 2048)),
+                disk_entries=int(os.getenv('TRANSLATION_CACHE_DISK_ENTRIES', 100000)),
+                max_age=int(os.getenv('TRANSLATION_CACHE_MAX_AGE', 30 * 24 * 3600))
+            )
+            print("✓ Translation cache enabled")
+        
+        # Micro-batching of concurrent requests (set TRANSLATION_BATCHING=1 to enable)
+        if self.model and os.getenv('TRANSLATION_BATCHING', '0') == '1':
+            self.batcher = TranslationBatcher(
+                self._generate_batch,
+                max_batch_size=int(os.getenv('TRANSLATION_BATCH_MAX_SIZE', 4)),
+                max_wait_ms=float(os.getenv('TRANSLATION_BATCH_MAX_WAIT_MS', 25))
+            )
+    
+    def reinit_after_fork(self):
+        """
+        Make a translator loaded in the gunicorn master usable in a forked worker.
+        llama.cpp contexts, their threads and memory locks are per process, so
+        the model is reopened; the GGUF file is mmap'd, so the new mapping uses
+        the same page-cache pages as the master's.
+        """
+        self.cpu_partition = get_worker_partition()
+        self.n_threads = (self.cpu_partition.translator_threads if self.cpu_partition
+                          else self.settings['n_threads'])
+        if not self.model:
+            return
+        
+        pool_size = self.pool.size if self.pool else 1
+        self.pool = None
+        self._batch_decoder = None
+        self.model = self._load_llama(n_threads=self.n_threads)
+        if pool_size > 1:
+            self._create_pool(pool_size)
+    
+    def _create_pool(self, pool_size):
+        """Pool of contexts sharing the loaded weights"""
+        threads = os.getenv('TRANSLATOR_THREADS_PER_CONTEXT')
+        if threads:
+            threads = int(threads)
+        elif self.cpu_partition:
+            # Contexts share the translator's cores instead of the whole host
+            threads = max(1, self.n_threads // pool_size)
+        pool_size, threads = default_pool_layout(pool_size, threads)
+        try:
+            self.pool = TranslatorPool(
+                self.model, pool_size, threads,
+                model_loader=lambda n_threads: self._load_llama(n_threads=n_threads, use_mlock=False)
+            )
+        except Exception as e:
+            print(f"✗ Error creating translator pool: {e}")
+            print("  Using a single translator context")
+    
+    def _load_llama(self, n_threads, use_mlock=None):
+        """Create a llama.cpp instance for the GGUF translator"""
+        from llama_cpp import Llama
+        
+        if use_mlock is None:
+            use_mlock = self.settings['use_mlock']
+        
+        # llama.cpp threads started here inherit the translator cores (CPU_AFFINITY=1)
+        with pinned('translator'):
+            return Llama(
+                model_path=self.model_path,
+                verbose=False,
+                n_ctx=self.settings['n_ctx'],  # Context length
+                n_threads=n_threads,  # CPU threads (tuned per host, see tune_translator.py)
+                n_batch=self.settings['n_batch'],  # Batch size
+                n_gpu_layers=0,    # Force CPU usage (no GPU layers)
+                use_mlock=use_mlock,  # Lock model in RAM for faster access
+                use_mmap=True,     # Memory-mapped files for efficiency
+                f16_kv=False       # Use f32 for CPU (f16 is for GPU)
+            )
     
-    @thread_safe_model_call('translator')
     def translate(self, thai_text):
-        """Translate Thai text to English (thread-safe)"""
+        """Translate Thai text to English, serving repeated inputs from the cache"""
         if self.model:
-            try:
-                # Use proper prompt format for Typhoon
-                prompt = f"<s>Translate Thai to English: {thai_text}\nEnglish:"
-                
-                response = self.model(
+            if self.cache:
+                cached = self.cache.get(thai_text)
+                if cached is not None:
+                    return cached
+            
+            if self.batcher:
+                deadline = current_deadline()
+                try:
+                    translation = self.batcher.translate(
+                        thai_text, timeout=deadline.clamp(120) if deadline else 120
+                    )
+                except Exception as e:
+                    print(f"Translation error: {e}")
+                    translation = None
+                # The shared batch keeps decoding for the other requests in it
+                check_deadline('translation')
+            else:
+                translation = self._generate_translation(thai_text)
+            
+            if translation is not None:
+                # Only real model output is cached, never mock fallbacks
+                if self.cache and translation:
+                    self.cache.set(thai_text, translation)
+                return translation
+        
+        return self._mock_translation(thai_text)
+    
+    def _build_prompt(self, thai_text):
+        """Use proper prompt format for Typhoon"""
+        return f"{self.PROMPT_PREFIX}{thai_text}\nEnglish:"
+    
+    @contextlib.contextmanager
+    def _borrow_context(self):
+        """
+        A llama.cpp context for one generation: a pooled one, or the single
+        model under the translator lock. Waiting and generating are traced
+        separately (lock.translator, compute.translator).
+        """
+        if self.pool:
+            # Each pooled context serves one request at a time
+            with self.pool.checkout() as llm, span('compute.translator'):
+                yield llm
+            return
+        
+        with span('lock.translator'):
+            _model_locks['translator'].acquire()
+        try:
+            with span('compute.translator'):
+                yield self.model
+        finally:
+            _model_locks['translator'].release()
+    
+    def _generate_translation(self, thai_text):
+        """Run llama.cpp generation (thread-safe). Returns None on failure."""
+        with self._borrow_context() as llm:
+            return self._run_completion(llm, thai_text)
+    
+    def _run_completion(self, llm, thai_text):
+        """Generate a translation with the given llama.cpp context"""
+        deadline = current_deadline()
+        try:
+            prompt = self._build_prompt(thai_text)
+            
+            with pinned('translator'):
+                response = llm(
                     prompt,
-                    max_tokens=80,  # Reduced for single-sentence focus
-                    temperature=0.1,  # Lower temperature for consistent output
-                    stop=["</s>", "\n", "Thai:"],  # Stop tokens
-                    echo=False  # Don't echo the prompt
+                    max_tokens=self.max_tokens,  # Reduced for single-sentence focus
+                    # Greedy, like MultiSequenceDecoder: both paths fill the same cache
+                    temperature=0.0,
+                    repeat_penalty=1.0,
+                    stop=self.stop,  # Stop tokens
+                    echo=False,  # Don't echo the prompt
+                    # Generation ends at the request deadline instead of running on
+                    stopping_criteria=deadline.llama_stopping_criteria('translation') if deadline else None
                 )
+            
+            # A translation cut off by the deadline is discarded, never cached
+            check_deadline('translation')
+            translation = response['choices'][0]['text'].strip()
+            return translation
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Translation error: {e}")
+            return None
+    
+    def translate_stream(self, thai_text):
+        """
+        Yield the translation incrementally as llama.cpp generates it.
+        The context stays checked out until the generator is exhausted or closed;
+        closing it early stops generation.
+        """
+        if not self.model:
+            yield self._mock_translation(thai_text)
+            return
+        
+        with self._borrow_context() as llm:
+            yield from self._stream_completion(llm, thai_text)
+    
+    def _stream_completion(self, llm, thai_text):
+        """Stream generated text chunks from the given llama.cpp context"""
+        prompt = self._build_prompt(thai_text)
+        deadline = current_deadline()
+        
+        with pinned('translator'):
+            for chunk in llm(
+                prompt,
+                max_tokens=self.max_tokens,
+                temperature=0.0,
+                repeat_penalty=1.0,
+                stop=self.stop,
+                echo=False,
+                stream=True,
+                stopping_criteria=deadline.llama_stopping_criteria('translation') if deadline else None
+            ):
+                yield chunk['choices'][0]['text']
+        check_deadline('translation')
+    
+    def translate_first_sentence(self, thai_text, skip_rest=True, on_first_sentence=None):
+        """
+        Translate with incremental sentence-boundary detection.
+        
+        Args:
+            thai_text: Input Thai text
+            skip_rest: Stop generating once the first sentence is complete, so
+                decode time scales with the first sentence, not the whole input
+            on_first_sentence: Optional callback(first_sentence) invoked as soon
+                as the first sentence is known, while the rest still generates
+        
+        Returns:
+            tuple: (translation, first_sentence, is_multi_sentence); with skip_rest
+            the translation is just the first sentence
+        """
+        if self.cache:
+            # A cached full translation serves both modes
+            cached = self.cache.get(thai_text)
+            if cached is not None:
+                first_sentence, is_multi_sentence = extract_first_sentence(cached)
+                if on_first_sentence:
+                    on_first_sentence(first_sentence)
+                return (first_sentence if skip_rest else cached), first_sentence, is_multi_sentence
+            
+            if skip_rest:
+                cached = self.cache.get(thai_text, variant='first_sentence')
+                if cached is not None:
+                    first_sentence, is_multi_sentence = cached
+                    if on_first_sentence:
+                        on_first_sentence(first_sentence)
+                    return first_sentence, first_sentence, is_multi_sentence
+        
+        notified = False
+        if self.model:
+            detector = IncrementalSentenceDetector()
+            try:
+                chunks = self.translate_stream(thai_text)
+                try:
+                    for chunk in chunks:
+                        if detector.feed(chunk) and not notified:
+                            notified = True
+                            if on_first_sentence:
+                                on_first_sentence(detector.first_sentence)
+                            if skip_rest:
+                                break
+                finally:
+                    # Stops generation and releases the context
+                    chunks.close()
                 
-                translation = response['choices'][0]['text'].strip()
-                return translation
+                if skip_rest and notified:
+                    first_sentence = translation = detector.first_sentence
+                    is_multi_sentence = True
+                else:
+                    translation = detector.text.strip()
+                    first_sentence, is_multi_sentence = extract_first_sentence(translation)
+                    if on_first_sentence and not notified:
+                        notified = True
+                        on_first_sentence(first_sentence)
+                
+                if translation:
+                    # Only real model output is cached, never mock fallbacks
+                    if self.cache:
+                        if skip_rest and is_multi_sentence:
+                            self.cache.set(thai_text, [first_sentence, is_multi_sentence], variant='first_sentence')
+                        else:
+                            self.cache.set(thai_text, translation)
+                    return translation, first_sentence, is_multi_sentence
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 print(f"Translation error: {e}")
-                # Fall back to mock translations
         
-        # Mock translations as fallback
+        translation = self._mock_translation(thai_text)
+        first_sentence, is_multi_sentence = extract_first_sentence(translation)
+        if on_first_sentence and not notified:
+            on_first_sentence(first_sentence)
+        return (first_sentence if skip_rest else translation), first_sentence, is_multi_sentence
+    
+    def _generate_batch(self, thai_texts):
+        """
+        Translate several texts in one multi-sequence llama.cpp decode.
+        Called only from the batcher thread. Returns one translation (or None) per text.
+        """
+        if len(thai_texts) == 1:
+            return [self._generate_translation(thai_texts[0])]
+        
+        if self._batch_decoder is None:
+            try:
+                self._batch_decoder = MultiSequenceDecoder(
+                    self.model,
+                    max_sequences=self.batcher.max_batch_size
+                )
+            except Exception as e:
+                # Older llama-cpp-python builds lack multi-sequence support
+                print(f"✗ Multi-sequence decoding unavailable ({e}), translating batch sequentially")
+                self._batch_decoder = False
+        
+        if self._batch_decoder:
+            try:
+                prompts = [self._build_prompt(thai_text) for thai_text in thai_texts]
+                with pinned('translator'):
+                    return self._batch_decoder.decode(prompts, max_tokens=self.max_tokens, stop=self.stop)
+            except Exception as e:
+                print(f"Batched translation error: {e}")
+        
+        return [self._generate_translation(thai_text) for thai_text in thai_texts]
+    
+    def _mock_translation(self, thai_text):
+        """Mock translations as fallback"""
         translations = {
             "ฉันกินข้าวเช้าทุกวัน": "I eat breakfast every day.",
             "เมื่อวานฉันไปตลาด": "Yesterday I went to the market.",
@@ -692,13 +1075,31 @@ class TenseClassifier:
     """Tense classification using XLM-RoBERTa hierarchical model"""
     def __init__(self):
         self.model = None
+        self.session = None  # ONNX Runtime session when backend is 'onnx'
         self.tokenizer = None
+        self.pad_token_id = 1
         self.model_path = "./models/bert-tense-hier/best"
         self.device = "cpu"  # Force CPU usage
+        self.max_length = 512
+        self.cache = None
+        self.weights_mapped = False
+        
+        # Cores reserved for torch / ONNX Runtime in this worker (CPU_PARTITIONING=1)
+        self.cpu_partition = get_worker_partition()
         
         # Label mappings
         self.id2coarse = {}
         self.id2fine = {}
+        self.coarse_labels = []
+        self.fine_labels = []
+        self.fine_mask_table = None
+        
+        # Maximum sentences per forward pass in classify_batch
+        self.batch_size = int(os.getenv('CLASSIFIER_BATCH_SIZE', 32))
+        
+        # fp32 (default), int8 (dynamic quantization, needs a passing verification)
+        # or onnx (ONNX Runtime, no torch import)
+        self.backend = os.getenv('CLASSIFIER_BACKEND', 'fp32')
         
         # Coarse-to-fine mapping to ensure consistency
         self.coarse_to_fine_mapping = {
@@ -717,6 +1118,15 @@ class TenseClassifier:
             if os.path.exists(self.model_path):
                 self._load_model()
                 print("✓ XLM-RoBERTa tense classifier loaded successfully")
+                
+                # Memoized results (set CLASSIFICATION_CACHE_ENABLED=0 to disable)
+                if os.getenv('CLASSIFICATION_CACHE_ENABLED', '1') != '0':
+                    self.cache = ClassificationCache(
+                        fingerprint=self._model_fingerprint(),
+                        max_entries=int(os.getenv('CLASSIFICATION_CACHE_ENTRIES', 4096)),
+                        max_age=int(os.getenv('CLASSIFICATION_CACHE_MAX_AGE', 24 * 3600))
+                    )
+                    print("✓ Classification cache enabled")
             else:
                 print(f"✗ BERT model not found at {self.model_path}")
                 print("  Using mock classifications as fallback")
@@ -727,9 +1137,56 @@ class TenseClassifier:
             print("  Using mock classifications as fallback")
     
     def _load_model(self):
-        """Load the BERT model and associated files"""
+        """Load the label files and the model for the configured backend"""
+        # Load label mappings
+        with open(os.path.join(self.model_path, "coarse_labels.json")) as f:
+            self.id2coarse = json.load(f)
+        with open(os.path.join(self.model_path, "fine_labels.json")) as f:
+            self.id2fine = json.load(f)
+        
+        # Index-ordered label lists and the coarse-to-fine mask, built once
+        self.coarse_labels = self._as_label_list(self.id2coarse)
+        self.fine_labels = self._as_label_list(self.id2fine)
+        self.fine_mask_table = self._build_fine_mask_table()
+        
+        if self.backend == 'onnx':
+            try:
+                self._load_onnx_model()
+                return
+            except Exception as e:
+                print(f"✗ ONNX classifier backend unavailable: {e}")
+                print("  Using PyTorch classifier")
+                self.backend = 'fp32'
+        
+        self._load_torch_model()
+    
+    def _load_onnx_model(self):
+        """Load the exported ONNX graph; torch and transformers are not imported"""
+        threads = os.getenv('CLASSIFIER_ONNX_THREADS')
+        if threads:
+            threads = int(threads)
+        elif self.cpu_partition:
+            threads = self.cpu_partition.classifier_threads
+        self.session = create_onnx_session(self.model_path, threads)
+        self.tokenizer = load_fast_tokenizer(self.model_path, self.max_length)
+        pad_token_id = self.tokenizer.token_to_id('<pad>')
+        self.pad_token_id = pad_token_id if pad_token_id is not None else 1
+        print("✓ Classifier running on ONNX Runtime (CPU)")
+    
+    def _load_torch_model(self):
+        """Load the PyTorch model, optionally with the int8 encoder"""
+        import torch
+        from transformers import AutoTokenizer, AutoConfig
+        from safetensors.torch import load_file as safe_load_file
+        from .classifier_model import XLMRHierClassifier
+        
+        if self.cpu_partition:
+            # torch otherwise sizes its intra-op pool to every core on the host
+            torch.set_num_threads(self.cpu_partition.classifier_threads)
+        
         # Load tokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        self.pad_token_id = self.tokenizer.pad_token_id
         
         # Load configuration
         config = AutoConfig.from_pretrained(self.model_path)
@@ -743,94 +1200,224 @@ class TenseClassifier:
             coarse_w=0.3
         )
         
-        # Load weights
-        weights_path = os.path.join(self.model_path, "model.safetensors")
-        weights = safe_load_file(weights_path)
-        self.model.load_state_dict(weights)
+        # The int8 backend must have passed verify_classifier_int8.py for these weights
+        if self.backend == 'int8':
+            allowed, reason = int8_gate_status(self.model_path)
+            if not allowed:
+                print(f"✗ int8 classifier backend not enabled: {reason}")
+                print("  Using fp32 classifier")
+                self.backend = 'fp32'
+        
+        artifact_path = os.path.join(self.model_path, INT8_ARTIFACT_NAME)
+        int8_weights = None
+        if self.backend == 'int8' and os.path.exists(artifact_path):
+            try:
+                int8_weights = load_int8_state_dict(artifact_path)
+            except Exception as e:
+                print(f"✗ Could not load {INT8_ARTIFACT_NAME} ({e}); quantizing the fp32 weights instead")
+        
+        if int8_weights is not None:
+            # Pre-quantized artifact: the fp32 encoder weights are never loaded
+            quantize_encoder(self.model)
+            self.model.load_state_dict(int8_weights)
+            del int8_weights
+        else:
+            # Load weights
+            weights_path = os.path.join(self.model_path, "model.safetensors")
+            if self.backend == 'fp32' and os.getenv('CLASSIFIER_MMAP_WEIGHTS', '1') != '0':
+                # Parameters are views of the mapped file: no private copy per worker
+                self.model.load_state_dict(load_safetensors_mmap(weights_path), assign=True)
+                self.weights_mapped = True
+            else:
+                weights = safe_load_file(weights_path)
+                self.model.load_state_dict(weights)
+                del weights
+            
+            if self.backend == 'int8':
+                quantize_encoder(self.model)
         
         # Move to CPU and set to evaluation mode
         self.model.eval().to(self.device)
-        
-        # Load label mappings
-        with open(os.path.join(self.model_path, "coarse_labels.json")) as f:
-            self.id2coarse = json.load(f)
-        with open(os.path.join(self.model_path, "fine_labels.json")) as f:
-            self.id2fine = json.load(f)
+        if self.backend == 'int8':
+            print("✓ Classifier encoder running with dynamic int8 quantization")
+        elif self.weights_mapped:
+            print("✓ Classifier weights memory-mapped (shared between workers)")
+    
+    def reinit_after_fork(self):
+        """
+        Make a classifier loaded in the gunicorn master usable in a forked worker.
+        Weights stay shared; only per-process runtime state is rebuilt.
+        """
+        self.cpu_partition = get_worker_partition()
+        if self.session is not None:
+            # ONNX Runtime thread pools do not survive fork
+            self._load_onnx_model()
+        elif self.model is not None and self.cpu_partition:
+            # Only an explicit partition overrides torch's own thread count
+            import torch
+            torch.set_num_threads(self.cpu_partition.classifier_threads)
+    
+    def _model_fingerprint(self):
+        """Backend plus name, size and mtime of every file in the model directory"""
+        parts = [self.backend]
+        for name in sorted(os.listdir(self.model_path)):
+            path = os.path.join(self.model_path, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def _as_label_list(id2label):
+        """Label files hold either a JSON list or an {"index": label} object"""
+        if isinstance(id2label, dict):
+            return [id2label.get(str(i), id2label.get(i)) for i in range(len(id2label))]
+        return list(id2label)
+    
+    def _build_fine_mask_table(self):
+        """
+        Array of shape (n_coarse, n_fine): 0 where the fine label belongs to
+        the coarse label, -inf elsewhere. Indexing it with coarse predictions
+        gives the fine-logit mask for a whole batch at once.
+        """
+        rows = []
+        for coarse_label in self.coarse_labels:
+            valid_fine_codes = set(self.coarse_to_fine_mapping.get(coarse_label, []))
+            rows.append([0.0 if fine_label in valid_fine_codes else float('-inf')
+                         for fine_label in self.fine_labels])
+        return np.array(rows, dtype=np.float32)
     
-    @thread_safe_model_call('classifier')
     def classify(self, english_text, top_k=3):
         """Classify tense from English text (thread-safe)"""
-        if self.model and self.tokenizer:
+        return self.classify_batch([english_text], top_k=top_k)[0]
+    
+    def classify_batch(self, sentences, top_k=3):
+        """
+        Classify tense for many English sentences (thread-safe).
+        Sentences are bucketed by token length and each bucket is padded only
+        to its own longest sentence, then run in a single forward pass.
+        Returns one result dict per sentence, in input order.
+        """
+        if not sentences:
+            return []
+        
+        # Cached results are served without waiting for the classifier lock
+        results = [None] * len(sentences)
+        pending = []
+        for i, sentence in enumerate(sentences):
+            cached = self.cache.get(sentence, top_k) if self.cache else None
+            if cached is None:
+                pending.append(i)
+            else:
+                results[i] = cached
+        
+        if pending:
+            computed = self._classify_uncached([sentences[i] for i in pending], top_k)
+            for i, result in zip(pending, computed):
+                results[i] = result
+        
+        return results
+    
+    @thread_safe_model_call('classifier')
+    def _classify_uncached(self, sentences, top_k):
+        """Run the model on sentences (or mock fallback) and cache real model results"""
+        if (self.model is not None or self.session is not None) and self.tokenizer:
             try:
-                # Tokenize input
-                inputs = self.tokenizer(english_text, return_tensors="pt").to(self.device)
-                
-                # Run inference
-                with torch.inference_mode():
-                    logits = self.model(**inputs)["logits"]
-                    coarse_logits, fine_logits = logits
-                
-                # Convert to probabilities
-                coarse_probs = F.softmax(coarse_logits, dim=1)
-                
-                # Get coarse prediction first
-                coarse_topk = torch.topk(coarse_probs, k=min(top_k, len(self.id2coarse)), dim=1)
-                coarse_pred = self.id2coarse[coarse_topk.indices[0][0].item()]
-                
-                # Constrain fine predictions based on coarse category
-                # Create a mask for valid fine codes
-                valid_fine_codes = self.coarse_to_fine_mapping.get(coarse_pred, [])
-                fine_mask = torch.zeros_like(fine_logits[0])
-                
-                # Set mask to 1 for valid fine codes, -inf for invalid ones
-                # Handle both dict and list formats for id2fine
-                if isinstance(self.id2fine, dict):
-                    fine_items = self.id2fine.items()
-                else:
-                    # If it's a list, convert to enumerate
-                    fine_items = enumerate(self.id2fine)
-                
-                for i, fine_label in fine_items:
-                    if fine_label in valid_fine_codes:
-                        fine_mask[i] = 0
-                    else:
-                        fine_mask[i] = float('-inf')
-                
-                # Apply mask to fine logits
-                masked_fine_logits = fine_logits + fine_mask.unsqueeze(0)
-                
-                # Get probabilities from masked logits
-                fine_probs = F.softmax(masked_fine_logits, dim=1)
-                
-                # Get top predictions from constrained space
-                fine_topk = torch.topk(fine_probs, k=min(top_k, len(valid_fine_codes)), dim=1)
-                
-                # Format results with human-readable labels
-                fine_code = self.id2fine[fine_topk.indices[0][0].item()]
-                fine_confidence = fine_topk.values[0][0].item()
-                
-                # Get human-readable fine label
-                fine_info = self.tense_definitions.fine_definitions.get(fine_code, {})
-                fine_readable = fine_info.get('thai_name', fine_code)
-                
-                return {
-                    'coarse_label': coarse_pred,
-                    'fine_label': fine_readable,
-                    'fine_code': fine_code,
-                    'confidence': fine_confidence,
-                    'all_predictions': {
-                        'coarse': [(self.id2coarse[idx.item()], prob.item()) 
-                                 for idx, prob in zip(coarse_topk.indices[0], coarse_topk.values[0])],
-                        'fine': [(self.id2fine[idx.item()], prob.item()) 
-                               for idx, prob in zip(fine_topk.indices[0], fine_topk.values[0]) 
-                               if self.id2fine[idx.item()] in valid_fine_codes]
-                    }
-                }
+                with pinned('classifier'):
+                    results = self._classify_batch_model(sentences, top_k)
+                if self.cache:
+                    for sentence, result in zip(sentences, results):
+                        self.cache.set(sentence, top_k, result)
+                return results
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 print(f"BERT classification error: {e}")
                 # Fall back to mock classification
         
-        # Mock classification as fallback
+        return [self._mock_classification(sentence) for sentence in sentences]
+    
+    def _classify_batch_model(self, sentences, top_k):
+        """Run XLM-R on length-sorted buckets and decode predictions"""
+        id_lists = self._encode(sentences)
+        
+        # Length bucketing: similar lengths share a batch, so little padding is wasted
+        order = sorted(range(len(sentences)), key=lambda i: len(id_lists[i]))
+        results = [None] * len(sentences)
+        
+        for start in range(0, len(order), self.batch_size):
+            # A forward pass cannot be interrupted, so the deadline is checked between buckets
+            check_deadline('classification')
+            bucket = order[start:start + self.batch_size]
+            # Dynamic padding to the longest sentence in this bucket
+            input_ids, attention_mask = pad_batch([id_lists[i] for i in bucket], self.pad_token_id)
+            coarse_logits, fine_logits = self._forward(input_ids, attention_mask)
+            
+            for i, result in zip(bucket, self._decode_predictions(coarse_logits, fine_logits, top_k)):
+                results[i] = result
+        
+        return results
+    
+    def _encode(self, sentences):
+        """Token ids per sentence, truncated but not padded"""
+        if self.session is not None:
+            return [encoding.ids for encoding in self.tokenizer.encode_batch(list(sentences))]
+        return self.tokenizer(list(sentences), truncation=True)["input_ids"]
+    
+    def _forward(self, input_ids, attention_mask):
+        """Coarse and fine logits of one padded bucket, as numpy arrays"""
+        if self.session is not None:
+            return self.session.run(ONNX_OUTPUT_NAMES, {'input_ids': input_ids, 'attention_mask': attention_mask})
+        
+        import torch
+        with torch.inference_mode():
+            coarse_logits, fine_logits = self.model(
+                input_ids=torch.from_numpy(input_ids).to(self.device),
+                attention_mask=torch.from_numpy(attention_mask).to(self.device)
+            )["logits"]
+        return coarse_logits.float().numpy(), fine_logits.float().numpy()
+    
+    def _decode_predictions(self, coarse_logits, fine_logits, top_k):
+        """Turn a batch of logits into result dicts, constraining fine labels to the predicted coarse label"""
+        # Convert to probabilities
+        coarse_probs = _softmax(coarse_logits)
+        coarse_ids = np.argsort(-coarse_probs, axis=1, kind='stable')[:, :min(top_k, len(self.coarse_labels))]
+        coarse_values = np.take_along_axis(coarse_probs, coarse_ids, axis=1)
+        
+        # Row of 0 / -inf per sentence, selected by its coarse prediction
+        fine_mask = self.fine_mask_table[coarse_ids[:, 0]]
+        fine_probs = _softmax(fine_logits + fine_mask)
+        fine_ids = np.argsort(-fine_probs, axis=1, kind='stable')[:, :min(top_k, len(self.fine_labels))]
+        fine_values = np.take_along_axis(fine_probs, fine_ids, axis=1)
+        fine_valid = np.take_along_axis(fine_mask == 0, fine_ids, axis=1)
+        
+        results = []
+        for coarse_row, coarse_prob_row, fine_row, fine_prob_row, valid_row in zip(
+                coarse_ids.tolist(), coarse_values.tolist(),
+                fine_ids.tolist(), fine_values.tolist(), fine_valid.tolist()):
+            coarse_pred = self.coarse_labels[coarse_row[0]]
+            fine_predictions = [(self.fine_labels[idx], prob)
+                                for idx, prob, ok in zip(fine_row, fine_prob_row, valid_row) if ok]
+            fine_code, fine_confidence = fine_predictions[0]
+            
+            # Get human-readable fine label
+            fine_info = self.tense_definitions.fine_definitions.get(fine_code, {})
+            fine_readable = fine_info.get('thai_name', fine_code)
+            
+            results.append({
+                'coarse_label': coarse_pred,
+                'fine_label': fine_readable,
+                'fine_code': fine_code,
+                'confidence': fine_confidence,
+                'all_predictions': {
+                    'coarse': [(self.coarse_labels[idx], prob) for idx, prob in zip(coarse_row, coarse_prob_row)],
+                    'fine': fine_predictions
+                }
+            })
+        return results
+    
+    def _mock_classification(self, english_text):
+        """Mock classifications as fallback"""
         if "will" in english_text.lower() or "tomorrow" in english_text.lower():
             return {
                 'coarse_label': "Future",
@@ -865,23 +1452,97 @@ class TenseClassifier:
             }
 
 
+# Explanation sections and the regex extracting each one's content
+EXPLANATION_SECTION_PATTERNS = {
+    'tense_analysis': r'\*\*1\)\s*วิเคราะห์\s*Tense\s*ที่ใช้\*\*\s*(.*?)(?=\*\*2\)|$)',
+    'vocabulary': r'\*\*2\)\s*คำศัพท์ที่น่าสนใจ\*\*\s*(.*?)(?=\*\*3\)|$)', 
+    'common_mistakes': r'\*\*3\)\s*ข้อผิดพลาดที่พบบ่อย\*\*\s*(.*?)$'
+}
+
+# Marker that closes each section while the text is still being generated
+# (the last section only ends with the text)
+EXPLANATION_SECTION_END_MARKERS = {
+    'tense_analysis': re.compile(r'\*\*2\)'),
+    'vocabulary': re.compile(r'\*\*3\)'),
+    'common_mistakes': None
+}
+
+
+class IncrementalSectionParser:
+    """
+    Streaming counterpart of GrammarExplainer._parse_explanation_sections.
+    Fed the explanation as it is generated, it reports each section as soon
+    as the marker of the next one appears; finish() parses the complete
+    text exactly like the non-streaming path.
+    """
+    
+    def __init__(self, explainer):
+        self.explainer = explainer
+        self.text = ''
+        self.completed = {}  # section name -> formatted content
+    
+    def feed(self, chunk):
+        """
+        Add generated text.
+        
+        Returns:
+            list: (section_name, content) for every section completed by this chunk
+        """
+        self.text += chunk
+        newly_completed = []
+        for section_name, pattern in EXPLANATION_SECTION_PATTERNS.items():
+            end_marker = EXPLANATION_SECTION_END_MARKERS[section_name]
+            if section_name in self.completed or end_marker is None:
+                continue
+            match = re.search(pattern, self.text, re.DOTALL | re.IGNORECASE)
+            # The lookahead also accepts the end of the text; only a real marker closes the section
+            if match and end_marker.match(self.text, match.end()):
+                self.completed[section_name] = self.explainer._format_section_match(match)
+                newly_completed.append((section_name, self.completed[section_name]))
+        return newly_completed
+    
+    def finish(self):
+        """
+        Parse the complete text.
+        
+        Returns:
+            tuple: (parsed explanation dict, [(section_name, content) not reported yet])
+        """
+        parsed = self.explainer._parse_explanation_sections(self.text.strip())
+        remaining = [(name, content) for name, content in parsed['parsed_sections'].items()
+                     if name not in self.completed]
+        return parsed, remaining
+
+
 class GrammarExplainer:
     """Grammar explanation using Typhoon 2.1 4B Instruct via Together AI API"""
+    
+    # Bump whenever the prompt in _generate_explanation_api changes, so cached
+    # explanations written for the previous prompt are no longer served
+    PROMPT_VERSION = 1
+    
+    MODEL_NAME = "scb10x/scb10x-typhoon-2-1-gemma3-12b"
+    
     def __init__(self):
         # Initialize Together AI client
         self.client = None
         self.api_key = os.getenv('TOGETHER_API_KEY')
-        self.model_name = "scb10x/scb10x-typhoon-2-1-gemma3-12b"
+        # Point at another Together-compatible server, e.g. mock/together_stub_server.py for load tests
+        self.base_url = os.getenv('TOGETHER_BASE_URL') or None
+        self.model_name = self.MODEL_NAME
+        self.cache = None
         
         # Initialize tense definitions for context
         self.tense_definitions = TenseTagDefinitions()
         
         # Initialize API client
         if Together:
-            if self.api_key:
+            if self.api_key or self.base_url:
                 try:
-                    self.client = Together(api_key=self.api_key)
-                    print("✓ Together AI client initialized successfully")
+                    # A local stand-in server does not check the key
+                    self.client = Together(api_key=self.api_key or 'local-stub', base_url=self.base_url)
+                    print(f"✓ Together AI client initialized successfully"
+                          f"{f' (base URL {self.base_url})' if self.base_url else ''}")
                 except Exception as e:
                     print(f"✗ Error initializing Together AI client: {e}")
                     self.client = None
@@ -890,10 +1551,62 @@ class GrammarExplainer:
                 self.client = None
         else:
             print("✗ Together package not available. Using mock explanations.")
+        
+        # Parsed explanations shared by all workers (set EXPLANATION_CACHE_ENABLED=0 to disable)
+        if self.client and os.getenv('EXPLANATION_CACHE_ENABLED', '1') != '0':
+            self.cache = self.open_cache()
+            print("✓ Explanation cache enabled")
+    
+    @classmethod
+    def open_cache(cls):
+        """Explanation cache configured from the environment (also used by the admin purge)"""
+        namespace = f"{cls.MODEL_NAME}\x1fv{cls.PROMPT_VERSION}"
+        if os.getenv('TOGETHER_BASE_URL'):
+            # Explanations from another server (e.g. the load-test stub) never mix with real ones
+            namespace += f"\x1f{os.getenv('TOGETHER_BASE_URL')}"
+        return ExplanationCache(
+            path=os.getenv('EXPLANATION_CACHE_PATH', './cache/explanations.sqlite3'),
+            namespace=namespace,
+            memory_entries=int(os.getenv('EXPLANATION_CACHE_MEMORY_ENTRIES', 512)),
+            disk_entries=int(os.getenv('EXPLANATION_CACHE_DISK_ENTRIES', 50000)),
+            max_age=int(os.getenv('EXPLANATION_CACHE_MAX_AGE', 7 * 24 * 3600))
+        )
+    
+    @staticmethod
+    def get_limiter_stats():
+        """Concurrency and queue-time statistics of the Together AI calls in this process"""
+        return _api_limiter.get_stats()
+    
+    @staticmethod
+    def _confidence_tier(confidence):
+        """The prompt's confidence instructions change at 70% and 90%"""
+        if confidence < 0.7:
+            return 'low'
+        if confidence < 0.9:
+            return 'medium'
+        return 'high'
+    
+    def cached_explanation(self, analysis_result):
+        """Cached explanation for analysis_result, or None"""
+        if not self.cache:
+            return None
+        return self.cache.get(
+            analysis_result.get('analyzed_sentence', analysis_result.get('translation', '')),
+            analysis_result.get('fine_code', 'UNKNOWN'),
+            analysis_result.get('is_multi_sentence', False),
+            self._confidence_tier(analysis_result.get('confidence', 0.0))
+        )
     
-    @thread_safe_model_call('explainer')
     def explain(self, analysis_result):
-        """Generate grammar explanation based on analysis using Together AI API (thread-safe)"""
+        """Generate grammar explanation, serving repeated analyses from the cache (thread-safe)"""
+        cached = self.cached_explanation(analysis_result)
+        if cached is not None:
+            return cached
+        
+        return self._explain_uncached(analysis_result)
+    
+    def _explain_uncached(self, analysis_result):
+        """Call the Together AI API (or mock fallback) and cache real API results"""
         thai_text = analysis_result.get('input_thai', '')
         translation = analysis_result.get('translation', '')
         analyzed_sentence = analysis_result.get('analyzed_sentence', translation)
@@ -903,19 +1616,75 @@ class GrammarExplainer:
         
         if self.client:
             try:
-                explanation = self._generate_explanation_api(
-                    thai_text, translation, analyzed_sentence, is_multi_sentence, fine_code, confidence
-                )
-                return self._parse_explanation_sections(explanation)
+                with _api_limiter.slot(timeout=_api_wait_timeout()), span('together.explanation'):
+                    explanation = self._generate_explanation_api(
+                        thai_text, translation, analyzed_sentence, is_multi_sentence, fine_code, confidence
+                    )
+                parsed = self._parse_explanation_sections(explanation)
+                # Only real API output is cached, never mock fallbacks
+                if self.cache:
+                    self.cache.set(analyzed_sentence, fine_code, is_multi_sentence,
+                                   self._confidence_tier(confidence), parsed)
+                return parsed
             except Exception as e:
+                # API timeouts caused by the request deadline end the request
+                check_deadline('explanation')
                 print(f"API explanation failed: {e}")
                 # Fall back to mock explanation
         
         # Mock explanation as fallback
         return self._generate_mock_explanation(analysis_result)
     
-    def _generate_explanation_api(self, thai_text, english_translation, analyzed_sentence, is_multi_sentence, fine_label, confidence):
-        """Generate explanation using Together AI API with enhanced context for sentence analysis"""
+    def explain_stream(self, analysis_result):
+        """
+        Yield (section_name, content) pairs as soon as each explanation section
+        is complete. Cached and fallback explanations are yielded all at once.
+        """
+        analyzed_sentence = analysis_result.get('analyzed_sentence', analysis_result.get('translation', ''))
+        fine_code = analysis_result.get('fine_code', 'UNKNOWN')
+        is_multi_sentence = analysis_result.get('is_multi_sentence', False)
+        confidence = analysis_result.get('confidence', 0.0)
+        
+        if self.cache:
+            cached = self.cache.get(analyzed_sentence, fine_code, is_multi_sentence, self._confidence_tier(confidence))
+            if cached is not None:
+                yield from cached['parsed_sections'].items()
+                return
+        
+        if self.client:
+            parser = IncrementalSectionParser(self)
+            try:
+                # The slot is held until the stream is fully read
+                with _api_limiter.slot():
+                    text_stream = self._generate_explanation_api(
+                        analysis_result.get('input_thai', ''), analysis_result.get('translation', ''),
+                        analyzed_sentence, is_multi_sentence, fine_code, confidence, stream=True
+                    )
+                    for chunk in text_stream:
+                        yield from parser.feed(chunk)
+                
+                parsed, remaining = parser.finish()
+                yield from remaining
+                if self.cache and parsed['raw_explanation']:
+                    self.cache.set(analyzed_sentence, fine_code, is_multi_sentence,
+                                   self._confidence_tier(confidence), parsed)
+                return
+            except Exception as e:
+                print(f"API explanation stream failed: {e}")
+                if parser.completed:
+                    # Sections already sent cannot be taken back; fill in the rest
+                    yield from ((name, "ส่วนนี้ไม่สามารถแยกได้") for name in EXPLANATION_SECTION_PATTERNS
+                                if name not in parser.completed)
+                    return
+        
+        # Mock explanation as fallback
+        yield from self._generate_mock_explanation(analysis_result)['parsed_sections'].items()
+    
+    def _generate_explanation_api(self, thai_text, english_translation, analyzed_sentence, is_multi_sentence, fine_label, confidence, stream=False):
+        """
+        Generate explanation using Together AI API with enhanced context for sentence analysis.
+        With stream=True, returns an iterator over the generated text instead.
+        """
         # Get detailed tag definitions
         fine_def = self.tense_definitions.fine_definitions.get(fine_label, {})
         
@@ -1043,36 +1812,38 @@ Tense ที่ระบบตรวจพบ: {fine_label} (ความมั
         ]
 
         # Call Together AI API with same parameters as notebook 05
-        response = self.client.chat.completions.create(
+        client, timeout = _api_call_options(self.client, 'explanation')
+        response = client.chat.completions.create(
             model=self.model_name,
             messages=messages,
             max_tokens=600,
             temperature=0.7,
             top_p=0.9,
             top_k=50,
-            repetition_penalty=1.1
+            repetition_penalty=1.1,
+            stream=stream,
+            timeout=timeout
         )
 
+        if stream:
+            return self._stream_text(response)
         return response.choices[0].message.content.strip()
     
+    @staticmethod
+    def _stream_text(response):
+        """Text deltas of a streamed chat completion"""
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
     def _parse_explanation_sections(self, explanation):
         """Parse explanation into Thai sections using regex with enhanced formatting"""
         sections = {}
         
-        # Regex patterns for Thai sections with ** formatting
-        patterns = {
-            'tense_analysis': r'\*\*1\)\s*วิเคราะห์\s*Tense\s*ที่ใช้\*\*\s*(.*?)(?=\*\*2\)|$)',
-            'vocabulary': r'\*\*2\)\s*คำศัพท์ที่น่าสนใจ\*\*\s*(.*?)(?=\*\*3\)|$)', 
-            'common_mistakes': r'\*\*3\)\s*ข้อผิดพลาดที่พบบ่อย\*\*\s*(.*?)$'
-        }
-        
-        for section_name, pattern in patterns.items():
+        for section_name, pattern in EXPLANATION_SECTION_PATTERNS.items():
             match = re.search(pattern, explanation, re.DOTALL | re.IGNORECASE)
             if match:
-                raw_content = match.group(1).strip()
-                # Apply enhanced formatting to the section content
-                formatted_content = self._format_explanation_content(raw_content)
-                sections[section_name] = formatted_content
+                sections[section_name] = self._format_section_match(match)
             else:
                 sections[section_name] = "ส่วนนี้ไม่สามารถแยกได้"
         
@@ -1081,6 +1852,12 @@ Tense ที่ระบบตรวจพบ: {fine_label} (ความมั
             'parsed_sections': sections
         }
     
+    def _format_section_match(self, match):
+        """Formatted content of a matched section"""
+        raw_content = match.group(1).strip()
+        # Apply enhanced formatting to the section content
+        return self._format_explanation_content(raw_content)
+    
     def _format_explanation_content(self, content):
         """Enhanced formatting for explanation content to improve readability"""
         if not content:
@@ -1186,6 +1963,94 @@ Tense ที่ระบบตรวจพบ: {fine_label} (ความมั
         return self._parse_explanation_sections(explanation)
 
 
+# Stages of full_pipeline, in order (ModelManager._stage_<name>)
+PIPELINE_STAGES = ('translation', 'classification', 'explanation')
+
+# Classifier output copied into a result (and into each sentence of an all-sentences result)
+CLASSIFICATION_FIELDS = ('coarse_label', 'fine_label', 'fine_code', 'confidence', 'all_predictions')
+
+
+def sentence_analysis(result, sentence):
+    """
+    Explainer input for one sentence of an all-sentences result. The sentence
+    is explained on its own, so it shares cached explanations with single-sentence
+    input of the same sentence.
+    """
+    return {
+        'input_thai': result.get('input_thai'),
+        'translation': sentence['sentence'],
+        'analyzed_sentence': sentence['sentence'],
+        'is_multi_sentence': False,
+        'coarse_label': sentence.get('coarse_label'),
+        'fine_code': sentence.get('fine_code'),
+        'confidence': sentence.get('confidence')
+    }
+
+
+class PipelineRun:
+    """State of one full_pipeline request as it moves through the stages"""
+    
+    def __init__(self, thai_text, progress_callback, first_sentence_only, include_explanation, all_sentences=False):
+        self.thai_text = thai_text
+        self.progress_callback = progress_callback
+        # Later sentences must be translated to be analyzed
+        self.first_sentence_only = first_sentence_only and not all_sentences
+        self.include_explanation = include_explanation
+        self.all_sentences = all_sentences
+        # Stage keys depend only on the input, never on the user
+        self.input_key = canonicalize_text(thai_text)
+        
+        self.result = {"input_thai": thai_text}
+        self.timings = {stage: None for stage in PIPELINE_STAGES}
+        self.success = True
+        self.error_stage = None
+        # Early exits (fragments, timeout before translation) are not logged
+        self.log = True
+        # Set when the request stops waiting for the stage executor; the
+        # stages still queued or running for it then drop their output
+        self.cancelled = False
+    
+    def fail(self, error_stage):
+        if self.cancelled:
+            return
+        self.success = False
+        self.error_stage = error_stage
+    
+    def abandon(self, error):
+        """
+        Fail a run the stage executor could not finish (DeadlineExceeded,
+        StageQueueFull or StageError) and return its result, with the fields
+        the serial path fills in for a failed stage. Its stage threads may still
+        be writing to self.result, so the returned result is a copy they never see.
+        """
+        if isinstance(error, DeadlineExceeded):
+            self.fail("timeout_" + error.stage)
+            message, label = f"Pipeline timeout: {error}", "TIMEOUT"
+        elif isinstance(error, StageQueueFull):
+            self.fail("overloaded_" + error.stage)
+            message, label = f"Server busy: {error}", "BUSY"
+        else:
+            self.fail(error.stage)
+            message, label = f"Pipeline error: {error}", "ERROR"
+        self.cancelled = True
+        self.log = True
+        
+        result = dict(self.result)
+        if result.get("sentences"):
+            result["sentences"] = [dict(entry) for entry in result["sentences"]]
+        if "translation" not in result:
+            result.update(translation=message, analyzed_sentence="", is_multi_sentence=False)
+        if not result.get("is_fragment"):
+            if "coarse_label" not in result:
+                result.update(coarse_label=label, fine_label=message, fine_code=label,
+                              confidence=0.0, all_predictions={})
+            if result.get("explanation") is None:
+                result["explanation"] = f"[SECTION 1: Context Cues]\n{message}"
+        result["error"] = str(error)
+        result["error_stage"] = self.error_stage
+        return result
+
+
 class ModelManager:
     """Manages all models and coordinates the pipeline"""
     def __init__(self):
@@ -1193,10 +2058,42 @@ class ModelManager:
         self.classifier = None
         self.explainer = None
         self.fragment_handler = None
+        
+        # Stop translating at the first sentence boundary, since only the first
+        # sentence is analyzed (set TRANSLATION_FIRST_SENTENCE_ONLY=1 to enable)
+        self.first_sentence_only = os.getenv('TRANSLATION_FIRST_SENTENCE_ONLY', '0') == '1'
+        
+        # Analyze every sentence of multi-sentence input instead of only the first
+        # (set ANALYZE_ALL_SENTENCES=1 to enable), up to MAX_ANALYZED_SENTENCES
+        self.all_sentences = os.getenv('ANALYZE_ALL_SENTENCES', '0') == '1'
+        self.max_analyzed_sentences = int(os.getenv('MAX_ANALYZED_SENTENCES', 5))
+        
+        # Explanations generated in the background for split-phase /predict
+        self.deferred_explanations = DeferredExplanations(
+            lambda: self.explainer,
+            max_workers=int(os.getenv('DEFERRED_EXPLANATION_WORKERS', 4)),
+            handoff_timeout=float(os.getenv('DEFERRED_EXPLANATION_HANDOFF_TIMEOUT', 60))
+        )
+        
+        # Identical requests running at the same time share each stage's work
+        # (set SINGLE_FLIGHT_ENABLED=0 to disable)
+        self.single_flight = SingleFlight('pipeline') if os.getenv('SINGLE_FLIGHT_ENABLED', '1') != '0' else None
         self._load_models()
+        self.stage_executor = self._create_stage_executor()
     
     def _load_models(self):
         """Load all models with error handling"""
+        # Model-server mode: a separate process owns the models (see app/model_server.py)
+        socket_path = os.getenv('MODEL_SERVER_SOCKET')
+        if socket_path:
+            client = ModelServerClient(socket_path)
+            self.translator = client
+            self.classifier = client
+            self.explainer = client
+            self.fragment_handler = client
+            print(f"✓ Using shared model server at {socket_path}")
+            return
+        
         try:
             self.translator = TyphoonTranslator()
             print("✓ Translator loaded successfully")
@@ -1223,67 +2120,195 @@ class ModelManager:
         except Exception as e:
             print(f"✗ Fragment handler failed to load: {e}")
     
-    def full_pipeline(self, thai_text, progress_callback=None, user_id=None, log_performance=True, performance_callback=None, timeout=75):
+    def reinit_after_fork(self):
+        """
+        Called in each gunicorn worker after fork when the models were loaded
+        in the master (PRELOAD_MODELS=1, see gunicorn_config.py). Weights stay
+        shared copy-on-write; locks, thread pools and llama.cpp contexts are
+        rebuilt because they do not survive fork.
+        """
+        for model_type in _model_locks:
+            _model_locks[model_type] = threading.RLock()
+        
+        if isinstance(self.translator, ModelServerClient):
+            # Clients reconnect per process on their own
+            return
+        
+        for name, model in (('translator', self.translator), ('classifier', self.classifier)):
+            if model is None:
+                continue
+            try:
+                model.reinit_after_fork()
+            except Exception as e:
+                print(f"✗ Reinitializing the {name} after fork failed: {e}")
+        print(f"✓ Models reinitialized in worker {os.getpid()}")
+    
+    def full_pipeline(self, thai_text, progress_callback=None, user_id=None, log_performance=True, performance_callback=None, timeout=75, first_sentence_only=None, include_explanation=True, all_sentences=None):
         """
         Run full NLP pipeline on Thai text with optional progress callbacks and performance logging
         
         Args:
             thai_text: Input Thai text
-            progress_callback: Optional callback for progress updates
+            progress_callback: Optional callback for progress updates (called from
+                the stage worker threads when PIPELINE_EXECUTOR=1)
             user_id: User ID for performance logging
             log_performance: Whether to log performance metrics
             performance_callback: Callback for performance logging
             timeout: Maximum time in seconds for pipeline execution (default: 75s)
+            first_sentence_only: Translate only up to the first sentence boundary
+                (default: TRANSLATION_FIRST_SENTENCE_ONLY setting)
+            include_explanation: Set to False when the caller streams the
+                explanation itself (see GrammarExplainer.explain_stream)
+            all_sentences: Classify and explain every sentence of multi-sentence
+                input, listed under result["sentences"] (default: ANALYZE_ALL_SENTENCES setting)
         """
-        result = {"input_thai": thai_text}
-        
-        # Pipeline execution tracking
-        pipeline_start_time = time.time()
+        # The deadline reaches into each stage (see app/deadline.py), so a hung
+        # generation or API call ends at the deadline instead of after it
+        deadline = Deadline(timeout)
+        run = PipelineRun(
+            thai_text, progress_callback,
+            self.first_sentence_only if first_sentence_only is None else first_sentence_only,
+            include_explanation,
+            self.all_sentences if all_sentences is None else all_sentences
+        )
         
-        # Initialize timing variables
-        translation_time = None
-        classification_time = None
-        explanation_time = None
-        success = True
-        error_stage = None
+        if self.stage_executor:
+            # Identical concurrent requests share one run before it is queued;
+            # coalescing inside the stage workers would only see them one by one
+            key = (run.input_key, run.first_sentence_only, run.include_explanation, run.all_sentences)
+            try:
+                with deadline.activate():
+                    result, run.timings, run.success, run.error_stage, run.log = self._coalesced(
+                        'pipeline', key, partial(self._execute_run, run, deadline)
+                    )
+                result["input_thai"] = thai_text
+            except DeadlineExceeded as e:
+                # Gave up waiting for an identical request's run
+                result = run.abandon(e)
+                print(f"✗ Pipeline run abandoned: {e}")
+        else:
+            with deadline.activate():
+                stage = PIPELINE_STAGES[0]
+                while stage:
+                    stage = self._run_stage(stage, run)
+            result = run.result
         
-        # Timeout check helper
-        def check_timeout():
-            elapsed = time.time() - pipeline_start_time
-            if elapsed > timeout:
-                raise TimeoutError(f"Pipeline execution exceeded {timeout} seconds limit")
-            return elapsed
+        # Logged here, in the request thread, which has the app context
+        if run.log and log_performance and performance_callback and callable(performance_callback):
+            try:
+                performance_callback(
+                    user_id=user_id,
+                    input_length=len(thai_text),
+                    translation_time=run.timings['translation'],
+                    classification_time=run.timings['classification'],
+                    explanation_time=run.timings['explanation'],
+                    success=run.success,
+                    error_stage=run.error_stage
+                )
+            except Exception as e:
+                # Don't let performance logging break the pipeline
+                print(f"Performance logging failed: {e}")
         
-        # Step 1: Translation
-        if progress_callback:
-            progress_callback(1, 33, "Translating...", "กำลังแปล...")
+        if deadline.overran_stage:
+            print(f"✗ Pipeline deadline of {timeout}s exceeded during {deadline.overran_stage} "
+                  f"({deadline.elapsed():.1f}s, error stage: {run.error_stage})")
+        return result
+    
+    def _execute_run(self, run, deadline):
+        """Run on the stage executor; returns (result, timings, success, error_stage, log)"""
+        # Stages of different requests overlap; this thread just waits
+        try:
+            self.stage_executor.run(run, deadline)
+            result = run.result
+        except (DeadlineExceeded, StageQueueFull, StageError) as e:
+            result = run.abandon(e)
+            print(f"✗ Pipeline run abandoned: {e}")
+        return result, run.timings, run.success, run.error_stage, run.log
+    
+    def _coalesced(self, stage, key, fn):
+        """Run fn once for concurrent callers of the same stage and key"""
+        if self.single_flight is None:
+            return fn()
+        return self.single_flight.do(stage, key, fn)
+    
+    def _run_stage(self, stage, run):
+        """Run one pipeline stage; returns the next stage, or None when the run is complete"""
+        if run.cancelled:
+            return None
+        with span(f"stage.{stage}"):
+            next_stage = getattr(self, f"_stage_{stage}")(run)
+        # An abandoned run already answered its request without this output
+        return None if run.cancelled else next_stage
+    
+    def _create_stage_executor(self):
+        """Stage-pipelined executor (PIPELINE_EXECUTOR=1), or None to run stages in the request thread"""
+        if os.getenv('PIPELINE_EXECUTOR', '0') != '1':
+            return None
+        # Extra translation workers only help when there are contexts to run them
+        pool = getattr(self.translator, 'pool', None)
+        default_workers = {
+            'translation': pool.size if pool else 1,
+            'classification': 1,
+            'explanation': _api_limiter.max_concurrent
+        }
+        queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', 16))
+        stages = [
+            (stage, partial(self._run_stage, stage),
+             int(os.getenv(f'PIPELINE_{stage.upper()}_WORKERS', default_workers[stage])), queue_size)
+            for stage in PIPELINE_STAGES
+        ]
+        print(f"✓ Stage-pipelined executor enabled: "
+              f"{', '.join(f'{name} x{workers}' for name, _, workers, _ in stages)}")
+        return StageExecutor('pipeline', stages)
+    
+    def _stage_translation(self, run):
+        """Step 1: Translation, with fragment detection"""
+        result = run.result
+        thai_text = run.thai_text
+        if run.progress_callback:
+            run.progress_callback(1, 33, "Translating...", "กำลังแปล...")
         
         try:
-            check_timeout()  # Check timeout before starting translation
+            check_deadline('translation')  # Check timeout before starting translation
         except TimeoutError as e:
             result["translation"] = f"Pipeline timeout: {str(e)}"
             result["analyzed_sentence"] = ""
             result["is_multi_sentence"] = False
-            return result
+            run.error_stage = "timeout_translation"
+            run.log = False
+            return None
         
         if self.translator:
             try:
                 start_time = time.time()
-                full_translation = self.translator.translate(thai_text)
+                if run.first_sentence_only:
+                    full_translation, first_sentence, is_multi_sentence = self._coalesced(
+                        'translation', (run.input_key, 'first_sentence'),
+                        lambda: self.translator.translate_first_sentence(thai_text)
+                    )
+                else:
+                    full_translation = self._coalesced(
+                        'translation', (run.input_key, 'full'), lambda: self.translator.translate(thai_text)
+                    )
+                    # Extract first sentence for classification
+                    first_sentence, is_multi_sentence = extract_first_sentence(full_translation)
                 result["translation"] = full_translation
-                translation_time = time.time() - start_time
+                run.timings['translation'] = time.time() - start_time
                 
-                # Extract first sentence for classification
-                first_sentence, is_multi_sentence = extract_first_sentence(full_translation)
                 result["analyzed_sentence"] = first_sentence
                 result["is_multi_sentence"] = is_multi_sentence
+                # Later sentences were not translated
+                result["translation_truncated"] = bool(run.first_sentence_only and is_multi_sentence)
                 
                 # Step 1.5: Fragment detection - BYPASS BERT if fragment detected
                 if is_fragment(first_sentence):
+                    run.log = False
                     if self.fragment_handler:
-                        fragment_result = self.fragment_handler.handle_fragment(thai_text, first_sentence)
                         # Return fragment result immediately - NO BERT classification
-                        return fragment_result
+                        run.result = self._coalesced(
+                            'fragment', (run.input_key, first_sentence),
+                            lambda: self.fragment_handler.handle_fragment(thai_text, first_sentence)
+                        )
                     else:
                         # Fallback if fragment handler not available
                         result["is_fragment"] = True
@@ -1295,60 +2320,70 @@ class ModelManager:
                                 'complete_sentence_guide': 'กรุณาใส่ประโยคสมบูรณ์'
                             }
                         }
-                        return result
+                    return None
+                
+                if run.all_sentences and is_multi_sentence:
+                    sentences = split_sentences(full_translation)
+                    result["sentences"] = [
+                        {'sentence': sentence, 'is_fragment': is_fragment(sentence)}
+                        for sentence in sentences[:self.max_analyzed_sentences]
+                    ]
+                    result["sentences_truncated"] = len(sentences) > self.max_analyzed_sentences
                 
             except Exception as e:
-                translation_time = time.time() - start_time if 'start_time' in locals() else 0
+                run.timings['translation'] = time.time() - start_time if 'start_time' in locals() else 0
                 result["translation"] = f"Translation failed: {str(e)}"
                 result["analyzed_sentence"] = ""
                 result["is_multi_sentence"] = False
-                success = False
-                error_stage = "translation"
+                run.fail(f"timeout_{e.stage}" if isinstance(e, DeadlineExceeded) else "translation")
         else:
             result["translation"] = "Translation service unavailable"
             result["analyzed_sentence"] = ""
             result["is_multi_sentence"] = False
-            success = False
-            error_stage = "translation"
+            run.fail("translation")
         
-        # Step 2: Tense Classification
-        if progress_callback:
-            progress_callback(2, 66, "Classifying tense...", "กำลังจำแนกกาล...")
+        return 'classification'
+    
+    def _stage_classification(self, run):
+        """Step 2: Tense Classification"""
+        result = run.result
+        if run.progress_callback:
+            run.progress_callback(2, 66, "Classifying tense...", "กำลังจำแนกกาล...")
         
         try:
-            check_timeout()  # Check timeout before starting classification
+            check_deadline('classification')  # Check timeout before starting classification
         except TimeoutError as e:
             result["coarse_label"] = "TIMEOUT"
             result["fine_label"] = f"Classification timeout: {str(e)}"
             result["fine_code"] = "TIMEOUT"
             result["confidence"] = 0.0
             result["all_predictions"] = {}
-            success = False
-            error_stage = "timeout_classification"
-            # Skip to end for performance logging
-            if log_performance and performance_callback and callable(performance_callback):
-                try:
-                    input_length = len(thai_text)
-                    total_time = time.time() - pipeline_start_time
-                    performance_callback(
-                        user_id=user_id,
-                        input_length=input_length,
-                        translation_time=translation_time,
-                        classification_time=None,
-                        explanation_time=None,
-                        success=False,
-                        error_stage="timeout_classification"
-                    )
-                except Exception as e:
-                    print(f"Performance logging failed: {e}")
-            return result
+            # Keep the stage that actually overran
+            run.fail(run.error_stage or "timeout_classification")
+            return None
         
-        if self.classifier and "analyzed_sentence" in result and result["analyzed_sentence"] and success:
+        if self.classifier and "analyzed_sentence" in result and result["analyzed_sentence"] and run.success:
             try:
                 start_time = time.time()
-                # Classify only the first sentence
-                classification_result = self.classifier.classify(result["analyzed_sentence"])
-                classification_time = time.time() - start_time
+                if "sentences" in result:
+                    # Every complete sentence in one batched forward pass; the
+                    # first one is always complete (fragments exit earlier)
+                    analyzable = [entry for entry in result["sentences"] if not entry["is_fragment"]]
+                    classifications = self._coalesced(
+                        'classification', tuple(canonicalize_text(entry["sentence"]) for entry in analyzable),
+                        lambda: self.classifier.classify_batch([entry["sentence"] for entry in analyzable])
+                    )
+                    for entry, classification in zip(analyzable, classifications):
+                        entry.update({field: classification[field] for field in CLASSIFICATION_FIELDS})
+                    classification_result = classifications[0]
+                else:
+                    # Classify only the first sentence
+                    analyzed_sentence = result["analyzed_sentence"]
+                    classification_result = self._coalesced(
+                        'classification', canonicalize_text(analyzed_sentence),
+                        lambda: self.classifier.classify(analyzed_sentence)
+                    )
+                run.timings['classification'] = time.time() - start_time
                 
                 result["coarse_label"] = classification_result["coarse_label"]
                 result["fine_label"] = classification_result["fine_label"]
@@ -1356,86 +2391,96 @@ class ModelManager:
                 result["confidence"] = classification_result["confidence"]
                 result["all_predictions"] = classification_result["all_predictions"]
             except Exception as e:
-                classification_time = time.time() - start_time if 'start_time' in locals() else 0
+                run.timings['classification'] = time.time() - start_time if 'start_time' in locals() else 0
+                # Per-sentence results are incomplete; show the first sentence only
+                result.pop("sentences", None)
                 result["coarse_label"] = "ERROR"
                 result["fine_label"] = f"Classification failed: {str(e)}"
                 result["fine_code"] = "ERROR"
                 result["confidence"] = 0.0
                 result["all_predictions"] = {}
-                success = False
-                error_stage = "classification"
+                run.fail("timeout_classification" if isinstance(e, DeadlineExceeded) else "classification")
         else:
             result["coarse_label"] = "UNKNOWN"
             result["fine_label"] = "Classification service unavailable"
             result["fine_code"] = "UNKNOWN"
             result["confidence"] = 0.0
             result["all_predictions"] = {}
-            if success:  # Only mark as failed if it wasn't already failed
-                success = False
-                error_stage = "classification"
+            if run.success:  # Only mark as failed if it wasn't already failed
+                run.fail("classification")
         
-        # Step 3: Grammar Explanation
-        if progress_callback:
-            progress_callback(3, 100, "Generating explanation...", "กำลังสร้างคำอธิบาย...")
+        return 'explanation'
+    
+    def _stage_explanation(self, run):
+        """Step 3: Grammar Explanation"""
+        result = run.result
+        if run.progress_callback:
+            run.progress_callback(3, 100, "Generating explanation...", "กำลังสร้างคำอธิบาย...")
         
         try:
-            check_timeout()  # Check timeout before starting explanation
+            check_deadline('explanation')  # Check timeout before starting explanation
         except TimeoutError as e:
             result["explanation"] = f"[SECTION 1: Context Cues]\nExplanation timeout: {str(e)}"
-            success = False
-            error_stage = "timeout_explanation"
-            # Skip to performance logging
-            if log_performance and performance_callback and callable(performance_callback):
-                try:
-                    input_length = len(thai_text)
-                    total_time = time.time() - pipeline_start_time
-                    performance_callback(
-                        user_id=user_id,
-                        input_length=input_length,
-                        translation_time=translation_time,
-                        classification_time=classification_time,
-                        explanation_time=None,
-                        success=False,
-                        error_stage="timeout_explanation"
-                    )
-                except Exception as e:
-                    print(f"Performance logging failed: {e}")
-            return result
+            run.fail(run.error_stage or "timeout_explanation")
+            return None
         
-        if self.explainer and success:
+        if not run.include_explanation and run.success:
+            # Left to the caller; not counted as a failed stage
+            result["explanation"] = None
+        elif self.explainer and run.success:
             try:
                 start_time = time.time()
-                result["explanation"] = self.explainer.explain(result)
-                explanation_time = time.time() - start_time
+                if "sentences" in result:
+                    self._explain_sentences(run)
+                else:
+                    analysis_result = dict(result)
+                    result["explanation"] = self._coalesced(
+                        'explanation',
+                        (run.input_key, canonicalize_text(result["analyzed_sentence"]), result["fine_code"],
+                         result["confidence"], result["is_multi_sentence"]),
+                        lambda: self.explainer.explain(analysis_result)
+                    )
+                run.timings['explanation'] = time.time() - start_time
             except Exception as e:
-                explanation_time = time.time() - start_time if 'start_time' in locals() else 0
+                run.timings['explanation'] = time.time() - start_time if 'start_time' in locals() else 0
                 result["explanation"] = f"[SECTION 1: Context Cues]\nExplanation generation failed: {str(e)}"
-                success = False
-                error_stage = "explanation"
+                run.fail("timeout_explanation" if isinstance(e, DeadlineExceeded) else "explanation")
         else:
             result["explanation"] = "[SECTION 1: Context Cues]\nExplanation service unavailable"
-            if success:  # Only mark as failed if it wasn't already failed
-                success = False
-                error_stage = "explanation"
+            if run.success:  # Only mark as failed if it wasn't already failed
+                run.fail("explanation")
         
-        # Log performance if enabled and callback is provided
-        if log_performance and performance_callback and callable(performance_callback):
-            try:
-                input_length = len(thai_text)
-                performance_callback(
-                    user_id=user_id,
-                    input_length=input_length,
-                    translation_time=translation_time,
-                    classification_time=classification_time,
-                    explanation_time=explanation_time,
-                    success=success,
-                    error_stage=error_stage
-                )
-            except Exception as e:
-                # Don't let performance logging break the pipeline
-                print(f"Performance logging failed: {e}")
+        return None
+    
+    def _explain_sentences(self, run):
+        """
+        Explain every complete sentence of an all-sentences result concurrently,
+        so the explanation step takes about as long as for one sentence (the
+        Together AI limiter still caps the calls in flight)
+        """
+        result = run.result
+        analyzable = [entry for entry in result["sentences"] if not entry["is_fragment"]]
         
-        return result
+        def explain(entry):
+            analysis_result = sentence_analysis(result, entry)
+            return self._coalesced(
+                'explanation',
+                (run.input_key, canonicalize_text(entry["sentence"]), entry["fine_code"], entry["confidence"], False),
+                lambda: self.explainer.explain(analysis_result)
+            )
+        
+        with ThreadPoolExecutor(max_workers=len(analyzable), thread_name_prefix='sentence-explain') as pool:
+            # Each thread runs in a copy of this context, so the request deadline applies there too
+            futures = [pool.submit(contextvars.copy_context().run, explain, entry) for entry in analyzable]
+            for entry, future in zip(analyzable, futures):
+                try:
+                    entry["explanation"] = future.result()
+                except Exception as e:
+                    if entry is analyzable[0]:
+                        raise
+                    print(f"Explanation of sentence failed: {e}")
+                    entry["explanation"] = f"[SECTION 1: Context Cues]\nExplanation generation failed: {str(e)}"
+        result["explanation"] = analyzable[0]["explanation"]
 
 
 # For backward compatibility with existing code expecting Hybrid4BSystem
@@ -165,6 +165,16 @@ rate_limiter = RateLimiter(
     min_interval=15         # minimum 15 seconds between requests from same user
 )
 
+# Explanation streams follow a /predict right away, so they get their own
+# budget with the same limits but no minimum interval
+explanation_rate_limiter = RateLimiter(
+    per_user_requests=2,
+    per_user_window=60,
+    global_requests=10,
+    global_window=60,
+    min_interval=0
+)
+
 
 def rate_limit(f):
     """
@@ -176,6 +186,15 @@ def rate_limit(f):
         def predict():
             return "Success"
     """
+    return _rate_limited(f, rate_limiter)
+
+
+def explanation_rate_limit(f):
+    """Decorator for rate limiting explanation streams (see rate_limit)"""
+    return _rate_limited(f, explanation_rate_limiter)
+
+
+def _rate_limited(f, limiter):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Generate user identifier
@@ -184,18 +203,19 @@ def rate_limit(f):
         else:
             user_id = f"ip_{request.remote_addr}"
         
-        # Generate request hash for duplicate detection
-        request_data = request.form.get('thai_text', '') + request.path
+        # Generate request hash for duplicate detection (query strings carry stream tokens)
+        request_data = request.form.get('thai_text', '') + request.full_path
         request_hash = hash(request_data)
         
         # Check rate limit
-        is_allowed, reason, retry_after = rate_limiter.is_allowed(user_id, request_hash)
+        is_allowed, reason, retry_after = limiter.is_allowed(user_id, request_hash)
         
         if not is_allowed:
             print(f"Rate limit exceeded for {user_id}: {reason}")
             
             # For AJAX requests, return JSON
-            if request.is_json or request.headers.get('Content-Type') == 'application/json':
+            if request.is_json or request.headers.get('Content-Type') == 'application/json' \
+                    or request.headers.get('Accept') == 'text/event-stream':
                 return jsonify({
                     'error': 'Rate limit exceeded',
                     'message': reason,
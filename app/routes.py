@@ -1,20 +1,48 @@
 """
 Main application routes
 """
+import os
+import json
 import time
-from flask import Blueprint, render_template, request, flash, jsonify, session, redirect, url_for, current_app
+import uuid
+from flask import (Blueprint, render_template, request, flash, jsonify, session, redirect, url_for, current_app,
+                   Response, stream_with_context, send_file)
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from flask_login import login_required, current_user
 from flask_babel import get_locale
-from .pipeline import ModelManager
+from .pipeline import ModelManager, sentence_analysis
 from .validation import InputValidator
 from .utils import format_explanation_content, parse_explanation
 from .data import get_performance_data
-from .rate_limiter import rate_limit, get_rate_limit_info
+from .rate_limiter import rate_limit, explanation_rate_limit, get_rate_limit_info
+from .admission import admission_control, admission_controller
+from .batch import BatchProcessor, BatchJobs, input_validator_check
+from .tracing import tracer
+from .shared_weights import memory_breakdown
+from .stream_tokens import SingleUseTokens
 from .models import UserActivity
 
 # Create blueprint
 main_bp = Blueprint('main', __name__)
 
+# Explanation sections in display order: parsed section name -> (template key, title)
+EXPLANATION_SECTION_TITLES = {
+    'tense_analysis': ('section_1', 'วิเคราะห์ Tense ที่ใช้'),
+    'vocabulary': ('section_2', 'คำศัพท์ที่น่าสนใจ'),
+    'common_mistakes': ('section_3', 'ข้อผิดพลาดที่พบบ่อย')
+}
+
+# Analysis fields the explainer needs, carried to the streaming endpoint in a signed token
+EXPLANATION_STREAM_FIELDS = ('input_thai', 'translation', 'analyzed_sentence', 'is_multi_sentence',
+                             'coarse_label', 'fine_code', 'confidence')
+
+# Seconds a result page may take to open its explanation stream
+EXPLANATION_TOKEN_MAX_AGE = 600
+
+# Each explanation stream token starts one generation
+stream_tokens = SingleUseTokens(os.getenv('STREAM_TOKEN_DB_PATH', './cache/stream_tokens.sqlite3'),
+                                retention=EXPLANATION_TOKEN_MAX_AGE)
+
 # Initialize the model manager and input validator
 model_manager = ModelManager()
 input_validator = InputValidator(
@@ -23,6 +51,19 @@ input_validator = InputValidator(
     enable_profanity_filter=True
 )
 
+# Worksheets submitted through /api/batch, one directory per job
+batch_jobs = BatchJobs(
+    os.getenv('BATCH_JOBS_DIR', './cache/batch_jobs'),
+    lambda include_explanation: BatchProcessor(
+        model_manager,
+        chunk_size=int(os.getenv('BATCH_CHUNK_SIZE', 32)),
+        translation_concurrency=int(os.getenv('BATCH_TRANSLATION_CONCURRENCY', 4)),
+        explanation_concurrency=int(os.getenv('BATCH_EXPLANATION_CONCURRENCY', 4)),
+        include_explanation=include_explanation,
+        validate=input_validator_check(input_validator)
+    )
+)
+
 
 @main_bp.route('/')
 def index():
@@ -67,6 +108,7 @@ def set_language(language):
 @main_bp.route('/predict', methods=['POST'])
 @login_required
 @rate_limit
+@admission_control(lambda: _explanation_mode() == 'inline')
 def predict():
     """Process Thai text through NLP pipeline"""
     try:
@@ -112,13 +154,24 @@ def predict():
             user_agent=request.headers.get('User-Agent')
         )
         
+        # How the explanation reaches the result page: 'stream' pushes sections
+        # over /explain/stream, 'deferred' generates it in the background right
+        # away and the page fetches it from /explain/result, 'inline' waits for it
+        explanation_mode = _explanation_mode()
+        
         # Run the pipeline with user ID for performance logging
         user_id = current_user.id if current_user and current_user.is_authenticated else None
         result = model_manager.full_pipeline(
             thai_text, 
             user_id=user_id, 
-            performance_callback=log_performance_data
+            performance_callback=log_performance_data,
+            include_explanation=explanation_mode == 'inline'
         )
+        explanation_stream_token = None
+        explanation_result_token = None
+        # All-sentences mode: explanation sections and result tokens of each sentence
+        sentence_sections = []
+        sentence_result_tokens = []
         
         # Check if this is a fragment result (no BERT classification)
         if result.get('is_fragment'):
@@ -155,32 +208,49 @@ def predict():
                         'content': 'ประโยคสมบูรณ์ต้องมีประธาน (Subject) และกริยา (Verb) อย่างน้อย'
                     }
                 }
+        elif result.get('explanation') is None:
+            # Sections arrive later; render empty placeholders
+            analysis_result = {field: result.get(field) for field in EXPLANATION_STREAM_FIELDS}
+            if result.get('sentences'):
+                analysis_result = sentence_analysis(result, result['sentences'][0])
+                # The other sentences are explained in the background in either mode
+                for entry in result['sentences'][1:]:
+                    token = None
+                    if not entry['is_fragment']:
+                        job_id = uuid.uuid4().hex
+                        sentence_job = sentence_analysis(result, entry)
+                        model_manager.deferred_explanations.submit(job_id, sentence_job)
+                        token = _explanation_serializer().dumps(
+                            {'job_id': job_id, 'user_id': user_id, 'analysis': sentence_job}
+                        )
+                    sentence_result_tokens.append(token)
+                    sentence_sections.append(None if entry['is_fragment'] else _explanation_sections(None))
+            if explanation_mode == 'deferred':
+                job_id = uuid.uuid4().hex
+                model_manager.deferred_explanations.submit(job_id, analysis_result)
+                explanation_result_token = _explanation_serializer().dumps(
+                    {'job_id': job_id, 'user_id': user_id, 'analysis': analysis_result}
+                )
+            else:
+                explanation_stream_token = _explanation_serializer().dumps(
+                    {'nonce': uuid.uuid4().hex, 'user_id': user_id, 'analysis': analysis_result}
+                )
+            explanation_sections = _explanation_sections(None)
         else:
             # Handle normal sentence results (with BERT classification)
-            explanation = result.get('explanation', '')
-            if isinstance(explanation, dict) and 'parsed_sections' in explanation:
-                # New format with parsed sections - apply formatting
-                explanation_sections = {
-                    'section_1': {
-                        'title': 'วิเคราะห์ Tense ที่ใช้',
-                        'content': format_explanation_content(explanation['parsed_sections'].get('tense_analysis', 'ส่วนนี้ไม่สามารถแยกได้'))
-                    },
-                    'section_2': {
-                        'title': 'คำศัพท์ที่น่าสนใจ',
-                        'content': format_explanation_content(explanation['parsed_sections'].get('vocabulary', 'ส่วนนี้ไม่สามารถแยกได้'))
-                    },
-                    'section_3': {
-                        'title': 'ข้อผิดพลาดที่พบบ่อย',
-                        'content': format_explanation_content(explanation['parsed_sections'].get('common_mistakes', 'ส่วนนี้ไม่สามารถแยกได้'))
-                    }
-                }
-            else:
-                # Legacy format - try to parse as before
-                explanation_sections = parse_explanation(explanation)
+            explanation_sections = _explanation_sections(result.get('explanation', ''))
+            sentence_sections = [
+                None if entry['is_fragment'] else _explanation_sections(entry.get('explanation', ''))
+                for entry in result.get('sentences', [])[1:]
+            ]
         
         return render_template('result.html', 
                                result=result,
-                               explanation_sections=explanation_sections)
+                               explanation_sections=explanation_sections,
+                               explanation_stream_token=explanation_stream_token,
+                               explanation_result_token=explanation_result_token,
+                               sentence_sections=sentence_sections,
+                               sentence_result_tokens=sentence_result_tokens)
     
     except Exception as e:
         flash(f'An error occurred: {str(e)}', 'error')
@@ -188,6 +258,206 @@ def predict():
 
 
 
+def _explanation_sections(explanation):
+    """Template sections of an explanation; None gives empty placeholders filled in by the page"""
+    if explanation is None:
+        return {
+            section_key: {'title': title, 'content': None}
+            for section_key, title in EXPLANATION_SECTION_TITLES.values()
+        }
+    if isinstance(explanation, dict) and 'parsed_sections' in explanation:
+        # New format with parsed sections - apply formatting
+        return {
+            section_key: {
+                'title': title,
+                'content': format_explanation_content(explanation['parsed_sections'].get(section_name, 'ส่วนนี้ไม่สามารถแยกได้'))
+            }
+            for section_name, (section_key, title) in EXPLANATION_SECTION_TITLES.items()
+        }
+    # Legacy format - try to parse as before
+    return parse_explanation(explanation)
+
+
+def _explanation_mode():
+    """EXPLANATION_MODE (stream, deferred or inline); EXPLANATION_STREAMING=1 still means stream"""
+    mode = os.getenv('EXPLANATION_MODE')
+    if mode in ('stream', 'deferred', 'inline'):
+        return mode
+    # Inline by default: only inline explanations are timed in the performance
+    # log that the performance pages and admission control read
+    return 'stream' if os.getenv('EXPLANATION_STREAMING', '0') == '1' else 'inline'
+
+
+def _explanation_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='explanation-stream')
+
+
+def _sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@main_bp.route('/explain/stream')
+@login_required
+@explanation_rate_limit
+def stream_explanation():
+    """
+    Server-Sent Events: each explanation section is pushed as soon as it is complete.
+    A token can be used once.
+    """
+    try:
+        payload = _explanation_serializer().loads(
+            request.args.get('token', ''), max_age=EXPLANATION_TOKEN_MAX_AGE
+        )
+    except BadSignature:
+        return jsonify({'error': 'Invalid or expired explanation token'}), 400
+    # Deferred result tokens share the signing key but carry no nonce; tokens
+    # are only valid for the user they were issued to
+    if not isinstance(payload, dict) or 'nonce' not in payload or payload.get('user_id') != current_user.id:
+        return jsonify({'error': 'Invalid or expired explanation token'}), 400
+    if not stream_tokens.claim(payload['nonce']):
+        return jsonify({'error': 'Explanation token already used'}), 409
+    analysis_result = payload['analysis']
+    
+    def events():
+        explainer = model_manager.explainer
+        if explainer is None:
+            yield _sse_event('failed', {'message': 'Explanation service unavailable'})
+            return
+        try:
+            for section_name, content in explainer.explain_stream(analysis_result):
+                section_key, title = EXPLANATION_SECTION_TITLES[section_name]
+                yield _sse_event('section', {
+                    'key': section_key,
+                    'title': title,
+                    'content': format_explanation_content(content)
+                })
+            yield _sse_event('done', {})
+        except Exception as e:
+            yield _sse_event('failed', {'message': f'Explanation generation failed: {e}'})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        # Proxies must pass each event through immediately
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@main_bp.route('/explain/result')
+@login_required
+def explanation_result():
+    """
+    Explanation started in the background by split-phase /predict.
+    Answers 202 while it is still being generated; the page polls again.
+    """
+    try:
+        payload, issued_at = _explanation_serializer().loads(
+            request.args.get('token', ''), max_age=EXPLANATION_TOKEN_MAX_AGE, return_timestamp=True
+        )
+    except BadSignature:
+        return jsonify({'error': 'Invalid or expired explanation token'}), 400
+    # Only the user the job was started for may read its explanation
+    if not isinstance(payload, dict) or 'job_id' not in payload or payload.get('user_id') != current_user.id:
+        return jsonify({'error': 'Invalid or expired explanation token'}), 400
+    
+    try:
+        explanation = model_manager.deferred_explanations.result(
+            payload['job_id'], payload['analysis'], issued_at.timestamp()
+        )
+    except Exception as e:
+        return jsonify({'status': 'failed', 'message': f'Explanation generation failed: {e}'}), 500
+    
+    if explanation is None:
+        return jsonify({'status': 'pending'}), 202
+    
+    sections = explanation.get('parsed_sections', {}) if isinstance(explanation, dict) else {}
+    return jsonify({
+        'status': 'done',
+        'sections': [
+            {
+                'key': section_key,
+                'title': title,
+                'content': format_explanation_content(sections.get(section_name, 'ส่วนนี้ไม่สามารถแยกได้'))
+            }
+            for section_name, (section_key, title) in EXPLANATION_SECTION_TITLES.items()
+        ]
+    })
+
+
+def _own_batch_job(job_id):
+    """Status of one of the current user's batch jobs, or None"""
+    status = batch_jobs.status(job_id)
+    if status is None or status['owner_id'] != current_user.id:
+        return None
+    return status
+
+
+@main_bp.route('/api/batch', methods=['POST'])
+@login_required
+@rate_limit
+def submit_batch():
+    """Queue a worksheet (JSONL, CSV or one sentence per line) for batch processing"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    max_sentences = int(os.getenv('BATCH_MAX_SENTENCES', 1000))
+    include_explanation = request.form.get('include_explanation', '1') != '0'
+    try:
+        job_id = batch_jobs.submit(current_user.id, upload.filename, upload.read(), include_explanation,
+                                   max_sentences=max_sentences)
+    except ValueError as e:
+        # Also raised for malformed JSONL and non-UTF-8 files
+        return jsonify({'error': f'Could not accept file: {e}'}), 400
+    
+    status = batch_jobs.status(job_id)
+    return jsonify({
+        'job_id': job_id,
+        'total': status['total'],
+        'status_url': url_for('main.batch_status', job_id=job_id),
+        'results_url': url_for('main.batch_results', job_id=job_id)
+    }), 202
+
+
+@main_bp.route('/api/batch/<job_id>')
+@login_required
+def batch_status(job_id):
+    """Progress and throughput of a batch job"""
+    status = _own_batch_job(job_id)
+    if status is None:
+        return jsonify({'error': 'Batch job not found'}), 404
+    
+    return jsonify({key: status.get(key) for key in
+                    ('job_id', 'state', 'total', 'processed', 'failed', 'sentences_per_second', 'elapsed', 'error')})
+
+
+@main_bp.route('/api/batch/<job_id>/results')
+@login_required
+def batch_results(job_id):
+    """Results written so far, one JSON object per line"""
+    if _own_batch_job(job_id) is None or not os.path.exists(batch_jobs.output_path(job_id)):
+        return jsonify({'error': 'Batch job not found'}), 404
+    
+    return send_file(os.path.abspath(batch_jobs.output_path(job_id)), mimetype='application/x-ndjson',
+                     as_attachment=True, download_name=f'batch_{job_id}.jsonl')
+
+
+@main_bp.route('/api/batch/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_batch(job_id):
+    """Continue an interrupted batch job after its last written chunk"""
+    status = _own_batch_job(job_id)
+    if status is None:
+        return jsonify({'error': 'Batch job not found'}), 404
+    if status['state'] not in ('interrupted', 'failed'):
+        return jsonify({'error': f'Batch job is {status["state"]}'}), 409
+    
+    if not batch_jobs.resume(job_id):
+        return jsonify({'error': 'Batch job is still running'}), 409
+    return jsonify({'job_id': job_id, 'state': 'queued'}), 202
+
+
 @main_bp.route('/validate', methods=['POST'])
 def validate_input():
     """API endpoint for real-time input validation"""
@@ -207,33 +477,30 @@ def validate_input():
 
 @main_bp.route('/api/average-response-time', methods=['GET'])
 def get_average_response_time():
-    """API endpoint to get current average response time for countdown timer"""
+    """API endpoint for the countdown timer: live, queue-aware time estimate for a new request"""
     try:
-        from .models import SystemPerformance
-        stats = SystemPerformance.get_performance_stats()
-        
-        # Get average total time, default to 10 seconds if no data
-        avg_total_time = stats.get('avg_total_time', 10.0)
-        
-        # Add small buffer for better UX (show slightly less time than actual)
-        display_time = max(5.0, avg_total_time * 0.9)  # 90% of actual time, minimum 5 seconds
-        
-        # Get input length factor for dynamic estimation
-        avg_input_length = stats.get('avg_input_length', 50.0)
+        admission_controller.refresh_service_times()
+        input_length = request.args.get('input_length', type=int)
+        if input_length is None:
+            input_length = round(admission_controller.model.average_input_length)
+        estimate = admission_controller.estimate(input_length, _explanation_mode() == 'inline')
         
         return jsonify({
-            'average_time': round(display_time, 1),
-            'total_requests': stats.get('total_requests', 0),
-            'success_rate': stats.get('success_rate', 0),
-            'average_input_length': round(avg_input_length, 0)
+            'average_time': round(max(1.0, estimate['total']), 1),
+            'estimated_wait': estimate['wait'],
+            'in_flight': estimate['in_flight'],
+            'total_requests': admission_controller.model.samples,
+            # The estimate already accounts for the input length
+            'average_input_length': input_length
         })
     
     except Exception as e:
-        # Fallback to default values if database not available
+        # Fallback to default values if the estimate is not available
         return jsonify({
             'average_time': 8.0,  # Conservative default
+            'estimated_wait': 0.0,
+            'in_flight': 0,
             'total_requests': 0,
-            'success_rate': 0,
             'average_input_length': 50
         })
 
@@ -267,6 +534,43 @@ def health_check():
             'all_models_loaded': all(model_status.values())
         }
         
+        # Translation cache hit/miss counters
+        translator = model_manager.translator
+        if translator is not None and getattr(translator, 'cache', None):
+            health_data['translation_cache'] = translator.cache.get_stats()
+        if translator is not None and getattr(translator, 'batcher', None):
+            health_data['translation_batcher'] = translator.batcher.get_stats()
+        if translator is not None and getattr(translator, 'pool', None):
+            health_data['translator_pool'] = translator.pool.get_stats()
+        explainer = model_manager.explainer
+        if explainer is not None and getattr(explainer, 'cache', None):
+            health_data['explanation_cache'] = explainer.cache.get_stats()
+        if explainer is not None and hasattr(explainer, 'get_limiter_stats'):
+            health_data['together_api_limiter'] = explainer.get_limiter_stats()
+        health_data['deferred_explanations'] = model_manager.deferred_explanations.get_stats()
+        if model_manager.single_flight:
+            health_data['single_flight'] = model_manager.single_flight.get_stats()
+        if model_manager.stage_executor:
+            health_data['pipeline_stages'] = model_manager.stage_executor.get_stats()
+        try:
+            health_data['admission'] = admission_controller.get_stats()
+        except Exception as e:
+            health_data['admission'] = {'error': str(e)}
+        if tracer.enabled:
+            health_data['tracing'] = tracer.get_stats()
+        
+        # Unique vs shared resident memory of this worker
+        memory = memory_breakdown()
+        if memory:
+            health_data['worker_memory'] = dict(memory, pid=os.getpid())
+        if translator is not None and getattr(translator, 'cpu_partition', None):
+            health_data['cpu_partition'] = translator.cpu_partition.to_dict()
+        classifier = model_manager.classifier
+        if classifier is not None and getattr(classifier, 'backend', None):
+            health_data['classifier_backend'] = classifier.backend
+        if classifier is not None and getattr(classifier, 'cache', None):
+            health_data['classification_cache'] = classifier.cache.get_stats()
+        
         # Return appropriate status code
         status_code = 200 if health_data['all_models_loaded'] else 503
         
@@ -0,0 +1,89 @@
+"""
+Zero-copy model weights and per-process memory accounting.
+Safetensors files are memory-mapped and the classifier's parameters are built
+directly on the mapped pages, so every worker (and the gunicorn master with
+PRELOAD_MODELS=1) shares one physical copy of the weights through the page
+cache instead of holding a private copy each.
+"""
+
+import os
+import json
+import mmap
+import struct
+
+
+# Safetensors dtype codes -> torch dtype names
+SAFETENSORS_DTYPES = {
+    'F64': 'float64',
+    'F32': 'float32',
+    'F16': 'float16',
+    'BF16': 'bfloat16',
+    'I64': 'int64',
+    'I32': 'int32',
+    'I16': 'int16',
+    'I8': 'int8',
+    'U8': 'uint8',
+    'BOOL': 'bool'
+}
+
+
+def load_safetensors_mmap(path):
+    """
+    Map a safetensors file and return {name: tensor} views into the mapping.
+
+    The mapping is private copy-on-write (ACCESS_COPY): pages stay shared
+    with the page cache until a tensor is written to, and writes never reach
+    the file. Pass the result to load_state_dict(..., assign=True) so the
+    module keeps these tensors instead of copying them into its own.
+    """
+    import torch
+
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        # The mapping stays valid after the file is closed
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info['dtype']])
+        begin, end = info['data_offsets']
+        if end == begin:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+            continue
+        # The tensor holds a reference to the mapping, which keeps it alive
+        tensor = torch.frombuffer(mapped, dtype=dtype, count=(end - begin) // dtype.itemsize,
+                                  offset=data_start + begin)
+        tensors[name] = tensor.view(info['shape'])
+    return tensors
+
+
+def memory_breakdown(pid='self'):
+    """
+    Resident memory of a process split into pages only it uses and pages
+    shared with other processes (e.g. mmap'd weights, memory inherited from
+    the gunicorn master), from /proc/<pid>/smaps_rollup. Values in MB;
+    returns None where smaps_rollup is unavailable.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        'rss_mb': mb('Rss'),
+        'pss_mb': mb('Pss'),
+        'unique_mb': mb('Private_Clean', 'Private_Dirty'),
+        'shared_mb': mb('Shared_Clean', 'Shared_Dirty')
+    }
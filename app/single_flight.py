@@ -0,0 +1,115 @@
+"""
+Single-flight coalescing of identical in-flight work.
+When several threads ask for the same result at the same time (a class
+submitting the same sentence within seconds), the first one computes it and
+the others wait for that computation and receive a copy of its result instead
+of running the model again. Nothing is kept once the computation finishes;
+repeated requests after that are served by the caches.
+"""
+
+import copy
+import threading
+
+from .deadline import current_deadline, DeadlineExceeded
+from .tracing import span
+
+
+class _Call:
+    """One in-flight computation and the callers waiting for it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        # Set when the leader's own deadline ended the computation: its
+        # DeadlineExceeded or a result cut short must not reach the followers
+        self.leader_only = False
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same stage and key"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        # Statistics per stage
+        self.leaders = {}
+        self.coalesced = {}
+        self.retried = {}
+        self.max_waiters = 0
+
+    def do(self, stage, key, fn):
+        """
+        Return fn(), sharing one execution among concurrent callers with the same stage and key.
+        Errors of the shared execution are raised in every caller, except when
+        the execution ran into its caller's deadline: the other callers then
+        run (or join) it again under their own deadlines.
+        """
+        call_key = (stage, key)
+        while True:
+            with self._lock:
+                call = self._calls.get(call_key)
+                leader = call is None
+                if leader:
+                    call = self._calls[call_key] = _Call()
+                    self.leaders[stage] = self.leaders.get(stage, 0) + 1
+                else:
+                    call.waiters += 1
+                    self.coalesced[stage] = self.coalesced.get(stage, 0) + 1
+                    self.max_waiters = max(self.max_waiters, call.waiters)
+
+            if leader:
+                return self._lead(call_key, call, fn)
+
+            # Wait no longer than this request's own deadline
+            deadline = current_deadline()
+            with span(f"coalesced.{stage}"):
+                finished = call.done.wait(deadline.remaining() if deadline else None)
+            if not finished:
+                deadline.check(stage)
+                raise DeadlineExceeded(stage, deadline.budget)
+            if call.leader_only:
+                if deadline:
+                    deadline.check(stage)
+                with self._lock:
+                    self.retried[stage] = self.retried.get(stage, 0) + 1
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+    def _lead(self, call_key, call, fn):
+        deadline = current_deadline()
+        try:
+            call.result = fn()
+            # Callers may modify their result, so the shared one is only ever copied
+            return copy.deepcopy(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            call.leader_only = isinstance(call.error, DeadlineExceeded) or \
+                (deadline is not None and deadline.expired())
+            with self._lock:
+                del self._calls[call_key]
+            call.done.set()
+
+    def get_stats(self):
+        """Get executions and coalesced callers per stage"""
+        with self._lock:
+            stages = sorted(set(self.leaders) | set(self.coalesced) | set(self.retried))
+            return {
+                'in_flight': len(self._calls),
+                'max_waiters': self.max_waiters,
+                'stages': {
+                    stage: {
+                        'executions': self.leaders.get(stage, 0),
+                        'coalesced': self.coalesced.get(stage, 0),
+                        'retried': self.retried.get(stage, 0)
+                    }
+                    for stage in stages
+                }
+            }
@@ -0,0 +1,195 @@
+"""
+Stage-pipelined execution of the NLP pipeline.
+Each stage (translation, classification, explanation) has its own worker
+threads and bounded queue, so while one request waits on Together AI the
+translator is already working on the next one. Requests still block on the
+result (run() is a blocking facade), but the stages of different requests
+overlap instead of each request holding one thread through all three.
+"""
+
+import os
+import time
+import queue
+import threading
+import contextvars
+
+from .deadline import DeadlineExceeded
+
+
+class StageQueueFull(Exception):
+    """Raised when a stage queue stays full for longer than the request may wait"""
+
+    def __init__(self, stage, size):
+        self.stage = stage
+        super().__init__(f"{stage} queue is full ({size} waiting)")
+
+
+class StageError(Exception):
+    """Raised by run() when a stage raised an unexpected error (chained as __cause__)"""
+
+    def __init__(self, stage, error):
+        self.stage = stage
+        super().__init__(f"{stage} failed: {error}")
+
+
+class _Job:
+    """One request moving through the stages"""
+
+    def __init__(self, state, deadline):
+        self.state = state
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.error = None
+        self.stage = None
+        self.enqueued_at = time.time()
+        # Stage threads run the job in the submitter's context (e.g. its trace)
+        self.context = contextvars.copy_context()
+
+
+class _Stage:
+    """Worker threads and queue of one stage, with utilization statistics"""
+
+    def __init__(self, name, fn, workers, queue_size):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.busy = 0
+        self.processed = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.total_service = 0.0
+        self.peak_depth = 0
+        self.started_at = time.time()
+
+    def get_stats(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started_at, 1e-9)
+            return {
+                'workers': self.workers,
+                'busy': self.busy,
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'peak_queue_depth': self.peak_depth,
+                'processed': self.processed,
+                'errors': self.errors,
+                'avg_wait_ms': round(self.total_wait / self.processed * 1000, 1) if self.processed else 0.0,
+                'avg_service_ms': round(self.total_service / self.processed * 1000, 1) if self.processed else 0.0,
+                # Share of worker time spent processing since the stage started
+                'utilization': round(self.total_service / (elapsed * self.workers), 3)
+            }
+
+
+class StageExecutor:
+    """Runs jobs through a sequence of stages, each with its own thread pool and bounded queue"""
+
+    def __init__(self, name, stages, put_timeout=5.0):
+        """
+        Initialize stage executor
+
+        Args:
+            name: Thread name prefix
+            stages: List of (stage name, fn, workers, queue size); fn(state)
+                returns the name of the next stage, or None when the job is done
+            put_timeout: Maximum seconds to wait for room in a full stage queue
+        """
+        self.name = name
+        self.put_timeout = put_timeout
+        self.stage_specs = stages
+        self.first_stage = stages[0][0]
+        self._stages = {}
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so every worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._stages = {name: _Stage(name, fn, workers, queue_size)
+                            for name, fn, workers, queue_size in self.stage_specs}
+            for stage in self._stages.values():
+                for i in range(stage.workers):
+                    threading.Thread(target=self._work, args=(stage,), daemon=True,
+                                     name=f"{self.name}-{stage.name}-{i}").start()
+            self._pid = os.getpid()
+
+    def _put(self, stage, job):
+        """Queue job for stage, waiting no longer than put_timeout or the job's deadline"""
+        timeout = self.put_timeout
+        if job.deadline is not None:
+            timeout = job.deadline.clamp(timeout)
+        job.stage = stage.name
+        job.enqueued_at = time.time()
+        try:
+            stage.queue.put(job, timeout=timeout)
+        except queue.Full:
+            raise StageQueueFull(stage.name, stage.queue.maxsize)
+        with stage.lock:
+            stage.peak_depth = max(stage.peak_depth, stage.queue.qsize())
+
+    def _work(self, stage):
+        while True:
+            job = stage.queue.get()
+            started = time.time()
+            with stage.lock:
+                stage.busy += 1
+                stage.total_wait += started - job.enqueued_at
+            next_stage = None
+            try:
+                next_stage = job.context.run(self._call, stage, job)
+            except BaseException as e:
+                job.error = e
+                with stage.lock:
+                    stage.errors += 1
+            finally:
+                with stage.lock:
+                    stage.busy -= 1
+                    stage.processed += 1
+                    stage.total_service += time.time() - started
+
+            if job.error is None and next_stage is not None:
+                try:
+                    # Blocks while the next stage is saturated (backpressure)
+                    self._put(self._stages[next_stage], job)
+                    continue
+                except Exception as e:
+                    job.error = e
+            job.done.set()
+
+    @staticmethod
+    def _call(stage, job):
+        if job.deadline is not None:
+            with job.deadline.activate():
+                return stage.fn(job.state)
+        return stage.fn(job.state)
+
+    def run(self, state, deadline=None, grace=5.0):
+        """
+        Run state through all stages and wait for it (blocking facade).
+        The stages honour the deadline themselves; grace covers the last
+        uninterruptible step (e.g. a classifier forward pass).
+        """
+        self._ensure_started()
+        job = _Job(state, deadline)
+        self._put(self._stages[self.first_stage], job)
+
+        timeout = deadline.remaining() + grace if deadline is not None else None
+        if not job.done.wait(timeout):
+            raise DeadlineExceeded(job.stage, deadline.budget)
+        if isinstance(job.error, (DeadlineExceeded, StageQueueFull)):
+            raise job.error
+        if job.error is not None:
+            raise StageError(job.stage, job.error) from job.error
+        return state
+
+    def get_stats(self):
+        """Per-stage queue depth, utilization and timing"""
+        if self._pid != os.getpid():
+            return {}
+        return {name: stage.get_stats() for name, stage in self._stages.items()}
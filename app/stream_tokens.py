@@ -0,0 +1,81 @@
+"""
+Single-use explanation stream tokens.
+A signed /explain/stream token is valid for a few minutes, and every use
+starts a paid Together AI generation, so each token's nonce may be claimed
+once. Claimed nonces are recorded in a small SQLite table so a token spent
+on one gunicorn worker is refused by all the others.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+
+class SingleUseTokens:
+    """Nonces that have been used, shared by every worker"""
+
+    def __init__(self, path, retention=600):
+        """
+        Initialize the nonce store
+
+        Args:
+            path: SQLite database file shared by the workers
+            retention: Seconds a nonce is remembered (at least the token max age)
+        """
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self._initialized = False
+        self._pruned_at = 0.0
+
+        # Statistics
+        self.claimed = 0
+        self.refused = 0
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across fork()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS used_stream_tokens (
+                        nonce TEXT PRIMARY KEY,
+                        used_at REAL NOT NULL
+                    )
+                """)
+                self._initialized = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def claim(self, nonce):
+        """
+        Mark nonce as used. Returns True the first time, False if it was
+        already used or the store cannot be written (tokens are refused
+        rather than made replayable).
+        """
+        now = time.time()
+        try:
+            conn = self._connection()
+            if now - self._pruned_at > 60:
+                self._pruned_at = now
+                conn.execute('DELETE FROM used_stream_tokens WHERE used_at < ?', (now - self.retention,))
+            conn.execute('INSERT INTO used_stream_tokens (nonce, used_at) VALUES (?, ?)', (nonce, now))
+        except sqlite3.IntegrityError:
+            self.refused += 1
+            return False
+        except sqlite3.Error as e:
+            print(f"✗ Stream token store failed: {e}")
+            self.refused += 1
+            return False
+        self.claimed += 1
+        return True
+
+    def get_stats(self):
+        return {'claimed': self.claimed, 'refused': self.refused}
@@ -0,0 +1,470 @@
+"""
+Per-request tracing.
+SystemPerformance only has three stage durations per request; a trace shows
+where the rest of the time went. Each request gets a request id and a tree
+of spans with wall-clock and CPU time: pipeline stages, waits for the model
+locks and the Together AI limiter, model compute, database statements and
+commits, and template rendering. A sample of the finished traces (plus every
+slow one) is kept in a small SQLite ring buffer shared by all workers, shown
+on the admin dashboard and exported as OpenTelemetry (OTLP/JSON) files.
+
+Spans are only recorded inside a trace, so instrumented code costs a
+context-variable lookup when tracing is off (set TRACING_ENABLED=1 to enable).
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+import contextvars
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ('span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns',
+                 'cpu_ns', 'error', '_cpu_start', '_token')
+
+    def __init__(self, name, parent_id, attributes):
+        # getrandbits is much cheaper than uuid4 and ids only need to be unique within the buffer
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.end_ns = None
+        self.cpu_ns = None
+        self.error = None
+        self._token = None
+        self.start_ns = time.time_ns()
+        self._cpu_start = time.thread_time_ns()
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        # CPU time of the thread that ran the span; waits on locks and I/O are not counted
+        self.cpu_ns = time.thread_time_ns() - self._cpu_start
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self):
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns if self.end_ns is not None else time.time_ns(),
+            'cpu_ns': self.cpu_ns or 0,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class Trace:
+    """Spans of one request"""
+
+    def __init__(self, name, request_id, max_spans):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.name = name
+        self.max_spans = max_spans
+        self.spans = []
+        self.dropped = 0
+        self.root = None
+        self.lock = threading.Lock()
+        # Open render spans; Flask signals start and finish them separately
+        self.render_stack = []
+
+    def add(self, span):
+        # Stage executor and explanation threads add spans concurrently
+        with self.lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return False
+            self.spans.append(span)
+            return True
+
+    def to_dict(self):
+        with self.lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            'trace_id': self.trace_id,
+            'request_id': self.request_id,
+            'name': self.name,
+            'pid': os.getpid(),
+            'start_ns': self.root.start_ns,
+            'duration_ms': round(((self.root.end_ns or time.time_ns()) - self.root.start_ns) / 1e6, 2),
+            'error': self.root.error,
+            'dropped_spans': self.dropped,
+            'spans': spans
+        }
+
+
+def start_span(name, **attributes):
+    """
+    Start a span under the current one and make it current; returns None
+    outside a trace. Pair with end_span in the same thread.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    span = Span(name, parent.span_id if parent else None, attributes)
+    if not trace.add(span):
+        return None
+    span._token = _current_span.set(span)
+    return span
+
+
+def end_span(span, error=None):
+    """Finish a span from start_span and restore its parent as the current span"""
+    if span is None:
+        return
+    span.finish(error)
+    try:
+        _current_span.reset(span._token)
+    except ValueError:
+        # Ended in another context than it was started in
+        pass
+
+
+class span:
+    """
+    Record the with-block as a span of the current trace.
+    A class rather than a generator-based context manager: it is entered on
+    every lock, statement and stage, so the untraced path must be cheap.
+
+    Usage:
+        with span('stage.translation', input_length=len(text)):
+            translate(text)
+    """
+
+    __slots__ = ('name', 'attributes', 'current')
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.current = None
+
+    def __enter__(self):
+        self.current = start_span(self.name, **self.attributes)
+        return self.current
+
+    def __exit__(self, exc_type, exc, traceback):
+        end_span(self.current, exc)
+        return False
+
+
+class TraceBuffer:
+    """The most recent kept traces of all workers, in a SQLite ring buffer"""
+
+    def __init__(self, path, size=500):
+        """
+        Initialize trace buffer
+
+        Args:
+            path: SQLite file shared by the workers
+            size: Traces kept; older ones are dropped as new ones arrive
+        """
+        self.path = path
+        self.size = size
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across fork()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS traces (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        trace_id TEXT UNIQUE NOT NULL,
+                        name TEXT NOT NULL,
+                        started_at REAL NOT NULL,
+                        duration_ms REAL NOT NULL,
+                        error TEXT,
+                        data TEXT NOT NULL
+                    )
+                """)
+                self._initialized = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, trace):
+        """Store a finished trace (dict from Trace.to_dict) and drop the oldest beyond size"""
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO traces (trace_id, name, started_at, duration_ms, error, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (trace['trace_id'], trace['name'], trace['start_ns'] / 1e9, trace['duration_ms'],
+             trace['error'], json.dumps(trace, ensure_ascii=False, default=str))
+        )
+        conn.execute("DELETE FROM traces WHERE seq <= (SELECT MAX(seq) FROM traces) - ?", (self.size,))
+
+    def recent(self, limit=100, min_duration_ms=0):
+        """Summaries of the newest traces, newest first"""
+        rows = self._connection().execute(
+            "SELECT trace_id, name, started_at, duration_ms, error FROM traces "
+            "WHERE duration_ms >= ? ORDER BY seq DESC LIMIT ?", (min_duration_ms, limit)
+        ).fetchall()
+        return [
+            {'trace_id': trace_id, 'name': name, 'started_at': started_at, 'duration_ms': duration_ms, 'error': error}
+            for trace_id, name, started_at, duration_ms, error in rows
+        ]
+
+    def get(self, trace_id):
+        """Full trace dict, or None"""
+        row = self._connection().execute("SELECT data FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        """Every buffered trace, oldest first"""
+        return [json.loads(data) for (data,) in
+                self._connection().execute("SELECT data FROM traces ORDER BY seq").fetchall()]
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM traces").fetchone()[0]
+
+    def clear(self):
+        self._connection().execute("DELETE FROM traces")
+
+
+class Tracer:
+    """Starts request traces and decides which finished traces are kept"""
+
+    def __init__(self, buffer, sample_rate=0.1, slow_threshold=5.0, max_spans=1000):
+        """
+        Initialize tracer
+
+        Args:
+            buffer: TraceBuffer receiving kept traces
+            sample_rate: Share of requests kept
+            slow_threshold: Requests slower than this (seconds) are always kept;
+                every request is traced so that slow ones can be
+            max_spans: Spans recorded per trace, at least 1 (the root span);
+                further spans are counted but dropped
+        """
+        self.buffer = buffer
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        # begin() needs the root span to be recorded
+        self.max_spans = max(1, max_spans)
+        self.enabled = False
+
+        # Statistics
+        self.traced = 0
+        self.kept = 0
+        self.store_errors = 0
+
+    def begin(self, name, request_id=None, **attributes):
+        """Start a trace with its root span in the calling context"""
+        trace = Trace(name, request_id or uuid.uuid4().hex, self.max_spans)
+        trace_token = _current_trace.set(trace)
+        trace.root = start_span(name, **attributes)
+        trace.root.set('request.id', trace.request_id)
+        return trace, trace_token
+
+    def finish(self, trace, trace_token, error=None):
+        """End the root span, keep the trace if sampled or slow, and leave the context clean"""
+        # Spans a failed request left open (e.g. a render interrupted by an error)
+        while trace.render_stack:
+            end_span(trace.render_stack.pop(), error)
+        end_span(trace.root, error)
+        try:
+            _current_trace.reset(trace_token)
+        except ValueError:
+            _current_trace.set(None)
+        _current_span.set(None)
+
+        self.traced += 1
+        duration = (trace.root.end_ns - trace.root.start_ns) / 1e9
+        if duration < self.slow_threshold and random.random() >= self.sample_rate:
+            return False
+        try:
+            self.buffer.add(trace.to_dict())
+            self.kept += 1
+            return True
+        except Exception as e:
+            # Tracing must never fail a request
+            self.store_errors += 1
+            print(f"Trace storage failed: {e}")
+            return False
+
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_threshold': self.slow_threshold,
+            'traced': self.traced,
+            'kept': self.kept,
+            'store_errors': self.store_errors
+        }
+
+
+tracer = Tracer(
+    TraceBuffer(os.getenv('TRACE_DB_PATH', './cache/traces.sqlite3'),
+                size=int(os.getenv('TRACE_BUFFER_SIZE', 500))),
+    sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', 0.1)),
+    slow_threshold=float(os.getenv('TRACE_SLOW_THRESHOLD', 5)),
+    max_spans=int(os.getenv('TRACE_MAX_SPANS', 1000))
+)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # OTLP/JSON encodes 64-bit integers as strings
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(traces, service_name='thai-english-app'):
+    """
+    Convert trace dicts to an OTLP/JSON ExportTraceServiceRequest, which
+    OpenTelemetry collectors and Jaeger/Tempo importers read
+    """
+    spans = []
+    for trace in traces:
+        for span in trace['spans']:
+            attributes = dict(span['attributes'])
+            attributes['cpu_time_ms'] = round(span['cpu_ns'] / 1e6, 3)
+            if span['parent_id'] is None:
+                attributes['process.pid'] = trace['pid']
+            otlp_span = {
+                'traceId': trace['trace_id'],
+                'spanId': span['span_id'],
+                'name': span['name'],
+                # The root span is the server side of the HTTP request
+                'kind': 2 if span['parent_id'] is None else 1,
+                'startTimeUnixNano': str(span['start_ns']),
+                'endTimeUnixNano': str(span['end_ns']),
+                'attributes': _otlp_attributes(attributes),
+                'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1}
+            }
+            if span['parent_id']:
+                otlp_span['parentSpanId'] = span['parent_id']
+            spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': service_name})},
+            'scopeSpans': [{'scope': {'name': 'app.tracing'}, 'spans': spans}]
+        }]
+    }
+
+
+_sqlalchemy_instrumented = False
+
+
+def _instrument_sqlalchemy():
+    """Spans for every statement and commit made through SQLAlchemy (listeners are process-wide)"""
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return
+    _sqlalchemy_instrumented = True
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None and context is not None:
+            context._trace_span = start_span('db.query', **{
+                'db.system': conn.dialect.name,
+                'db.statement': statement[:300]
+            })
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        end_span(getattr(context, '_trace_span', None))
+
+    @event.listens_for(Engine, 'handle_error')
+    def _execute_failed(exception_context):
+        context = exception_context.execution_context
+        end_span(getattr(context, '_trace_span', None), exception_context.original_exception)
+
+    @event.listens_for(Session, 'before_commit')
+    def _before_commit(session):
+        if _current_trace.get() is not None:
+            session.info['_trace_span'] = start_span('db.commit')
+
+    def _commit_done(session, *args):
+        end_span(session.info.pop('_trace_span', None))
+
+    event.listen(Session, 'after_commit', _commit_done)
+    event.listen(Session, 'after_soft_rollback', _commit_done)
+
+
+def init_tracing(app):
+    """
+    Trace each request of app (TRACING_ENABLED=1). Register before the other
+    before_request handlers so their work is part of the trace.
+    """
+    if os.getenv('TRACING_ENABLED', '0') != '1':
+        return
+    from flask import request, g, before_render_template, template_rendered
+
+    tracer.enabled = True
+    _instrument_sqlalchemy()
+
+    @app.before_request
+    def start_request_trace():
+        if request.endpoint == 'static':
+            return
+        request_id = request.headers.get('X-Request-ID', '')[:64] or None
+        g.trace, g.trace_token = tracer.begin(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            request_id=request_id,
+            **{'http.method': request.method, 'http.target': request.path, 'http.endpoint': request.endpoint}
+        )
+
+    @app.after_request
+    def tag_response(response):
+        trace = g.get('trace')
+        if trace is not None:
+            trace.root.set('http.status_code', response.status_code)
+            response.headers['X-Request-ID'] = trace.request_id
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(error=None):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            tracer.finish(trace, g.pop('trace_token'), error)
+
+    def render_started(sender, template, context, **extra):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.render_stack.append(start_span('render', template=template.name))
+
+    def render_finished(sender, template, context, **extra):
+        trace = _current_trace.get()
+        if trace is not None and trace.render_stack:
+            end_span(trace.render_stack.pop())
+
+    # Flask keeps weak references to receivers; the app holds these
+    app.extensions['tracing'] = (render_started, render_finished)
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+    print(f"✓ Request tracing enabled (sample rate {tracer.sample_rate}, "
+          f"slow threshold {tracer.slow_threshold}s)")
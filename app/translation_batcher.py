@@ -0,0 +1,263 @@
+"""
+Micro-batching scheduler for llama.cpp translation.
+Requests arriving within a short window are decoded together as parallel
+sequences of one llama.cpp context, so a single forward pass per step
+serves several users.
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MultiSequenceDecoder:
+    """
+    Greedy decoding of several prompts as separate sequences of one llama.cpp context.
+    The context is created on the translator's already-loaded model, so no
+    extra copy of the weights is made.
+    """
+
+    def __init__(self, llm, max_sequences=4, n_ctx_per_sequence=512):
+        """
+        Initialize decoder
+
+        Args:
+            llm: Loaded llama_cpp.Llama instance whose weights are reused
+            max_sequences: Maximum number of prompts decoded together
+            n_ctx_per_sequence: KV cache cells reserved for each sequence
+        """
+        import numpy as np
+        from llama_cpp import _internals
+
+        self._np = np
+        self._llm = llm
+        self.max_sequences = max_sequences
+        self.n_ctx_per_sequence = n_ctx_per_sequence
+
+        params = type(llm.context_params).from_buffer_copy(llm.context_params)
+        params.n_seq_max = max_sequences
+        params.n_ctx = n_ctx_per_sequence * max_sequences
+
+        self._ctx = _internals.LlamaContext(model=llm._model, params=params, verbose=False)
+        self._n_batch = params.n_batch
+        if max_sequences > self._n_batch:
+            # Every generation step puts one token per active sequence into the batch
+            raise ValueError(f"max_sequences={max_sequences} exceeds n_batch={self._n_batch}")
+        self._batch = _internals.LlamaBatch(n_tokens=self._n_batch, embd=0, n_seq_max=max_sequences, verbose=False)
+        self._n_vocab = llm.n_vocab()
+        self._eos = llm.token_eos()
+
+    def _add_token(self, token, pos, seq_id, logits):
+        """Append one token to the pending batch and return its index"""
+        batch = self._batch.batch
+        i = batch.n_tokens
+        batch.token[i] = token
+        batch.pos[i] = pos
+        batch.n_seq_id[i] = 1
+        batch.seq_id[i][0] = seq_id
+        batch.logits[i] = logits
+        batch.n_tokens += 1
+        return i
+
+    def _argmax(self, batch_index):
+        """Greedy pick from the logits of one batch position"""
+        logits = self._np.ctypeslib.as_array(self._ctx.get_logits_ith(batch_index), shape=(self._n_vocab,))
+        return int(logits.argmax())
+
+    def decode(self, prompts, max_tokens=80, stop=None):
+        """
+        Decode prompts together and return one completion string per prompt
+
+        Args:
+            prompts: List of prompt strings (at most max_sequences)
+            max_tokens: Maximum generated tokens per prompt
+            stop: Stop strings; generation for a sequence ends at the first match
+        """
+        stop = stop or []
+        n = len(prompts)
+        if n > self.max_sequences:
+            raise ValueError(f"Batch of {n} prompts exceeds max_sequences={self.max_sequences}")
+
+        self._ctx.kv_cache_clear()
+
+        prompt_tokens = [self._llm.tokenize(p.encode('utf-8'), add_bos=True, special=True) for p in prompts]
+        positions = [len(tokens) for tokens in prompt_tokens]
+        next_token = [None] * n
+
+        for tokens in prompt_tokens:
+            if len(tokens) + max_tokens > self.n_ctx_per_sequence:
+                raise ValueError(f"Prompt of {len(tokens)} tokens does not fit the per-sequence context")
+
+        # Prefill: pack as many prompts per llama_decode call as n_batch allows.
+        # The batch buffer holds n_batch tokens and _add_token writes to it
+        # unchecked, so longer prompts are fed in chunks of at most n_batch.
+        self._batch.reset()
+        pending = []
+
+        def flush():
+            self._ctx.decode(self._batch)
+            for pending_seq, index in pending:
+                next_token[pending_seq] = self._argmax(index)
+            self._batch.reset()
+            pending.clear()
+
+        for seq_id, tokens in enumerate(prompt_tokens):
+            for start in range(0, len(tokens), self._n_batch):
+                chunk = tokens[start:start + self._n_batch]
+                if self._batch.n_tokens() + len(chunk) > self._n_batch:
+                    flush()
+                for offset, token in enumerate(chunk):
+                    pos = start + offset
+                    index = self._add_token(token, pos, seq_id, pos == len(tokens) - 1)
+            pending.append((seq_id, index))
+
+        if self._batch.n_tokens():
+            flush()
+
+        # Generation: one token for every active sequence per forward pass
+        generated = [[] for _ in range(n)]
+        texts = [''] * n
+        active = list(range(n))
+
+        for _ in range(max_tokens):
+            still_active = []
+            for seq_id in active:
+                token = next_token[seq_id]
+                if token == self._eos:
+                    continue
+
+                generated[seq_id].append(token)
+                text = self._llm.detokenize(generated[seq_id]).decode('utf-8', errors='ignore')
+                stop_positions = [text.find(s) for s in stop if s in text]
+                if stop_positions:
+                    texts[seq_id] = text[:min(stop_positions)]
+                    continue
+
+                texts[seq_id] = text
+                still_active.append(seq_id)
+
+            active = still_active
+            if not active:
+                break
+
+            self._batch.reset()
+            indices = {}
+            for seq_id in active:
+                indices[seq_id] = self._add_token(next_token[seq_id], positions[seq_id], seq_id, True)
+                positions[seq_id] += 1
+            self._ctx.decode(self._batch)
+            for seq_id in active:
+                next_token[seq_id] = self._argmax(indices[seq_id])
+
+        return [text.strip() for text in texts]
+
+
+class TranslationBatcher:
+    """
+    Collects translation requests that arrive within a short window and hands
+    them to a batch decode function on a single scheduler thread.
+    Callers receive per-request futures, so the public interface stays synchronous.
+    """
+
+    def __init__(self, decode_batch, max_batch_size=4, max_wait_ms=25):
+        """
+        Initialize batcher
+
+        Args:
+            decode_batch: Callable taking a list of Thai texts and returning a
+                list of translations (None for items that failed)
+            max_batch_size: Maximum number of requests decoded together
+            max_wait_ms: How long the first request in a batch waits for company
+        """
+        self.decode_batch = decode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.batches = 0
+        self.requests = 0
+        self.max_batch_seen = 0
+        self.total_queue_wait = 0.0
+
+        print(f"✓ Translation batcher initialized: max {max_batch_size} per batch, {max_wait_ms}ms window")
+
+    def _ensure_thread(self):
+        """Start the scheduler thread (again after fork, since threads do not survive it)"""
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive() or self._thread_pid != os.getpid():
+                if self._thread_pid != os.getpid():
+                    # Requests queued in the parent process belong to the parent
+                    self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='translation-batcher', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, thai_text):
+        """Queue a translation request and return a Future for its result"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((thai_text, future, time.time()))
+        return future
+
+    def translate(self, thai_text, timeout=None):
+        """Translate synchronously through the batch scheduler"""
+        return self.submit(thai_text).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        window_end = time.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = window_end - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Scheduler loop"""
+        while True:
+            batch = self._collect_batch()
+            started = time.time()
+
+            with self.lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.total_queue_wait += sum(started - queued_at for _, _, queued_at in batch)
+
+            try:
+                results = self.decode_batch([thai_text for thai_text, _, _ in batch])
+            except Exception as e:
+                print(f"Batched translation failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def get_stats(self):
+        """Get batching statistics"""
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+                'max_batch_size_seen': self.max_batch_seen,
+                'avg_queue_wait_ms': round(self.total_queue_wait / self.requests * 1000, 1) if self.requests else 0.0,
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
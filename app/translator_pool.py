@@ -0,0 +1,153 @@
+"""
+Pool of llama.cpp translation contexts.
+All contexts share the weights of one loaded GGUF model; each request checks a
+context out, so up to N translations run in parallel on disjoint thread sets.
+"""
+
+import os
+import copy
+import time
+import queue
+import ctypes
+import threading
+import contextlib
+
+from .tracing import span
+
+
+def default_pool_layout(pool_size=None, threads_per_context=None):
+    """
+    Split the host's cores between translator contexts.
+
+    Returns:
+        tuple: (pool_size, threads_per_context)
+    """
+    cores = os.cpu_count() or 4
+    if pool_size is None:
+        pool_size = max(1, cores // 4)
+    if threads_per_context is None:
+        threads_per_context = max(1, cores // pool_size)
+    return pool_size, threads_per_context
+
+
+def clone_llama_context(base, n_threads):
+    """
+    Create a Llama object with its own context but the same loaded model as base.
+    Only the KV cache and scratch buffers are allocated; the weights are shared.
+    """
+    import numpy as np
+    from llama_cpp import _internals
+
+    params = type(base.context_params).from_buffer_copy(base.context_params)
+    params.n_threads = n_threads
+    params.n_threads_batch = n_threads
+
+    clone = copy.copy(base)
+    # The clone owns its context; the model stays owned by base
+    clone._stack = contextlib.ExitStack()
+    clone.context_params = params
+    clone._ctx = clone._stack.enter_context(contextlib.closing(
+        _internals.LlamaContext(model=base._model, params=params, verbose=False)
+    ))
+    clone._batch = clone._stack.enter_context(contextlib.closing(
+        _internals.LlamaBatch(n_tokens=base.n_batch, embd=0, n_seq_max=params.n_ctx, verbose=False)
+    ))
+    clone._candidates = _internals.LlamaTokenDataArray(n_vocab=base.n_vocab())
+    clone._sampler = None
+    clone._mirostat_mu = ctypes.c_float(2.0 * 5.0)
+    clone.cache = None
+    clone.n_threads = n_threads
+    clone.n_threads_batch = n_threads
+    clone.n_tokens = 0
+    clone._requires_eval = True
+    clone.input_ids = np.ndarray(base.input_ids.shape, dtype=np.intc)
+    clone.scores = np.ndarray(base.scores.shape, dtype=np.single)
+    return clone
+
+
+class TranslatorPool:
+    """Thread-safe pool of llama.cpp contexts with checkout wait statistics"""
+
+    def __init__(self, base_model, size, threads_per_context, model_loader=None):
+        """
+        Initialize translator pool
+
+        Args:
+            base_model: Loaded llama_cpp.Llama; it becomes the first pooled context
+            size: Number of contexts in the pool
+            threads_per_context: llama.cpp threads for each context
+            model_loader: Fallback callable(n_threads) returning a new Llama,
+                used if contexts cannot be cloned from base_model
+        """
+        self.size = size
+        self.threads_per_context = threads_per_context
+        self._available = queue.Queue()
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.checkouts = 0
+        self.waited_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.in_use = 0
+
+        base_model.n_threads = threads_per_context
+        base_model.n_threads_batch = threads_per_context
+        base_model._ctx.set_n_threads(threads_per_context, threads_per_context)
+        self._available.put(base_model)
+
+        for _ in range(size - 1):
+            try:
+                context = clone_llama_context(base_model, threads_per_context)
+            except Exception as e:
+                if model_loader is None:
+                    raise
+                # Separate Llama on the same mmap'd file; pages stay shared via the page cache
+                print(f"✗ Could not share loaded weights ({e}), opening another mmap of the GGUF file")
+                context = model_loader(threads_per_context)
+            self._available.put(context)
+
+        print(f"✓ Translator pool initialized: {size} contexts x {threads_per_context} threads")
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        """Borrow a context for the duration of a with-block"""
+        start = time.time()
+        # Traced as the translator lock: the pool's equivalent of waiting for the model
+        with span('lock.translator', pool_size=self.size):
+            try:
+                context = self._available.get_nowait()
+                waited = False
+            except queue.Empty:
+                context = self._available.get(timeout=timeout)
+                waited = True
+        wait = time.time() - start
+
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if waited:
+                self.waited_checkouts += 1
+
+        try:
+            yield context
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self._available.put(context)
+
+    def get_stats(self):
+        """Get pool size and checkout wait statistics"""
+        with self.lock:
+            return {
+                'size': self.size,
+                'threads_per_context': self.threads_per_context,
+                'in_use': self.in_use,
+                'available': self.size - self.in_use,
+                'checkouts': self.checkouts,
+                'waited_checkouts': self.waited_checkouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 1) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 1)
+            }
@@ -0,0 +1,57 @@
+"""
+Tuned llama.cpp settings for the translator.
+tune_translator.py benchmarks candidate configurations on the host and writes
+the winner to a profile file; TyphoonTranslator reads it at startup.
+"""
+
+import os
+import json
+
+
+DEFAULT_PROFILE_PATH = './models/translator_profile.json'
+
+# Settings used when no profile has been written
+DEFAULT_LLAMA_SETTINGS = {
+    'model_path': './models/typhoon-translate-4b-q4_k_m.gguf',
+    'n_ctx': 2048,
+    'n_threads': 4,
+    'n_batch': 512,
+    'use_mlock': True
+}
+
+
+def load_translator_profile(path=None):
+    """
+    Return llama.cpp settings for the translator, merged over the defaults.
+    Falls back to the defaults if the profile is missing, unreadable, or
+    points at a model file that no longer exists.
+    """
+    path = path or os.getenv('TRANSLATOR_PROFILE', DEFAULT_PROFILE_PATH)
+    settings = dict(DEFAULT_LLAMA_SETTINGS)
+
+    if not os.path.exists(path):
+        return settings
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"✗ Could not read translator profile {path}: {e}")
+        return settings
+
+    model_path = profile.get('model_path')
+    if model_path and not os.path.exists(model_path):
+        print(f"✗ Translator profile model {model_path} not found, using default settings")
+        return settings
+
+    for key in DEFAULT_LLAMA_SETTINGS:
+        if key in profile:
+            settings[key] = profile[key]
+
+    host = profile.get('host', {})
+    if host.get('cpu_count') and host['cpu_count'] != os.cpu_count():
+        print(f"  Translator profile was tuned on a host with {host['cpu_count']} cores "
+              f"(this host has {os.cpu_count()}); consider re-running tune_translator.py")
+
+    print(f"✓ Translator profile loaded from {path}")
+    return settings
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Batch-process a worksheet of Thai sentences through the full pipeline.
+Reads a JSONL (one {"id": ..., "thai_text": ...} per line), CSV (columns
+id, thai_text) or plain text file (one sentence per line) and appends one
+JSON result per sentence to the output file as each chunk finishes.
+Rerunning the same command after an interruption skips the sentences
+already written.
+
+Usage:
+    python batch_process.py worksheet.jsonl [--output results.jsonl] [--chunk-size 32]
+                            [--no-explanation] [--restart]
+"""
+
+import os
+import sys
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a file of Thai sentences through translation, classification and explanation')
+    parser.add_argument('input', help='JSONL, CSV or text file of Thai sentences')
+    parser.add_argument('--output', help='JSONL results file (default: <input>.results.jsonl)')
+    parser.add_argument('--chunk-size', type=int, default=32, help='Sentences classified and written together')
+    parser.add_argument('--translation-concurrency', type=int, default=4, help='Translations submitted at once')
+    parser.add_argument('--explanation-concurrency', type=int, default=4, help='Explanations requested at once')
+    parser.add_argument('--no-explanation', action='store_true', help='Only translate and classify')
+    parser.add_argument('--no-validation', action='store_true', help='Skip the web form input checks')
+    parser.add_argument('--restart', action='store_true', help='Overwrite the output instead of resuming')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"✗ Input file not found: {args.input}")
+        sys.exit(1)
+    output = args.output or os.path.splitext(args.input)[0] + '.results.jsonl'
+
+    from app.pipeline import ModelManager
+    from app.validation import InputValidator
+    from app.batch import BatchProcessor, read_batch_input, input_validator_check
+
+    validate = None
+    if not args.no_validation:
+        validate = input_validator_check(InputValidator(max_tokens=100, min_thai_percentage=0.8,
+                                                        enable_profanity_filter=True))
+
+    processor = BatchProcessor(
+        ModelManager(),
+        chunk_size=args.chunk_size,
+        translation_concurrency=args.translation_concurrency,
+        explanation_concurrency=args.explanation_concurrency,
+        include_explanation=not args.no_explanation,
+        validate=validate
+    )
+
+    def on_progress(stats):
+        print(f"  {stats['processed']} processed, {stats['failed']} failed "
+              f"({stats['sentences_per_second']} sentences/s)", flush=True)
+
+    print(f"Processing {args.input} -> {output}")
+    try:
+        stats = processor.run(read_batch_input(args.input), output, resume=not args.restart,
+                              on_progress=on_progress)
+    except KeyboardInterrupt:
+        print(f"✗ Interrupted; rerun the same command to resume from {output}")
+        sys.exit(130)
+    except ValueError as e:
+        # Malformed input; the results written so far are kept
+        print(f"✗ Could not read {args.input}: {e}")
+        sys.exit(1)
+
+    if stats['skipped']:
+        print(f"  {stats['skipped']} sentences already in {output} were skipped")
+    print(f"✓ {stats['processed']} sentences in {stats['elapsed']}s "
+          f"({stats['sentences_per_second']} sentences/s), {stats['failed']} failed")
+
+
+if __name__ == '__main__':
+    main()
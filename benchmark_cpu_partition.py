@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark for CPU partitioning between the translator and the classifier.
+Starts several worker processes at once, as gunicorn does, each loading the
+Typhoon translator and the tense classifier and serving translate + classify
+requests from concurrent threads. Runs once with every runtime sizing its
+own thread pool and once with CPU_PARTITIONING=1 (optionally pinned), and
+reports request latency percentiles for both.
+
+Usage:
+    python benchmark_cpu_partition.py [--workers 2] [--concurrency 2] [--rounds 3] [--pin]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import statistics
+
+TEST_SENTENCES = [
+    "ฉันกินข้าวเช้าทุกวัน",
+    "เมื่อวานฉันไปตลาด",
+    "พรุ่งนี้ฉันจะไปเรียน",
+    "ฉันกำลังทำงาน",
+    "ฉันได้อ่านหนังสือแล้ว",
+    "เขาเรียนภาษาอังกฤษมาห้าปีแล้ว",
+    "ตอนที่ฝนตก ฉันกำลังเดินกลับบ้าน",
+    "ก่อนที่เธอจะมาถึง พวกเราได้กินข้าวเสร็จแล้ว",
+    "ถ้าพรุ่งนี้ฝนไม่ตก เราจะไปทะเลกัน",
+    "แม่ของฉันทำอาหารอร่อยมาก"
+]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_worker(concurrency, rounds):
+    """Load both models, wait for the start signal, then serve requests and print a JSON result line"""
+    # Every request must reach the models, not a cache
+    os.environ['TRANSLATION_CACHE_ENABLED'] = '0'
+    os.environ['CLASSIFICATION_CACHE_ENABLED'] = '0'
+
+    # Same order as gunicorn's post_fork: restrict the worker before loading models
+    from app.cpu_partition import apply_worker_affinity
+    apply_worker_affinity()
+
+    from app.pipeline import TyphoonTranslator, TenseClassifier
+
+    translator = TyphoonTranslator()
+    classifier = TenseClassifier()
+    if translator.model is None or classifier.tokenizer is None:
+        print(json.dumps({'error': 'models not loaded'}))
+        return
+
+    # Warm-up outside the measured window
+    classifier.classify(translator.translate(TEST_SENTENCES[0]))
+
+    print('READY', flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def serve(offset):
+        for i in range(rounds * len(TEST_SENTENCES)):
+            thai_text = TEST_SENTENCES[(i + offset) % len(TEST_SENTENCES)]
+            start = time.perf_counter()
+            classifier.classify(translator.translate(thai_text))
+            with latencies_lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=serve, args=(n * 3,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    partition = translator.cpu_partition
+    print(json.dumps({
+        'latencies_ms': latencies,
+        'partition': partition.to_dict() if partition else None
+    }))
+
+
+def run_mode(label, env_overrides, args):
+    """Start all workers, release them together and collect their latencies"""
+    workers = []
+    for index in range(args.workers):
+        env = dict(os.environ, WORKER_INDEX=str(index), WORKER_COUNT=str(args.workers), **env_overrides)
+        command = [sys.executable, os.path.abspath(__file__), '--worker',
+                   '--concurrency', str(args.concurrency), '--rounds', str(args.rounds)]
+        workers.append(subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True))
+
+    # Model loading is not measured: wait until every worker is ready
+    outputs = []
+    for worker in workers:
+        lines = []
+        for line in worker.stdout:
+            lines.append(line)
+            if line.strip() == 'READY' or line.startswith('{'):
+                break
+        outputs.append(lines)
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.stdin.write('GO\n')
+        worker.stdin.close()
+
+    latencies = []
+    partitions = []
+    for worker, lines in zip(workers, outputs):
+        output = ''.join(lines) + worker.stdout.read()
+        worker.wait()
+        result = None
+        for line in reversed(output.strip().splitlines()):
+            if line.startswith('{'):
+                result = json.loads(line)
+                break
+        if result is None or 'error' in result:
+            print(f"  ✗ {label}: worker failed ({result['error'] if result else 'no result reported'})")
+            return None
+        latencies.extend(result['latencies_ms'])
+        partitions.append(result['partition'])
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / wall,
+        'mean': statistics.mean(latencies),
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'partitions': partitions
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CPU partitioning under concurrent load')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes, as in gunicorn_config.py')
+    parser.add_argument('--concurrency', type=int, default=2, help='Concurrent requests per worker')
+    parser.add_argument('--rounds', type=int, default=3, help='Passes over the test sentences per thread')
+    parser.add_argument('--pin', action='store_true', help='Also pin threads to their cores (CPU_AFFINITY=1)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.concurrency, args.rounds)
+        return
+
+    modes = [
+        ('unpartitioned', {'CPU_PARTITIONING': '0'}),
+        ('partitioned' + (' + pinned' if args.pin else ''),
+         {'CPU_PARTITIONING': '1', 'CPU_AFFINITY': '1' if args.pin else '0'})
+    ]
+
+    print(f"{os.cpu_count()} cores, {args.workers} workers x {args.concurrency} concurrent requests, "
+          f"{args.rounds * len(TEST_SENTENCES)} requests per thread\n")
+
+    results = {}
+    for label, env_overrides in modes:
+        print(f"Running {label}...")
+        results[label] = run_mode(label, env_overrides, args)
+
+    print(f"\n{'':<26} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8}")
+    for label, result in results.items():
+        if result:
+            print(f"{label:<26} {result['mean']:>9.1f} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                  f"{result['p99']:>9.1f} {result['throughput']:>8.2f}")
+
+    partitioned = results[modes[1][0]]
+    if partitioned:
+        print("\nCore sets per worker:")
+        for index, partition in enumerate(partitioned['partitions']):
+            print(f"  worker {index}: translator {partition['translator_cores']}, "
+                  f"classifier {partition['classifier_cores']}")
+
+    baseline = results[modes[0][0]]
+    if baseline and partitioned:
+        change = (partitioned['p95'] - baseline['p95']) / baseline['p95'] * 100
+        print(f"\np95 latency {change:+.1f}% with partitioning")
+
+
+if __name__ == '__main__':
+    main()
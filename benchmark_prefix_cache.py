@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark for reuse of the fixed translation prompt prefix.
+llama-cpp-python keeps the evaluated tokens of a context and, for each new
+prompt, only evaluates what follows the longest prefix it shares with them,
+so the translator's fixed prompt prefix is evaluated once per context and
+reused by every later request. This measures per-request time to the first
+generated token with that built-in reuse (the translator's normal path)
+against resetting the context before every request, and reports the prompt
+tokens evaluated per request in each case.
+
+Usage:
+    python benchmark_prefix_cache.py [--model PATH] [--rounds N] [--threads N]
+"""
+
+import os
+import time
+import argparse
+import statistics
+
+from llama_cpp import Llama
+
+from app.pipeline import TyphoonTranslator
+
+TEST_INPUTS = [
+    "ฉันกินข้าวเช้าทุกวัน",
+    "เมื่อวานฉันไปตลาด",
+    "พรุ่งนี้ฉันจะไปเรียน",
+    "ฉันกำลังทำงาน",
+    "ฉันได้อ่านหนังสือแล้ว",
+    "เขาเรียนภาษาอังกฤษมาห้าปีแล้ว",
+    "ตอนที่ฝนตก ฉันกำลังเดินกลับบ้าน",
+    "ก่อนที่เธอจะมาถึง พวกเราได้กินข้าวเสร็จแล้ว"
+]
+
+
+def build_prompt(thai_text):
+    # Same format as TyphoonTranslator._build_prompt
+    return f"{TyphoonTranslator.PROMPT_PREFIX}{thai_text}\nEnglish:"
+
+
+def first_token(llm, prompt, reset):
+    """
+    Generate one token as the translator does; returns (seconds, prompt tokens evaluated).
+    The evaluated count mirrors llama-cpp-python's longest-prefix match in generate().
+    """
+    if reset:
+        llm.reset()
+    tokens = llm.tokenize(prompt.encode('utf-8'), add_bos=True, special=True)
+    matched = 0
+    for cached, token in zip(llm.input_ids[:llm.n_tokens], tokens[:-1]):
+        if cached != token:
+            break
+        matched += 1
+
+    start = time.perf_counter()
+    llm(prompt, max_tokens=1, temperature=0.0, echo=False)
+    return time.perf_counter() - start, len(tokens) - matched
+
+
+def summarize(label, samples):
+    times = sorted(seconds * 1000 for seconds, _ in samples)
+    tokens = statistics.mean(n for _, n in samples)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<28} mean {statistics.mean(times):7.1f} ms   p95 {p95:7.1f} ms   "
+          f"{tokens:5.1f} prompt tokens evaluated per request")
+    return statistics.mean(times), tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reuse of the translation prompt prefix')
+    parser.add_argument('--model', default='./models/typhoon-translate-4b-q4_k_m.gguf')
+    parser.add_argument('--rounds', type=int, default=5, help='Passes over the test sentences')
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"✗ GGUF model not found at {args.model}")
+        return
+
+    llm = Llama(model_path=args.model, verbose=False, n_ctx=2048, n_threads=args.threads,
+                n_batch=512, n_gpu_layers=0, use_mmap=True)
+    prefix_tokens = len(llm.tokenize(TyphoonTranslator.PROMPT_PREFIX.encode('utf-8'), add_bos=True, special=True))
+
+    # Warm up the weights
+    first_token(llm, build_prompt(TEST_INPUTS[0]), reset=True)
+
+    cold, reused = [], []
+    for _ in range(args.rounds):
+        for index, thai_text in enumerate(TEST_INPUTS):
+            cold.append(first_token(llm, build_prompt(thai_text), reset=True))
+
+            # Requests as the translator serves them: the context still holds
+            # the previous request, so only the part after the prefix is evaluated
+            first_token(llm, build_prompt(TEST_INPUTS[index - 1]), reset=False)
+            reused.append(first_token(llm, build_prompt(thai_text), reset=False))
+
+    print(f"Time to first token over {len(cold)} requests ({args.threads} threads), "
+          f"prompt prefix of {prefix_tokens} tokens")
+    cold_ms, cold_tokens = summarize('context reset per request', cold)
+    reused_ms, reused_tokens = summarize('built-in prefix reuse', reused)
+    print(f"Saved per request: {cold_ms - reused_ms:.1f} ms ({(1 - reused_ms / cold_ms) * 100:.0f}%), "
+          f"{cold_tokens - reused_tokens:.1f} prompt tokens not re-evaluated")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Export the XLM-R tense classifier to ONNX and check it against PyTorch.
+Writes model.onnx (encoder + coarse/fine heads, dynamic batch and sequence
+axes) into the classifier model directory, then compares logits and
+predictions with the eager model on a labeled set and reports latency.
+A graph that fails the parity check is removed, so CLASSIFIER_BACKEND=onnx
+never serves it.
+
+Usage:
+    python export_classifier_onnx.py [--labeled data/classifier_eval.csv] [--atol 1e-3]
+"""
+
+import os
+import csv
+import copy
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# Export from the fp32 PyTorch model regardless of the configured backend
+os.environ['CLASSIFIER_BACKEND'] = 'fp32'
+# Every comparison and latency run must reach the model, not the result cache
+os.environ['CLASSIFICATION_CACHE_ENABLED'] = '0'
+
+from app.pipeline import TenseClassifier
+from app.classifier_onnx import ONNX_MODEL_NAME, export_onnx, create_session, load_tokenizer, pad_batch
+
+
+def load_sentences(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['sentence'] for row in csv.DictReader(f) if row.get('sentence')]
+
+
+def measure_latency(classifier, sentences, runs):
+    """Per-sentence classify() latency in ms (mean, p95) and classify_batch() throughput"""
+    classifier.classify(sentences[0])  # warm-up
+    latencies = []
+    for _ in range(runs):
+        for sentence in sentences:
+            start = time.perf_counter()
+            classifier.classify(sentence)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        classifier.classify_batch(sentences)
+    throughput = len(sentences) * runs / (time.perf_counter() - start)
+
+    return statistics.mean(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], throughput
+
+
+def measure_startup(backend):
+    """Seconds for a fresh interpreter to import the pipeline and load the classifier"""
+    code = (
+        "import time; start = time.perf_counter()\n"
+        "from app.pipeline import TenseClassifier\n"
+        "TenseClassifier()\n"
+        "print(f'STARTUP {time.perf_counter() - start:.3f}')"
+    )
+    env = dict(os.environ, CLASSIFIER_BACKEND=backend)
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    for line in completed.stdout.splitlines():
+        if line.startswith('STARTUP '):
+            return float(line.split()[1])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the tense classifier to ONNX and verify parity')
+    parser.add_argument('--labeled', default='data/classifier_eval.csv', help='CSV with a sentence column')
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--atol', type=float, default=1e-3, help='Maximum absolute logit difference allowed')
+    parser.add_argument('--runs', type=int, default=3, help='Latency passes over the sentence set')
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.labeled)
+
+    eager = TenseClassifier()
+    if eager.model is None:
+        print("✗ PyTorch classifier could not be loaded; nothing to export")
+        sys.exit(1)
+
+    onnx_path = os.path.join(eager.model_path, ONNX_MODEL_NAME)
+    print(f"Exporting to {onnx_path} (opset {args.opset})")
+    export_onnx(eager.model, onnx_path, opset_version=args.opset)
+    print(f"✓ Exported ({os.path.getsize(onnx_path) / (1024 * 1024):.0f} MB)")
+
+    runtime = copy.copy(eager)
+    runtime.model = None
+    runtime.session = create_session(eager.model_path)
+    runtime.tokenizer = load_tokenizer(eager.model_path, eager.max_length)
+    runtime.backend = 'onnx'
+
+    # Parity on identical padded batches, including a padded bucket of mixed lengths
+    max_diff = 0.0
+    for start in range(0, len(sentences), eager.batch_size):
+        batch = sentences[start:start + eager.batch_size]
+        id_lists = eager._encode(batch)
+        if runtime._encode(batch) != [list(ids) for ids in id_lists]:
+            print("✗ tokenizer.json and the Transformers tokenizer disagree")
+            os.remove(onnx_path)
+            sys.exit(1)
+        input_ids, attention_mask = pad_batch(id_lists, eager.pad_token_id)
+        for expected, actual in zip(eager._forward(input_ids, attention_mask),
+                                    runtime._forward(input_ids, attention_mask)):
+            max_diff = max(max_diff, float(abs(expected - actual).max()))
+
+    eager_results = eager.classify_batch(sentences)
+    onnx_results = runtime.classify_batch(sentences)
+    agreement = sum(a['fine_code'] == b['fine_code'] and a['coarse_label'] == b['coarse_label']
+                    for a, b in zip(eager_results, onnx_results)) / len(sentences)
+
+    print(f"\nParity on {len(sentences)} sentences: max |logit diff| {max_diff:.2e}, "
+          f"prediction agreement {agreement:.3f}")
+
+    eager_mean, eager_p95, eager_tput = measure_latency(eager, sentences, args.runs)
+    onnx_mean, onnx_p95, onnx_tput = measure_latency(runtime, sentences, args.runs)
+    eager_startup = measure_startup('fp32')
+    onnx_startup = measure_startup('onnx')
+
+    print(f"\n{'':<26} {'PyTorch':>10} {'ONNX RT':>10}")
+    print(f"{'classify mean (ms)':<26} {eager_mean:>10.1f} {onnx_mean:>10.1f}")
+    print(f"{'classify p95 (ms)':<26} {eager_p95:>10.1f} {onnx_p95:>10.1f}")
+    print(f"{'classify_batch (sent/s)':<26} {eager_tput:>10.1f} {onnx_tput:>10.1f}")
+    if eager_startup is not None and onnx_startup is not None:
+        print(f"{'import + load (s)':<26} {eager_startup:>10.2f} {onnx_startup:>10.2f}")
+
+    if max_diff > args.atol or agreement < 1.0:
+        os.remove(onnx_path)
+        print(f"\n✗ Parity check failed (atol {args.atol}); removed {onnx_path}")
+        sys.exit(1)
+
+    print(f"\n✓ Parity check passed. Set CLASSIFIER_BACKEND=onnx to serve {onnx_path}.")
+
+
+if __name__ == '__main__':
+    main()
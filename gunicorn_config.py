@@ -2,13 +2,18 @@
 Gunicorn configuration for Thai-English Grammar Learning Tool
 """
 
+import os
+
 # Server socket
 bind = "0.0.0.0:5000"
 backlog = 2048
 
 # Worker processes - Optimized for heavy ML models
 workers = 2  # Reduced from 4 - heavy models need more memory per worker
-worker_class = "sync"
+# GUNICORN_THREADS > 1 serves several requests per worker on threads, so they
+# share the worker's models (see PIPELINE_EXECUTOR in app/pipeline.py)
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+worker_class = "gthread" if threads > 1 else "sync"
 worker_connections = 1000
 timeout = 300  # Increased from 30 - ML inference can be slow
 keepalive = 2
@@ -17,8 +22,45 @@ keepalive = 2
 max_requests = 0  # Reduced from 1000 - prevents memory accumulation
 max_requests_jitter = 10  # Reduced proportionally
 
-# Load application code before the worker processes are forked
-preload_app = False
+# Load application code before the worker processes are forked.
+# With PRELOAD_MODELS=1 the models are loaded once in the master and the
+# workers share the weights copy-on-write (classifier weights are mmap'd, so
+# the pages stay shared); post_fork rebuilds per-process runtime state.
+# Check the savings with `python report_worker_memory.py`.
+preload_app = os.getenv('PRELOAD_MODELS', '0') == '1'
+
+# Optional model-server mode: set MODEL_SERVER_SOCKET and run
+# `python -m app.model_server` (see thai-english-models.service) so that
+# workers share one copy of the models instead of loading their own.
+# Worker count is then bounded by CPU rather than model memory.
+
+# Optional CPU partitioning: with CPU_PARTITIONING=1 each worker gets its own
+# slice of cores, split between the translator (llama.cpp) and the classifier
+# (torch / ONNX Runtime); CPU_AFFINITY=1 also pins threads to those cores.
+# See app/cpu_partition.py. The hooks below give every worker a stable index.
+def pre_fork(server, worker):
+    used = {getattr(w, 'cpu_index', None) for w in server.WORKERS.values()}
+    worker.cpu_index = min(i for i in range(len(used) + 1) if i not in used)
+
+
+def post_fork(server, worker):
+    os.environ['WORKER_INDEX'] = str(worker.cpu_index)
+    os.environ['WORKER_COUNT'] = str(server.num_workers)
+
+    # Runs in the worker's only thread before any model loads, so every
+    # thread the worker starts inherits its core slice (CPU_AFFINITY=1)
+    from app.cpu_partition import apply_worker_affinity
+    apply_worker_affinity()
+
+    if preload_app:
+        # Connections, locks, thread pools and llama.cpp contexts created in
+        # the master must not be shared with the workers
+        from app.models import db
+        from app.routes import model_manager
+        with server.app.wsgi().app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        model_manager.reinit_after_fork()
 
 # Logging - Enhanced for production monitoring
 loglevel = 'info'
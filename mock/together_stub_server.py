@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Together AI chat-completions API.
+Speaks the protocol the `together` client uses (/v1/chat/completions, plain
+and streamed as Server-Sent Events) and answers with explanations in the
+section format GrammarExplainer and FragmentHandler parse. Latency, token
+rate, error rate and timeouts are set per run, so the explanation stage can
+be load-tested offline without spending API credits.
+
+Usage:
+    python mock/together_stub_server.py [--port 8085] [--latency 0.8] [--tokens-per-second 40]
+                                        [--error-rate 0.02] [--timeout-rate 0.01]
+
+Then start the app with TOGETHER_BASE_URL=http://127.0.0.1:8085/v1. The
+settings can also be changed while running:
+    curl -X POST localhost:8085/_stub/config -d '{"latency": 2.0, "error_rate": 0.1}'
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+EXPLANATION_TEMPLATE = """**1) วิเคราะห์ Tense ที่ใช้**
+
+ประโยคนี้ใช้ **Past Simple Tense** เพื่อแสดงการกระทำที่เกิดขึ้นและจบลงแล้วในอดีต
+
+**โครงสร้าง:** Subject + V2
+
+**ตัวอย่าง:** I went to the market yesterday.
+
+**2) คำศัพท์ที่น่าสนใจ**
+
+คำว่า **"yesterday"** เป็นคำสัญญาณบอกเวลาในอดีต จึงต้องใช้กริยาช่องที่ 2
+
+**3) ข้อผิดพลาดที่พบบ่อย**
+
+ผู้เรียนไทยมักใช้กริยาช่องที่ 1 แทนช่องที่ 2 เพราะภาษาไทยไม่มีการผันกริยาตามเวลา
+
+**วิธีจำ:** เห็นคำบอกเวลาในอดีต ให้เปลี่ยนกริยาเป็นช่องที่ 2 ทันที"""
+
+FRAGMENT_TEMPLATE = """**1) เหตุผลที่ไม่สามารถวิเคราะห์ได้**
+
+ข้อความนี้ไม่มีประธานหรือกริยาแท้ จึงยังไม่ใช่ประโยคสมบูรณ์
+
+**2) ความหมายและการใช้งาน**
+
+วลีนี้ใช้เป็นส่วนหนึ่งของประโยค เช่น เป็นกรรมหรือส่วนขยาย
+
+**3) วิธีสร้างประโยคสมบูรณ์**
+
+เพิ่มประธานและกริยา เช่น **I like** + วลีนี้"""
+
+
+class StubSettings:
+    """Behaviour of the stub, shared by all request threads"""
+
+    FIELDS = ('latency', 'latency_jitter', 'tokens_per_second', 'error_rate', 'error_status',
+              'timeout_rate', 'timeout_seconds')
+
+    def __init__(self, latency, latency_jitter, tokens_per_second, error_rate, error_status,
+                 timeout_rate, timeout_seconds):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.active = 0
+        self.peak_active = 0
+
+    def update(self, values):
+        with self.lock:
+            for field in self.FIELDS:
+                if field in values:
+                    setattr(self, field, type(getattr(self, field))(values[field]))
+
+    def to_dict(self):
+        with self.lock:
+            data = {field: getattr(self, field) for field in self.FIELDS}
+            data.update(requests=self.requests, streamed=self.streamed, errors=self.errors,
+                        timeouts=self.timeouts, active=self.active, peak_active=self.peak_active)
+            return data
+
+
+def split_tokens(text, chars_per_token=3):
+    """Rough token pieces (Thai has no spaces, so split by characters)"""
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+def completion_text(messages):
+    """Pick the response template matching the prompt"""
+    prompt = ' '.join(str(message.get('content', '')) for message in messages)
+    if 'เหตุผลที่ไม่สามารถวิเคราะห์ได้' in prompt:
+        return FRAGMENT_TEMPLATE
+    return EXPLANATION_TEMPLATE
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        settings = self.server.settings
+        if self.path.rstrip('/') == '/_stub/config':
+            self._send_json(200, settings.to_dict())
+        elif self.path.rstrip('/') == '/v1/models':
+            self._send_json(200, [{'id': 'scb10x/scb10x-typhoon-2-1-gemma3-12b', 'object': 'model', 'type': 'chat'}])
+        else:
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+    def do_POST(self):
+        settings = self.server.settings
+        if self.path.rstrip('/') == '/_stub/config':
+            settings.update(self._read_json())
+            self._send_json(200, settings.to_dict())
+            return
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+
+        request = self._read_json()
+        with settings.lock:
+            settings.requests += 1
+            settings.active += 1
+            settings.peak_active = max(settings.peak_active, settings.active)
+            config = {field: getattr(settings, field) for field in settings.FIELDS}
+        try:
+            self._complete(request, config, settings)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up (e.g. its own timeout)
+            pass
+        finally:
+            with settings.lock:
+                settings.active -= 1
+
+    def _complete(self, request, config, settings):
+        roll = random.random()
+        if roll < config['timeout_rate']:
+            with settings.lock:
+                settings.timeouts += 1
+            # Never answer; the client's timeout has to fire
+            time.sleep(config['timeout_seconds'])
+            self.close_connection = True
+            return
+        if roll < config['timeout_rate'] + config['error_rate']:
+            with settings.lock:
+                settings.errors += 1
+            time.sleep(config['latency'])
+            self._send_json(config['error_status'], {
+                'error': {'message': 'Stub server injected error', 'type': 'server_error'}
+            })
+            return
+
+        # Time to first token, then a steady token rate
+        time.sleep(max(0.0, config['latency'] + random.uniform(-1, 1) * config['latency_jitter']))
+        text = completion_text(request.get('messages', []))
+        tokens = split_tokens(text)[:int(request.get('max_tokens') or 600)]
+        interval = 1.0 / config['tokens_per_second'] if config['tokens_per_second'] > 0 else 0.0
+
+        completion_id = f"stub-{uuid.uuid4().hex[:12]}"
+        model = request.get('model', 'stub')
+        usage = {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)}
+
+        if not request.get('stream'):
+            time.sleep(interval * len(tokens))
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            })
+            return
+
+        with settings.lock:
+            settings.streamed += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(delta, finish_reason=None, **extra):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            chunk.update(extra)
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        for i, token in enumerate(tokens):
+            send_chunk({'role': 'assistant', 'content': token} if i == 0 else {'content': token})
+            time.sleep(interval)
+        send_chunk({}, finish_reason='stop', usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Together-compatible chat-completions stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--latency', type=float, default=0.8, help='Seconds before the first token')
+    parser.add_argument('--latency-jitter', type=float, default=0.2, help='Uniform +/- jitter on --latency')
+    parser.add_argument('--tokens-per-second', type=float, default=40.0, help='Generation speed (0 = instant)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected errors')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Fraction of requests never answered')
+    parser.add_argument('--timeout-seconds', type=float, default=120.0, help='How long unanswered requests hang')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.settings = StubSettings(args.latency, args.latency_jitter, args.tokens_per_second, args.error_rate,
+                                   args.error_status, args.timeout_rate, args.timeout_seconds)
+    print(f"✓ Together stub listening on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency}s, {args.tokens_per_second} tok/s, errors {args.error_rate:.0%}, "
+          f"timeouts {args.timeout_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down Together stub")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory report for the running gunicorn server.
+Reads the master pid from the pidfile in gunicorn_config.py and prints the
+resident memory of the master and each worker, split into unique pages and
+pages shared with other processes. The PSS total is the physical memory the
+server actually uses; compare it with the RSS total to see how much the
+shared weights save (PRELOAD_MODELS=1, mmap'd classifier weights).
+
+Usage:
+    python report_worker_memory.py [--pidfile /tmp/gunicorn.pid]
+"""
+
+import glob
+import argparse
+
+from app.shared_weights import memory_breakdown
+
+
+def child_pids(pid):
+    """Direct children of pid, from /proc/<pid>/task/*/children"""
+    children = []
+    for path in glob.glob(f'/proc/{pid}/task/*/children'):
+        with open(path) as f:
+            children.extend(int(child) for child in f.read().split())
+    return sorted(children)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report unique vs shared memory of the gunicorn workers')
+    parser.add_argument('--pidfile', default='/tmp/gunicorn.pid')
+    args = parser.parse_args()
+
+    try:
+        with open(args.pidfile) as f:
+            master = int(f.read().strip())
+    except (OSError, ValueError) as e:
+        print(f"✗ Could not read the gunicorn master pid: {e}")
+        return
+
+    processes = [('master', master)] + [('worker', pid) for pid in child_pids(master)]
+
+    print(f"{'process':<10} {'pid':>8} {'RSS MB':>10} {'PSS MB':>10} {'unique MB':>10} {'shared MB':>10}")
+    totals = {'rss_mb': 0.0, 'pss_mb': 0.0, 'unique_mb': 0.0}
+    for role, pid in processes:
+        memory = memory_breakdown(pid)
+        if memory is None:
+            print(f"{role:<10} {pid:>8} {'unavailable':>10}")
+            continue
+        for key in totals:
+            totals[key] += memory[key]
+        print(f"{role:<10} {pid:>8} {memory['rss_mb']:>10.1f} {memory['pss_mb']:>10.1f} "
+              f"{memory['unique_mb']:>10.1f} {memory['shared_mb']:>10.1f}")
+
+    print(f"\nSum of RSS:    {totals['rss_mb']:>10.1f} MB (what per-process tools report)")
+    print(f"Sum of PSS:    {totals['pss_mb']:>10.1f} MB (physical memory actually used)")
+    print(f"Sum of unique: {totals['unique_mb']:>10.1f} MB")
+    if totals['rss_mb']:
+        print(f"\nShared pages save {totals['rss_mb'] - totals['pss_mb']:.1f} MB "
+              f"({(1 - totals['pss_mb'] / totals['rss_mb']) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
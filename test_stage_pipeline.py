@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Stage-pipelined executor testing script for Thai-English Grammar Learning Tool.
+Sends identical requests concurrently through the executor (PIPELINE_EXECUTOR=1)
+with stand-in models, and checks that they share one run instead of queueing
+behind each other, and that a stage error comes back as a failed result.
+No models or server are needed: python test_stage_pipeline.py
+"""
+
+import os
+import time
+import threading
+
+os.environ['PIPELINE_EXECUTOR'] = '1'
+os.environ['SINGLE_FLIGHT_ENABLED'] = '1'
+
+from app.pipeline import ModelManager
+from app.single_flight import SingleFlight
+
+TRANSLATION_SECONDS = 0.3
+CLASSIFICATION_SECONDS = 0.1
+EXPLANATION_SECONDS = 0.1
+CONCURRENT_REQUESTS = 8
+
+
+class FakeTranslator:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def translate(self, thai_text):
+        with self.lock:
+            self.calls += 1
+        time.sleep(TRANSLATION_SECONDS)
+        return "I eat rice every morning."
+
+
+class FakeClassifier:
+    def classify(self, sentence):
+        time.sleep(CLASSIFICATION_SECONDS)
+        return {'coarse_label': 'PRESENT', 'fine_label': 'Present Simple', 'fine_code': 'PRESENT_SIMPLE',
+                'confidence': 0.9, 'all_predictions': {}}
+
+
+class FakeExplainer:
+    def explain(self, analysis_result):
+        time.sleep(EXPLANATION_SECONDS)
+        return "[SECTION 1: Context Cues]\nทุกวัน"
+
+
+def make_manager():
+    # Only what full_pipeline needs; no models are loaded
+    manager = ModelManager.__new__(ModelManager)
+    manager.first_sentence_only = False
+    manager.all_sentences = False
+    manager.max_analyzed_sentences = 5
+    manager.single_flight = SingleFlight('pipeline')
+    manager.translator = FakeTranslator()
+    manager.classifier = FakeClassifier()
+    manager.explainer = FakeExplainer()
+    manager.fragment_handler = None
+    manager.stage_executor = manager._create_stage_executor()
+    return manager
+
+
+def run_concurrently(manager, thai_text, count):
+    results = [None] * count
+
+    def request(index):
+        results[index] = manager.full_pipeline(thai_text, timeout=10)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(count)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.time() - start
+
+
+def test_identical_requests_share_one_run():
+    manager = make_manager()
+    results, elapsed = run_concurrently(manager, "ฉันกินข้าวเช้าทุกวัน", CONCURRENT_REQUESTS)
+    one_run = TRANSLATION_SECONDS + CLASSIFICATION_SECONDS + EXPLANATION_SECONDS
+
+    print(f"{CONCURRENT_REQUESTS} identical requests: {elapsed:.2f}s "
+          f"(one run {one_run:.2f}s, {manager.translator.calls} translation(s))")
+    assert manager.translator.calls == 1, "identical requests were translated more than once"
+    assert elapsed < one_run * 2, "identical requests queued behind each other"
+    for result in results:
+        assert result["translation"] == "I eat rice every morning."
+        assert result["fine_code"] == "PRESENT_SIMPLE"
+        assert "error_stage" not in result
+    # Every caller gets its own copy
+    assert len({id(result) for result in results}) == CONCURRENT_REQUESTS
+    stats = manager.single_flight.get_stats()['stages']['pipeline']
+    assert stats['executions'] == 1 and stats['coalesced'] == CONCURRENT_REQUESTS - 1
+
+
+def test_stage_error_returns_failed_result():
+    manager = make_manager()
+    # Breaks outside the stage's own error handling, as an unexpected bug would
+    def crash(run):
+        raise RuntimeError("stage crashed")
+    manager._stage_classification = crash
+    result = manager.full_pipeline("เมื่อวานฉันไปตลาด", timeout=10)
+
+    print(f"Stage error: error_stage={result.get('error_stage')}, fine_code={result.get('fine_code')}")
+    assert result["error_stage"] == "classification"
+    assert result["fine_code"] == "ERROR"
+    assert result["translation"] == "I eat rice every morning."
+
+
+if __name__ == "__main__":
+    test_identical_requests_share_one_run()
+    test_stage_error_returns_failed_result()
+    print("\n✓ Stage-pipelined executor tests passed")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Auto-tuner for the Typhoon translator's llama.cpp settings.
+Benchmarks every GGUF file in ./models against combinations of n_threads,
+n_batch and n_ctx on a fixed Thai sentence set. Each configuration runs in
+its own subprocess so resident memory is measured in isolation. The fastest
+configuration that fits the RAM budget is written to the translator profile,
+which TyphoonTranslator loads at startup.
+
+Usage:
+    python tune_translator.py [--ram-budget-mb MB] [--threads 2,4,8] [--dry-run]
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import resource
+import itertools
+import subprocess
+import statistics
+from datetime import datetime
+
+PROMPT_PREFIX = "<s>Translate Thai to English: "
+STOP = ["</s>", "\n", "Thai:"]
+MAX_TOKENS = 80
+
+TEST_SENTENCES = [
+    "ฉันกินข้าวเช้าทุกวัน",
+    "เมื่อวานฉันไปตลาด",
+    "พรุ่งนี้ฉันจะไปเรียน",
+    "ฉันกำลังทำงาน",
+    "ฉันได้อ่านหนังสือแล้ว",
+    "เขาเรียนภาษาอังกฤษมาห้าปีแล้ว",
+    "ตอนที่ฝนตก ฉันกำลังเดินกลับบ้าน",
+    "ก่อนที่เธอจะมาถึง พวกเราได้กินข้าวเสร็จแล้ว",
+    "ถ้าพรุ่งนี้ฝนไม่ตก เราจะไปทะเลกัน",
+    "แม่ของฉันทำอาหารอร่อยมาก"
+]
+
+
+def mem_total_mb():
+    """Total host memory from /proc/meminfo"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_worker(config, runs):
+    """Benchmark one configuration in this process and print a JSON result line"""
+    from llama_cpp import Llama
+
+    load_start = time.perf_counter()
+    llm = Llama(
+        model_path=config['model_path'],
+        verbose=False,
+        n_ctx=config['n_ctx'],
+        n_threads=config['n_threads'],
+        n_batch=config['n_batch'],
+        n_gpu_layers=0,
+        # Same as the profile will load it: locked pages all count toward RSS
+        use_mlock=config['use_mlock'],
+        use_mmap=True
+    )
+    load_time = time.perf_counter() - load_start
+
+    def translate(thai_text):
+        return llm(f"{PROMPT_PREFIX}{thai_text}\nEnglish:", max_tokens=MAX_TOKENS,
+                   temperature=0.0, repeat_penalty=1.0, stop=STOP, echo=False)
+
+    translate(TEST_SENTENCES[0])  # warm-up
+
+    latencies = []
+    completion_tokens = 0
+    outputs = {}
+    for _ in range(runs):
+        for thai_text in TEST_SENTENCES:
+            start = time.perf_counter()
+            response = translate(thai_text)
+            latencies.append(time.perf_counter() - start)
+            completion_tokens += response['usage']['completion_tokens']
+            outputs[thai_text] = response['choices'][0]['text'].strip()
+
+    latencies.sort()
+    result = {
+        # Generated tokens over the whole request time, prompt evaluation included
+        'completion_tokens_per_second': round(completion_tokens / sum(latencies), 2),
+        'mean_latency_ms': round(statistics.mean(latencies) * 1000, 1),
+        'p95_latency_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+        # ru_maxrss is in KB on Linux
+        'rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'load_seconds': round(load_time, 2),
+        'outputs': outputs
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def benchmark(config, runs, timeout):
+    """Run one configuration in a subprocess; returns the result dict or None"""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config), '--runs', str(runs)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print(f"  ✗ timed out after {timeout}s")
+        return None
+
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()
+        print(f"  ✗ failed: {error[-1] if error else 'exit code ' + str(completed.returncode)}")
+        return None
+
+    for line in reversed(completed.stdout.strip().splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    print("  ✗ no result reported")
+    return None
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    cores = os.cpu_count() or 4
+    total_mb = mem_total_mb()
+
+    parser = argparse.ArgumentParser(description='Benchmark llama.cpp settings for the translator and write a profile')
+    parser.add_argument('--models-dir', default='./models', help='Directory searched for *.gguf files')
+    parser.add_argument('--pattern', default='typhoon-translate-*.gguf', help='Glob for candidate GGUF files')
+    parser.add_argument('--threads', type=parse_int_list,
+                        default=sorted({max(1, cores // 4), max(1, cores // 2), cores}),
+                        help='Comma-separated n_threads candidates')
+    parser.add_argument('--n-batch', type=parse_int_list, default=[128, 256, 512],
+                        help='Comma-separated n_batch candidates')
+    parser.add_argument('--n-ctx', type=parse_int_list, default=[512, 1024, 2048],
+                        help='Comma-separated n_ctx candidates (prompts are under 200 tokens)')
+    parser.add_argument('--ram-budget-mb', type=float,
+                        default=round(total_mb * 0.5) if total_mb else 4096,
+                        help='Maximum resident memory of the translator (default: half of host RAM)')
+    parser.add_argument('--runs', type=int, default=2, help='Passes over the sentence set per configuration')
+    parser.add_argument('--timeout', type=int, default=900, help='Seconds allowed per configuration')
+    parser.add_argument('--no-mlock', action='store_true',
+                        help='Benchmark without mlock and write use_mlock=false to the profile')
+    parser.add_argument('--output', default=None,
+                        help='Profile path (default: TRANSLATOR_PROFILE or ./models/translator_profile.json)')
+    parser.add_argument('--report', default=None, help='Also write the full report as JSON to this path')
+    parser.add_argument('--dry-run', action='store_true', help='Report only; do not write the profile')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker), args.runs)
+        return
+
+    # Imported here so benchmark workers do not load the Flask app
+    from app.translator_profile import DEFAULT_PROFILE_PATH
+    output = args.output or os.getenv('TRANSLATOR_PROFILE', DEFAULT_PROFILE_PATH)
+
+    # Largest (least quantized) file first; it is the reference for output agreement
+    model_files = sorted(glob.glob(os.path.join(args.models_dir, args.pattern)), key=os.path.getsize, reverse=True)
+    if not model_files:
+        print(f"✗ No GGUF files matching {args.pattern} in {args.models_dir}")
+        sys.exit(1)
+
+    configs = [
+        {'model_path': model_path, 'n_threads': n_threads, 'n_batch': n_batch, 'n_ctx': n_ctx,
+         'use_mlock': not args.no_mlock}
+        for model_path, n_threads, n_batch, n_ctx in itertools.product(
+            model_files, args.threads, args.n_batch, args.n_ctx)
+        if n_batch <= n_ctx
+    ]
+
+    print(f"Tuning translator on {cores} cores, RAM budget {args.ram_budget_mb:.0f} MB")
+    print(f"{len(model_files)} model file(s), {len(configs)} configurations, "
+          f"{len(TEST_SENTENCES) * args.runs} translations each\n")
+
+    results = []
+    reference_outputs = None
+    for i, config in enumerate(configs, 1):
+        print(f"[{i}/{len(configs)}] {os.path.basename(config['model_path'])} "
+              f"threads={config['n_threads']} batch={config['n_batch']} ctx={config['n_ctx']}")
+        result = benchmark(config, args.runs, args.timeout)
+        if result is None:
+            continue
+
+        outputs = result.pop('outputs')
+        if reference_outputs is None:
+            reference_outputs = outputs
+        # Share of sentences translated exactly like the reference (quantization drift)
+        result['agreement'] = round(
+            sum(outputs.get(k) == v for k, v in reference_outputs.items()) / len(reference_outputs), 2)
+        result['fits_budget'] = result['rss_mb'] <= args.ram_budget_mb
+        results.append(dict(config, **result))
+        print(f"  {result['completion_tokens_per_second']:.1f} completion tok/s, p95 {result['p95_latency_ms']:.0f} ms, "
+              f"RSS {result['rss_mb']:.0f} MB")
+
+    if not results:
+        print("✗ No configuration completed")
+        sys.exit(1)
+
+    # Report
+    print(f"\n{'model':<40} {'thr':>4} {'batch':>6} {'ctx':>6} {'cmpl t/s':>8} {'p95 ms':>8} {'RSS MB':>8} {'agree':>6}")
+    for r in sorted(results, key=lambda r: -r['completion_tokens_per_second']):
+        marker = '' if r['fits_budget'] else '  (over budget)'
+        print(f"{os.path.basename(r['model_path']):<40} {r['n_threads']:>4} {r['n_batch']:>6} {r['n_ctx']:>6} "
+              f"{r['completion_tokens_per_second']:>8.1f} {r['p95_latency_ms']:>8.0f} {r['rss_mb']:>8.0f} "
+              f"{r['agreement']:>6.2f}{marker}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    candidates = [r for r in results if r['fits_budget']]
+    if not candidates:
+        print(f"\n✗ No configuration fits the {args.ram_budget_mb:.0f} MB budget; profile not written")
+        sys.exit(1)
+
+    best = max(candidates, key=lambda r: (r['completion_tokens_per_second'], -r['p95_latency_ms']))
+    profile = {
+        'model_path': best['model_path'],
+        'n_ctx': best['n_ctx'],
+        'n_threads': best['n_threads'],
+        'n_batch': best['n_batch'],
+        'use_mlock': best['use_mlock'],
+        'completion_tokens_per_second': best['completion_tokens_per_second'],
+        'p95_latency_ms': best['p95_latency_ms'],
+        'rss_mb': best['rss_mb'],
+        'ram_budget_mb': args.ram_budget_mb,
+        'tuned_at': datetime.now().isoformat(timespec='seconds'),
+        'host': {'cpu_count': cores, 'mem_total_mb': round(total_mb) if total_mb else None}
+    }
+
+    print(f"\nFastest within budget: {os.path.basename(best['model_path'])} threads={best['n_threads']} "
+          f"batch={best['n_batch']} ctx={best['n_ctx']}")
+    if args.dry_run:
+        print(json.dumps(profile, indent=2))
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+    print(f"✓ Profile written to {output} (restart the app to apply)")
+
+
+if __name__ == '__main__':
+    main()
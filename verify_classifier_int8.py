@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Accuracy gate for the int8 classifier backend.
+Runs the fp32 and dynamically quantized int8 tense classifiers on a labeled
+set and compares their coarse/fine predictions. The result is written to
+int8_gate.json in the classifier model directory; TenseClassifier only
+enables CLASSIFIER_BACKEND=int8 when that gate passed for the current weights.
+
+Usage:
+    python verify_classifier_int8.py [--labeled data/classifier_eval.csv] [--threshold 0.98] [--save-artifact]
+"""
+
+import io
+import os
+import csv
+import copy
+import time
+import argparse
+import statistics
+from datetime import datetime
+
+# Verify against the fp32 model regardless of the configured backend
+os.environ['CLASSIFIER_BACKEND'] = 'fp32'
+# Every comparison and latency run must reach the model, not the result cache
+os.environ['CLASSIFICATION_CACHE_ENABLED'] = '0'
+
+import torch
+
+from app.pipeline import TenseClassifier
+from app.classifier_quantization import (
+    INT8_ARTIFACT_NAME, quantize_encoder, load_int8_state_dict, weights_fingerprint, write_int8_gate
+)
+
+
+def load_labeled_set(path):
+    """Read sentence,coarse,fine rows"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row for row in csv.DictReader(f) if row.get('sentence')]
+
+
+def serialized_size_mb(model):
+    """Size of the model's state dict when saved, a proxy for its weight memory"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def measure_latency(classifier, sentences, runs):
+    """Per-sentence classify() latency in ms: (mean, p95)"""
+    classifier.classify(sentences[0])  # warm-up
+    latencies = []
+    for _ in range(runs):
+        for sentence in sentences:
+            start = time.perf_counter()
+            classifier.classify(sentence)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify the int8 classifier against fp32 and record the gate')
+    parser.add_argument('--labeled', default='data/classifier_eval.csv', help='CSV with sentence,coarse,fine columns')
+    parser.add_argument('--threshold', type=float, default=0.98,
+                        help='Minimum coarse and fine agreement with fp32 predictions')
+    parser.add_argument('--runs', type=int, default=3, help='Latency passes over the labeled set')
+    parser.add_argument('--save-artifact', action='store_true',
+                        help=f'Also save the quantized weights as {INT8_ARTIFACT_NAME} for faster, smaller loads')
+    args = parser.parse_args()
+
+    rows = load_labeled_set(args.labeled)
+    sentences = [row['sentence'] for row in rows]
+    print(f"Loaded {len(rows)} labeled sentences from {args.labeled}")
+
+    fp32 = TenseClassifier()
+    if fp32.model is None:
+        print("✗ fp32 classifier could not be loaded; nothing to verify")
+        return
+
+    int8 = copy.copy(fp32)
+    int8.model = quantize_encoder(copy.deepcopy(fp32.model)).eval()
+    int8.backend = 'int8'
+
+    fp32_results = fp32.classify_batch(sentences)
+    int8_results = int8.classify_batch(sentences)
+
+    n = len(rows)
+    coarse_agreement = sum(a['coarse_label'] == b['coarse_label'] for a, b in zip(fp32_results, int8_results)) / n
+    fine_agreement = sum(a['fine_code'] == b['fine_code'] for a, b in zip(fp32_results, int8_results)) / n
+    fp32_accuracy = sum(r['fine_code'] == row['fine'] for r, row in zip(fp32_results, rows)) / n
+    int8_accuracy = sum(r['fine_code'] == row['fine'] for r, row in zip(int8_results, rows)) / n
+
+    fp32_mean, fp32_p95 = measure_latency(fp32, sentences, args.runs)
+    int8_mean, int8_p95 = measure_latency(int8, sentences, args.runs)
+    fp32_size = serialized_size_mb(fp32.model)
+    int8_size = serialized_size_mb(int8.model)
+
+    passed = coarse_agreement >= args.threshold and fine_agreement >= args.threshold
+
+    print(f"\n{'':<22} {'fp32':>10} {'int8':>10}")
+    print(f"{'fine accuracy':<22} {fp32_accuracy:>10.3f} {int8_accuracy:>10.3f}")
+    print(f"{'mean latency (ms)':<22} {fp32_mean:>10.1f} {int8_mean:>10.1f}")
+    print(f"{'p95 latency (ms)':<22} {fp32_p95:>10.1f} {int8_p95:>10.1f}")
+    print(f"{'weights (MB)':<22} {fp32_size:>10.0f} {int8_size:>10.0f}")
+    print(f"\nAgreement with fp32: coarse {coarse_agreement:.3f}, fine {fine_agreement:.3f} "
+          f"(threshold {args.threshold})")
+
+    disagreements = [(row['sentence'], a['fine_code'], b['fine_code'])
+                     for row, a, b in zip(rows, fp32_results, int8_results) if a['fine_code'] != b['fine_code']]
+    for sentence, fp32_code, int8_code in disagreements:
+        print(f"  {fp32_code:>22} -> {int8_code:<22} {sentence}")
+
+    report = {
+        'passed': passed,
+        'threshold': args.threshold,
+        'coarse_agreement': round(coarse_agreement, 4),
+        'fine_agreement': round(fine_agreement, 4),
+        'fp32_accuracy': round(fp32_accuracy, 4),
+        'int8_accuracy': round(int8_accuracy, 4),
+        'fp32_latency_ms': {'mean': round(fp32_mean, 2), 'p95': round(fp32_p95, 2)},
+        'int8_latency_ms': {'mean': round(int8_mean, 2), 'p95': round(int8_p95, 2)},
+        'fp32_weights_mb': round(fp32_size, 1),
+        'int8_weights_mb': round(int8_size, 1),
+        'labeled_set': args.labeled,
+        'n_sentences': n,
+        'weights_fingerprint': weights_fingerprint(fp32.model_path),
+        'torch_version': torch.__version__,
+        'quantized_engine': torch.backends.quantized.engine,
+        'verified_at': datetime.now().isoformat(timespec='seconds')
+    }
+
+    artifact_path = os.path.join(fp32.model_path, INT8_ARTIFACT_NAME)
+    if passed and args.save_artifact:
+        torch.save(int8.model.state_dict(), artifact_path)
+        try:
+            # Workers load it with weights_only=True; keep it only if that works here
+            load_int8_state_dict(artifact_path)
+            report['artifact'] = INT8_ARTIFACT_NAME
+            print(f"✓ Quantized weights saved to {artifact_path}")
+        except Exception as e:
+            os.remove(artifact_path)
+            print(f"✗ Quantized weights cannot be loaded with weights_only=True ({e}); "
+                  f"workers will quantize the fp32 weights at startup")
+    elif not passed and os.path.exists(artifact_path):
+        # Never leave an unverified artifact behind
+        os.remove(artifact_path)
+
+    gate_path = write_int8_gate(fp32.model_path, report)
+    if passed:
+        print(f"✓ Gate passed; recorded in {gate_path}. Set CLASSIFIER_BACKEND=int8 to enable.")
+    else:
+        print(f"✗ Gate failed; recorded in {gate_path}. The int8 backend stays disabled.")
+
+
+if __name__ == '__main__':
+    main()